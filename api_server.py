@@ -0,0 +1,510 @@
+# api_server.py
+"""Локальный HTTP/JSON API ветлечебницы для нескольких рабочих мест
+
+    python api_server.py --db vet_clinic.db --port 8080
+
+Все терминалы обращаются к одному процессу вместо того, чтобы открывать
+файл базы напрямую и бороться за блокировки. Чтения выполняются пулом
+потоков (у каждого потока свое соединение), записи - через очередь группой
+фиксации репозитория (write_queue.py): одновременные операции попадают в
+одну транзакцию, каждая в своей точке сохранения. Соединения HTTP/1.1
+поддерживают keep-alive, полный список животных отдается потоково
+(chunked) порциями по ключу.
+
+Маршруты:
+    GET    /animals?after_id=&limit=       страница животных
+    GET    /animals/all                    все животные (потоковый JSON-массив)
+    POST   /animals                        {name, species, breed, age, owner_name, phone}
+    GET    /animals/<id>/visits?full=1     история визитов (full=1 - вместе с архивом)
+    POST   /visits                         {animal_id, diagnosis, treatment, cost}
+    GET    /search?q=                      поиск по диагнозам и лечению
+    GET    /owners?q=                      владельцы по части номера, '*4567' или имени
+    GET    /statistics
+    GET    /income/daily?start=&end=
+    GET    /income/monthly?start=&end=
+    POST   /login                          {phone, name}
+    POST   /clients                        {phone, name, email}
+    GET    /clients/<id>/pets
+    POST   /clients/<id>/pets              {name, species, breed, age, weight, notes}
+    DELETE /pets/<id>
+    GET    /clients/<id>/appointments?full=1
+    POST   /clients/<id>/appointments      {pet_id, service, date, time, notes}
+    DELETE /appointments/<id>
+    GET    /clients/<id>/visits?full=1
+    GET    /slots?service=&date=&count=
+    GET    /reports/agenda?date=&doctor=   расписание на день
+    GET    /reports/revenue?start=&end=    выручка за период [start, end)
+    GET    /reports/load?start=&end=       загрузка врачей за период
+    GET    /metrics                        замеры запросов, кэш, очередь записи
+    GET    /changes?since=&limit=          журнал изменений после номера (или &consumer=)
+    POST   /changes/consumers              {consumer} - регистрация, ответ - позиция
+    POST   /changes/ack                    {consumer, seq} - подтверждение прочитанного
+"""
+import argparse
+import asyncio
+import dataclasses
+import json
+import logging
+import re
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from changelog import CHANGE_BATCH, ChangelogGap
+from portal_schema import STATUS_PENDING
+from repository import open_repository, DB_NAME, PAGE_SIZE
+from scheduling import SlotUnavailable
+
+# Потоков для чтения (у каждого свое соединение SQLite)
+READ_WORKERS = 4
+# Порция потоковой выдачи списка животных
+STREAM_BATCH = 1000
+# Сколько ждать следующего запроса в keep-alive соединении, секунд
+KEEPALIVE_TIMEOUT = 15
+MAX_BODY = 1024 * 1024
+
+logger = logging.getLogger('vet_clinic.api')
+
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 409: 'Conflict', 410: 'Gone', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def to_json(value):
+    """JSON с поддержкой записей-dataclass репозитория"""
+    def default(obj):
+        if dataclasses.is_dataclass(obj):
+            return dataclasses.asdict(obj)
+        raise TypeError(f"Не сериализуется в JSON: {type(obj).__name__}")
+    return json.dumps(value, ensure_ascii=False, default=default).encode('utf-8')
+
+
+class ClinicApi:
+    """Маршрутизация запросов к репозиторию с разделением чтений и записей"""
+
+    def __init__(self, repo, read_workers=READ_WORKERS):
+        self.repo = repo
+        self.readers = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix='api-read')
+        self.routes = [
+            ('GET', r'/animals', self.animals_page),
+            ('GET', r'/animals/all', self.animals_all),
+            ('POST', r'/animals', self.add_animal),
+            ('GET', r'/animals/(\d+)/visits', self.animal_visits),
+            ('POST', r'/visits', self.add_visit),
+            ('GET', r'/search', self.search),
+            ('GET', r'/owners', self.owners),
+            ('GET', r'/statistics', self.statistics),
+            ('GET', r'/income/daily', self.income_daily),
+            ('GET', r'/income/monthly', self.income_monthly),
+            ('POST', r'/login', self.login),
+            ('POST', r'/clients', self.register),
+            ('GET', r'/clients/(\d+)/pets', self.client_pets),
+            ('POST', r'/clients/(\d+)/pets', self.add_pet),
+            ('DELETE', r'/pets/(\d+)', self.remove_pet),
+            ('GET', r'/clients/(\d+)/appointments', self.client_appointments),
+            ('POST', r'/clients/(\d+)/appointments', self.book),
+            ('DELETE', r'/appointments/(\d+)', self.remove_appointment),
+            ('GET', r'/clients/(\d+)/visits', self.client_visits),
+            ('GET', r'/slots', self.slots),
+            ('GET', r'/reports/agenda', self.agenda),
+            ('GET', r'/reports/revenue', self.revenue),
+            ('GET', r'/reports/load', self.doctor_load),
+            ('GET', r'/metrics', self.metrics),
+            ('GET', r'/changes', self.changes),
+            ('POST', r'/changes/consumers', self.register_consumer),
+            ('POST', r'/changes/ack', self.acknowledge),
+        ]
+        self.routes = [(method, re.compile(pattern + '$'), handler)
+                       for method, pattern, handler in self.routes]
+
+    # --- Чтение и запись ---
+
+    async def read(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.readers, func, *args)
+
+    async def write(self, func, *args):
+        """Запись через общую очередь группой фиксации репозитория"""
+        return await asyncio.wrap_future(self.repo.writes.submit(func, *args))
+
+    def close(self):
+        self.readers.shutdown()
+
+    # --- Маршрутизация ---
+
+    async def dispatch(self, method, path, query, body):
+        allowed = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if match:
+                if route_method == method:
+                    return await handler(query, body, *(int(g) for g in match.groups()))
+                allowed = True
+        if allowed:
+            raise HttpError(405, "Метод не поддерживается")
+        raise HttpError(404, "Ресурс не найден")
+
+    # --- Консоль администратора ---
+
+    async def animals_page(self, query, body):
+        after_id = int(query.get('after_id', 0))
+        limit = min(int(query.get('limit', PAGE_SIZE)), STREAM_BATCH)
+        return 200, await self.read(self.repo.animals_page, after_id, limit)
+
+    async def animals_all(self, query, body):
+        async def chunks():
+            after_id = 0
+            while True:
+                page = await self.read(self.repo.animals_page, after_id, STREAM_BATCH)
+                if not page:
+                    break
+                yield page
+                after_id = page[-1].id
+        return 200, chunks()
+
+    async def add_animal(self, query, body):
+        data = require(body, 'name', 'species')
+        animal_id = await self.write(self.repo.add_animal, text(data, 'name'), text(data, 'species'),
+                                     data.get('breed'), optional_count(data, 'age'),
+                                     data.get('owner_name'), data.get('phone'))
+        return 201, {'id': animal_id}
+
+    async def animal_visits(self, query, body, animal_id):
+        return 200, await self.read(self.repo.animal_visits, animal_id, full_history(query))
+
+    async def add_visit(self, query, body):
+        data = require(body, 'animal_id')
+        cost = float(data.get('cost') or 0)
+        if cost < 0:
+            raise HttpError(400, "Стоимость не может быть отрицательной")
+        animal_id = int(data['animal_id'])
+        if await self.read(self.repo.get_animal, animal_id) is None:
+            raise HttpError(404, "Животное не найдено")
+        visit_id = await self.write(self.repo.add_visit, animal_id,
+                                    data.get('diagnosis'), data.get('treatment'), cost)
+        return 201, {'id': visit_id}
+
+    async def search(self, query, body):
+        limit = int(query.get('limit', 20))
+        return 200, await self.read(self.repo.search_visits, query.get('q', ''), limit)
+
+    async def owners(self, query, body):
+        limit = int(query.get('limit', 20))
+        return 200, await self.read(self.repo.find_owners, query.get('q', ''), limit)
+
+    async def statistics(self, query, body):
+        return 200, await self.read(self.repo.statistics)
+
+    async def income_daily(self, query, body):
+        return 200, await self.read(self.repo.income_by_day, query.get('start'), query.get('end'))
+
+    async def income_monthly(self, query, body):
+        return 200, await self.read(self.repo.income_by_month, query.get('start'), query.get('end'))
+
+    # --- Портал ---
+
+    async def login(self, query, body):
+        data = require(body, 'phone', 'name')
+        client = await self.read(self.repo.find_client, data['phone'], data['name'])
+        if client is None:
+            raise HttpError(404, "Пользователь не найден")
+        return 200, client
+
+    async def register(self, query, body):
+        data = require(body, 'phone', 'name')
+        return 201, await self.write(self.repo.register_client, data['phone'], data['name'],
+                                     data.get('email'))
+
+    async def _client(self, client_id):
+        client = await self.read(self.repo.get_client, client_id)
+        if client is None:
+            raise HttpError(404, "Клиент не найден")
+        return client
+
+    async def client_pets(self, query, body, client_id):
+        return 200, await self.read(self.repo.client_pets, client_id)
+
+    async def add_pet(self, query, body, client_id):
+        data = require(body, 'name', 'species')
+        client = await self._client(client_id)
+        return 201, await self.write(self.repo.add_pet, client, text(data, 'name'), text(data, 'species'),
+                                     data.get('breed'), optional_count(data, 'age'), data.get('weight'),
+                                     data.get('notes'))
+
+    async def remove_pet(self, query, body, pet_id):
+        if not await self.write(self.repo.remove_pet, pet_id):
+            raise HttpError(404, "Питомец не найден")
+        return 200, {'deleted': pet_id}
+
+    async def client_appointments(self, query, body, client_id):
+        return 200, await self.read(self.repo.client_appointments, client_id, full_history(query))
+
+    async def book(self, query, body, client_id):
+        data = require(body, 'pet_id', 'service', 'date', 'time')
+        pets = await self.read(self.repo.client_pets, client_id)
+        pet = next((p for p in pets if p.id == int(data['pet_id'])), None)
+        if pet is None:
+            raise HttpError(404, "Питомец не найден")
+        return 201, await self.write(self.repo.book_appointment, client_id, pet, data['service'],
+                                     data['date'], data['time'], data.get('notes', ''),
+                                     STATUS_PENDING)
+
+    async def remove_appointment(self, query, body, appointment_id):
+        if not await self.write(self.repo.remove_appointment, appointment_id):
+            raise HttpError(404, "Запись не найдена")
+        return 200, {'deleted': appointment_id}
+
+    async def client_visits(self, query, body, client_id):
+        return 200, await self.read(self.repo.client_visits, client_id, full_history(query))
+
+    async def slots(self, query, body):
+        if not query.get('service'):
+            raise HttpError(400, "Не указана услуга")
+        count = min(int(query.get('count', 10)), 100)
+        return 200, await self.read(self.repo.free_slots, query['service'], query.get('date'), count)
+
+    # --- Отчеты ---
+
+    async def agenda(self, query, body):
+        if not query.get('date'):
+            raise HttpError(400, "Не указана дата")
+        return 200, await self.read(self.repo.agenda, query['date'], query.get('doctor'))
+
+    async def revenue(self, query, body):
+        start, end = period(query)
+        visits, income = await self.read(self.repo.revenue, start, end)
+        return 200, {'start': start, 'end': end, 'visits': visits, 'income': income}
+
+    async def doctor_load(self, query, body):
+        start, end = period(query)
+        rows = await self.read(self.repo.doctor_load, start, end)
+        return 200, [{'doctor': doctor, 'appointments': count, 'minutes': minutes}
+                     for doctor, count, minutes in rows]
+
+    async def metrics(self, query, body):
+        metrics = await self.read(self.repo.metrics, int(query.get('limit', 50)))
+        metrics['writes'] = self.repo.writes.stats()
+        return 200, metrics
+
+    # --- Журнал изменений ---
+
+    async def changes(self, query, body):
+        limit = min(int(query.get('limit', CHANGE_BATCH)), STREAM_BATCH)
+        if 'since' in query or 'consumer' not in query:
+            since = int(query.get('since', 0))
+        else:
+            since = await self.read(self.repo.changes.position, query['consumer'])
+        changes = await self.read(self.repo.changes.changes, since, limit)
+        return 200, {'head': await self.read(self.repo.changes.head), 'changes': changes}
+
+    async def register_consumer(self, query, body):
+        data = require(body, 'consumer')
+        position = await self.write(self.repo.changes.register, data['consumer'])
+        return 201, {'consumer': data['consumer'], 'position': position}
+
+    async def acknowledge(self, query, body):
+        data = require(body, 'consumer', 'seq')
+        await self.write(self.repo.changes.acknowledge, data['consumer'], int(data['seq']))
+        return 200, {'consumer': data['consumer'], 'position': int(data['seq'])}
+
+
+def period(query):
+    if not query.get('start') or not query.get('end'):
+        raise HttpError(400, "Укажите start и end")
+    return query['start'], query['end']
+
+
+def full_history(query):
+    return query.get('full', '') in ('1', 'true', 'yes')
+
+
+def require(body, *fields):
+    if not isinstance(body, dict):
+        raise HttpError(400, "Ожидается JSON-объект")
+    missing = [field for field in fields if body.get(field) in (None, '')]
+    if missing:
+        raise HttpError(400, f"Не заполнены поля: {', '.join(missing)}")
+    return body
+
+
+def text(body, field):
+    """Непустое строковое поле без крайних пробелов"""
+    value = body.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise HttpError(400, f"Поле {field} должно быть непустой строкой")
+    return value.strip()
+
+
+def optional_count(body, field):
+    """Необязательное целое неотрицательное поле (None, если не указано)"""
+    value = body.get(field)
+    if value in (None, ''):
+        return None
+    if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+        raise HttpError(400, f"Поле {field} должно быть целым числом")
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise HttpError(400, f"Поле {field} должно быть целым числом")
+    if number < 0:
+        raise HttpError(400, f"Поле {field} не может быть отрицательным")
+    return number
+
+
+# --- HTTP/1.1 ---
+
+async def read_request(reader):
+    """(метод, путь, параметры, тело, keep_alive) или None при закрытии соединения"""
+    try:
+        line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode('latin-1').split()
+    except ValueError:
+        raise HttpError(400, "Некорректная строка запроса")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get('content-length') or 0)
+    if length > MAX_BODY:
+        raise HttpError(413, "Слишком большой запрос")
+    body = None
+    if length:
+        raw = await reader.readexactly(length)
+        try:
+            body = json.loads(raw)
+        except ValueError:
+            raise HttpError(400, "Тело запроса - не JSON")
+
+    url = urlsplit(target)
+    query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+    connection = headers.get('connection', '').lower()
+    keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+    return method.upper(), url.path.rstrip('/') or '/', query, body, keep_alive
+
+
+def response_head(status, keep_alive, extra):
+    lines = [f'HTTP/1.1 {status} {REASONS.get(status, "")}',
+             'Content-Type: application/json; charset=utf-8',
+             f'Connection: {"keep-alive" if keep_alive else "close"}'] + extra
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def send_json(writer, status, payload, keep_alive):
+    data = to_json(payload)
+    writer.write(response_head(status, keep_alive, [f'Content-Length: {len(data)}']) + data)
+    await writer.drain()
+
+
+async def send_stream(writer, status, chunks, keep_alive):
+    """Потоковый JSON-массив: каждая порция уходит отдельным chunk
+
+    Возвращает False, если выдача оборвалась ошибкой: заголовок и часть
+    ответа уже отправлены, поэтому сообщить ошибку кодом нельзя. Завершающий
+    chunk тогда не пишется, а соединение нужно закрыть - клиент увидит
+    неполный ответ, а не обрезанный, но корректный массив.
+    """
+    def chunk(data):
+        return f'{len(data):x}\r\n'.encode('latin-1') + data + b'\r\n'
+
+    writer.write(response_head(status, keep_alive, ['Transfer-Encoding: chunked']))
+    first = True
+    try:
+        async for items in chunks:
+            data = b','.join(to_json(item) for item in items)
+            writer.write(chunk((b'[' if first else b',') + data))
+            first = False
+            await writer.drain()
+    except ConnectionError:
+        raise
+    except Exception:
+        logger.exception("Потоковая выдача прервана ошибкой, соединение закрывается")
+        return False
+    writer.write(chunk(b'[]' if first else b']') + b'0\r\n\r\n')
+    await writer.drain()
+    return True
+
+
+async def handle_connection(api, reader, writer):
+    try:
+        while True:
+            keep_alive = False
+            try:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, query, body, keep_alive = request
+                status, payload = await api.dispatch(method, path, query, body)
+            except HttpError as e:
+                status, payload = e.status, {'error': str(e)}
+            except SlotUnavailable as e:
+                status, payload = 409, {'error': str(e)}
+            except ChangelogGap as e:
+                status, payload = 410, {'error': str(e)}
+            except sqlite3.IntegrityError as e:
+                status, payload = 409, {'error': str(e)}
+            except (ValueError, TypeError, KeyError) as e:
+                status, payload = 400, {'error': str(e)}
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            except Exception as e:
+                status, payload = 500, {'error': str(e)}
+
+            if hasattr(payload, '__aiter__'):
+                if not await send_stream(writer, status, payload, keep_alive):
+                    break
+            else:
+                await send_json(writer, status, payload, keep_alive)
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(db_name, host, port, read_workers=READ_WORKERS):
+    repo = open_repository(db_name)
+    api = ClinicApi(repo, read_workers)
+    server = await asyncio.start_server(lambda r, w: handle_connection(api, r, w), host, port)
+    print(f"API ветлечебницы: http://{host}:{port} (база {db_name})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        api.close()
+        repo.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP/JSON API ветлечебницы")
+    parser.add_argument('--db', default=DB_NAME, help="Файл базы данных")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--readers', type=int, default=READ_WORKERS, help="Потоков для чтения")
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args.db, args.host, args.port, args.readers))
+    except KeyboardInterrupt:
+        print("Сервер остановлен")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,24 @@
 # vet_clinic_client.py
+import argparse
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
 from datetime import datetime, timedelta
-import random
+
+# Репозиторий и фоновый поток загружаются после первой отрисовки окна входа
+# (см. start_database), чтобы окно появлялось без ожидания импорта и базы
+from search import build_match_query
+from portal_schema import SERVICES, STATUS_PENDING
+from virtual_list import VirtualList
+
+# Высота карточек в виртуализированных списках, пикселей
+PET_CARD_HEIGHT = 190
+APPOINTMENT_ROW_HEIGHT = 150
+VISIT_ROW_HEIGHT = 110
+# Сколько ближайших свободных окон предлагать в форме записи
+SLOTS_SHOWN = 16
 
 class VetClinicClient:
-    def __init__(self, root):
+    def __init__(self, root, demo=False):
         self.root = root
         self.root.title("Ветлечебница 'Друг' - Клиентский портал")
         self.root.geometry("1000x700")
@@ -19,111 +31,45 @@ class VetClinicClient:
         
         self.current_user = None
         self.user_animals = []
+        self.appointments_list = None
+        self.appointments = None
+        self.history_list = None
+        self.demo = demo
+        
+        self.repo = None
+        self.worker = None
+        self.login_buttons = []
+        self.status_var = tk.StringVar(value="Подключение к базе данных...")
         
-        self.init_database()
         self.create_login_screen()
+        self.root.after_idle(self.start_database)
     
-    def init_database(self):
-        """Инициализация базы данных для демо"""
-        conn = sqlite3.connect('vet_clinic_client.db')
-        cursor = conn.cursor()
-        
-        # Таблица пользователей
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS clients (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                phone TEXT UNIQUE,
-                name TEXT,
-                email TEXT,
-                registration_date TEXT
-            )
-        ''')
-        
-        # Таблица животных клиентов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS client_animals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                client_phone TEXT,
-                name TEXT,
-                species TEXT,
-                breed TEXT,
-                age INTEGER,
-                weight REAL,
-                special_notes TEXT,
-                FOREIGN KEY (client_phone) REFERENCES clients (phone)
-            )
-        ''')
-        
-        # Таблица записей на прием
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS appointments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                client_phone TEXT,
-                animal_name TEXT,
-                service_type TEXT,
-                appointment_date TEXT,
-                appointment_time TEXT,
-                status TEXT,
-                doctor TEXT,
-                notes TEXT
-            )
-        ''')
-        
-        # Добавляем демо-данные
-        self.add_demo_data(cursor)
-        
-        conn.commit()
-        conn.close()
-    
-    def add_demo_data(self, cursor):
-        """Добавление демо-данных"""
-        # Демо-клиенты
-        demo_clients = [
-            ('79161234567', 'Иван Петров', 'ivan@mail.ru'),
-            ('79037654321', 'Мария Сидорова', 'maria@mail.ru'),
-        ]
-        
-        for phone, name, email in demo_clients:
-            try:
-                cursor.execute(
-                    'INSERT INTO clients (phone, name, email, registration_date) VALUES (?, ?, ?, ?)',
-                    (phone, name, email, datetime.now().strftime("%Y-%m-%d"))
-                )
-            except sqlite3.IntegrityError:
-                pass
-        
-        # Демо-животные
-        demo_animals = [
-            ('79161234567', 'Барсик', 'Кот', 'Сиамский', 3, 4.5, 'Аллергия на курицу'),
-            ('79161234567', 'Рекс', 'Собака', 'Овчарка', 5, 30.0, 'Любит играть с мячом'),
-            ('79037654321', 'Кеша', 'Попугай', 'Ара', 2, 1.2, 'Разговаривает'),
-        ]
-        
-        for phone, name, species, breed, age, weight, notes in demo_animals:
-            cursor.execute(
-                '''INSERT INTO client_animals 
-                (client_phone, name, species, breed, age, weight, special_notes) 
-                VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                (phone, name, species, breed, age, weight, notes)
-            )
-        
-        # Демо-записи
-        demo_appointments = [
-            ('79161234567', 'Барсик', 'Вакцинация', '2024-12-15', '10:00', 'Подтвержден', 'Др. Смирнова', 'Ежегодная вакцинация'),
-            ('79037654321', 'Кеша', 'Осмотр', '2024-12-16', '14:30', 'Подтвержден', 'Др. Иванов', 'Плановый осмотр'),
-        ]
-        
-        for phone, animal, service, date, time, status, doctor, notes in demo_appointments:
-            cursor.execute(
-                '''INSERT INTO appointments 
-                (client_phone, animal_name, service_type, appointment_date, appointment_time, status, doctor, notes) 
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                (phone, animal, service, date, time, status, doctor, notes)
-            )
+    def start_database(self):
+        """Запуск фонового потока и открытие базы после отрисовки окна входа"""
+        from ui_worker import BackgroundWorker
+        self.worker = BackgroundWorker(self.root, on_busy=self.set_busy, on_error=self.show_error)
+        self.worker.submit(self.open_database, on_done=self.on_database_ready,
+                           group='startup', cancellable=False)
+    
+    def open_database(self):
+        """Импорт репозитория, проверка схемы и демо-данные (в фоновом потоке)"""
+        from repository import open_repository, DB_NAME
+        repo = open_repository(DB_NAME)
+        if self.demo:
+            repo.add_demo_data()
+        return repo
+    
+    def on_database_ready(self, repo):
+        """Вход и регистрация становятся доступны, когда база открыта"""
+        self.repo = repo
+        for button in self.login_buttons:
+            if button.winfo_exists():
+                button.state(['!disabled'])
     
     def create_login_screen(self):
         """Создание экрана входа"""
         self.clear_screen()
+        self.create_status_bar()
         
         # Основной фрейм
         main_frame = ttk.Frame(self.root, padding=20)
@@ -143,21 +89,28 @@ class VetClinicClient:
         ttk.Label(login_frame, text="Номер телефона:").grid(row=0, column=0, sticky='w', pady=5)
         self.phone_entry = ttk.Entry(login_frame, font=('Arial', 12), width=20)
         self.phone_entry.grid(row=0, column=1, pady=5, padx=10)
-        self.phone_entry.insert(0, '79161234567')  # Демо-номер
+        if self.demo:
+            self.phone_entry.insert(0, '79161234567')  # Демо-номер
         
         ttk.Label(login_frame, text="Имя:").grid(row=1, column=0, sticky='w', pady=5)
         self.name_entry = ttk.Entry(login_frame, font=('Arial', 12), width=20)
         self.name_entry.grid(row=1, column=1, pady=5, padx=10)
-        self.name_entry.insert(0, 'Иван Петров')  # Демо-имя
+        if self.demo:
+            self.name_entry.insert(0, 'Иван Петров')  # Демо-имя
         
         # Кнопки
         button_frame = ttk.Frame(login_frame)
         button_frame.grid(row=2, column=0, columnspan=2, pady=15)
         
-        ttk.Button(button_frame, text="Войти", 
-                  command=self.login, width=15).pack(side='left', padx=5)
-        ttk.Button(button_frame, text="Регистрация", 
-                  command=self.show_registration, width=15).pack(side='left', padx=5)
+        state = 'normal' if self.repo is not None else 'disabled'
+        self.login_buttons = [
+            ttk.Button(button_frame, text="Войти", 
+                      command=self.login, width=15, state=state),
+            ttk.Button(button_frame, text="Регистрация", 
+                      command=self.show_registration, width=15, state=state),
+        ]
+        for button in self.login_buttons:
+            button.pack(side='left', padx=5)
         
         # Информация
         info_frame = ttk.Frame(main_frame)
@@ -209,25 +162,52 @@ class VetClinicClient:
                 messagebox.showerror("Ошибка", "Заполните все поля!")
                 return
             
-            try:
-                conn = sqlite3.connect('vet_clinic_client.db')
-                cursor = conn.cursor()
-                cursor.execute(
-                    'INSERT INTO clients (phone, name, email, registration_date) VALUES (?, ?, ?, ?)',
-                    (phone, name, email, datetime.now().strftime("%Y-%m-%d"))
-                )
-                conn.commit()
-                conn.close()
-                
+            def on_done(_):
                 messagebox.showinfo("Успех", "Регистрация завершена! Теперь вы можете войти в систему.")
                 registration_window.destroy()
-                
-            except sqlite3.IntegrityError:
-                messagebox.showerror("Ошибка", "Пользователь с таким телефоном уже существует!")
+            
+            def on_error(error):
+                import sqlite3
+                if isinstance(error, sqlite3.IntegrityError):
+                    messagebox.showerror("Ошибка", "Пользователь с таким телефоном уже существует!")
+                else:
+                    self.show_error(error)
+            
+            self.worker.submit(self.repo.register_client, phone, name, email,
+                               on_done=on_done, on_error=on_error, group='register', cancellable=False)
         
         ttk.Button(registration_window, text="Зарегистрироваться", 
                   command=register).pack(pady=20)
     
+    # --- Доступ к данным (выполняется в фоновом потоке) ---
+    
+    def fetch_login(self, phone, name):
+        """Клиент и его питомцы за одно обращение к фоновому потоку"""
+        user = self.repo.find_client(phone, name)
+        if user is None:
+            return None, []
+        return user, self.repo.client_pets(user.id)
+    
+    def fetch_free_slots(self, service, date):
+        """Ближайшие свободные окна для услуги начиная с даты: [Slot]"""
+        return self.repo.free_slots(service, date, count=SLOTS_SHOWN)
+    
+    # --- Интерфейс ---
+    
+    def set_busy(self, busy):
+        """Индикация выполнения фоновых операций"""
+        self.status_var.set("Загрузка..." if busy else "")
+        self.root.configure(cursor='watch' if busy else '')
+    
+    def show_error(self, error):
+        """Сообщение о непредвиденной ошибке фоновой операции"""
+        messagebox.showerror("Ошибка", f"Ошибка при обращении к базе данных: {error}")
+    
+    def create_status_bar(self):
+        """Строка состояния внизу окна"""
+        ttk.Label(self.root, textvariable=self.status_var, anchor='w', 
+                 padding=(10, 2)).pack(side='bottom', fill='x')
+    
     def login(self):
         """Вход в систему"""
         phone = self.phone_entry.get()
@@ -237,52 +217,24 @@ class VetClinicClient:
             messagebox.showerror("Ошибка", "Введите телефон и имя!")
             return
         
-        conn = sqlite3.connect('vet_clinic_client.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM clients WHERE phone = ? AND name = ?', (phone, name))
-        user = cursor.fetchone()
-        
+        self.worker.cancel('login')
+        self.worker.submit(self.fetch_login, phone, name, 
+                           on_done=self.on_login_done, group='login')
+    
+    def on_login_done(self, result):
+        """Переход на главный экран после проверки клиента"""
+        user, animals = result
         if user:
-            self.current_user = {
-                'phone': user[1],
-                'name': user[2],
-                'email': user[3]
-            }
-            self.load_user_animals()
+            self.current_user = user
+            self.user_animals = animals
             self.create_main_screen()
         else:
             messagebox.showerror("Ошибка", "Пользователь не найден!")
-        
-        conn.close()
-    
-    def load_user_animals(self):
-        """Загрузка животных пользователя"""
-        conn = sqlite3.connect('vet_clinic_client.db')
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'SELECT * FROM client_animals WHERE client_phone = ?', 
-            (self.current_user['phone'],)
-        )
-        self.user_animals = []
-        
-        for animal in cursor.fetchall():
-            self.user_animals.append({
-                'id': animal[0],
-                'name': animal[2],
-                'species': animal[3],
-                'breed': animal[4],
-                'age': animal[5],
-                'weight': animal[6],
-                'notes': animal[7]
-            })
-        
-        conn.close()
     
     def create_main_screen(self):
         """Создание главного экрана после входа"""
         self.clear_screen()
+        self.create_status_bar()
         
         # Верхняя панель
         header_frame = ttk.Frame(self.root, padding=10)
@@ -290,7 +242,7 @@ class VetClinicClient:
         
         welcome_label = ttk.Label(
             header_frame, 
-            text=f"Добро пожаловать, {self.current_user['name']}!",
+            text=f"Добро пожаловать, {self.current_user.name}!",
             style='Title.TLabel'
         )
         welcome_label.pack(side='left')
@@ -299,73 +251,109 @@ class VetClinicClient:
                   command=self.logout).pack(side='right')
         
         # Вкладки
-        notebook = ttk.Notebook(self.root)
+        self.notebook = notebook = ttk.Notebook(self.root)
         
         # Вкладка питомцев
         pets_frame = ttk.Frame(notebook, padding=10)
         notebook.add(pets_frame, text="Мои питомцы")
         
         # Вкладка записи
-        appointments_frame = ttk.Frame(notebook, padding=10)
-        notebook.add(appointments_frame, text="Запись на прием")
+        self.appointments_tab = ttk.Frame(notebook, padding=10)
+        notebook.add(self.appointments_tab, text="Запись на прием")
         
         # Вкладка история
-        history_frame = ttk.Frame(notebook, padding=10)
+        self.history_tab = history_frame = ttk.Frame(notebook, padding=10)
         notebook.add(history_frame, text="История посещений")
         
         notebook.pack(expand=True, fill='both', padx=10, pady=10)
+        notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
         
         # Заполнение вкладок
         self.create_pets_tab(pets_frame)
-        self.create_appointments_tab(appointments_frame)
+        self.create_appointments_tab(self.appointments_tab)
         self.create_history_tab(history_frame)
     
+    def on_tab_changed(self, event):
+        """Смена вкладки: загрузки прежней вкладки больше не нужны"""
+        self.worker.cancel('view')
+        selected = self.notebook.select()
+        if selected == str(self.appointments_tab) and self.appointments_list is not None:
+            self.update_appointments_display()
+        elif selected == str(self.history_tab) and self.history_list is not None:
+            self.update_history_display()
+    
     def create_pets_tab(self, parent):
         """Вкладка моих питомцев"""
-        # Кнопка добавления питомца
-        ttk.Button(parent, text="+ Добавить питомца", 
-                  command=self.show_add_pet_dialog).pack(anchor='w', pady=5)
-        
-        # Фрейм для карточек питомцев
-        self.pets_cards_frame = ttk.Frame(parent)
-        self.pets_cards_frame.pack(fill='both', expand=True, pady=10)
+        # Кнопка добавления питомца и поиск
+        toolbar = ttk.Frame(parent)
+        toolbar.pack(fill='x', pady=5)
+        
+        ttk.Button(toolbar, text="+ Добавить питомца", 
+                  command=self.show_add_pet_dialog).pack(side='left')
+        
+        self.pet_search_var = tk.StringVar()
+        ttk.Button(toolbar, text="Найти", 
+                  command=self.update_pets_display).pack(side='right')
+        search_entry = ttk.Entry(toolbar, textvariable=self.pet_search_var, width=25)
+        search_entry.pack(side='right', padx=5)
+        search_entry.bind('<Return>', lambda e: self.update_pets_display())
+        ttk.Label(toolbar, text="Поиск:").pack(side='right')
+        
+        # Виртуализированная сетка карточек питомцев
+        self.pets_list = VirtualList(parent, self.create_pet_card, self.fill_pet_card,
+                                     PET_CARD_HEIGHT, columns=2, key=lambda a: a.id)
+        self.pets_list.pack(fill='both', expand=True, pady=10)
         
         self.update_pets_display()
     
     def update_pets_display(self):
         """Обновление отображения питомцев"""
-        for widget in self.pets_cards_frame.winfo_children():
-            widget.destroy()
-        
         if not self.user_animals:
-            ttk.Label(self.pets_cards_frame, text="У вас пока нет зарегистрированных питомцев", 
-                     font=('Arial', 12)).pack(pady=50)
+            self.pets_list.set_items([], empty_text="У вас пока нет зарегистрированных питомцев")
             return
         
-        # Создание карточек питомцев
-        for i, animal in enumerate(self.user_animals):
-            card_frame = ttk.LabelFrame(self.pets_cards_frame, text=animal['name'], padding=10)
-            card_frame.grid(row=i//2, column=i%2, padx=10, pady=10, sticky='nsew')
-            
-            info_text = f"""Вид: {animal['species']}
-Порода: {animal['breed']}
-Возраст: {animal['age']} лет
-Вес: {animal['weight']} кг
-Особенности: {animal['notes']}"""
-            
-            ttk.Label(card_frame, text=info_text, justify='left').pack(anchor='w')
-            
-            button_frame = ttk.Frame(card_frame)
-            button_frame.pack(fill='x', pady=5)
-            
-            ttk.Button(button_frame, text="Записаться", 
-                      command=lambda a=animal: self.show_appointment_dialog(a)).pack(side='left', padx=2)
-            ttk.Button(button_frame, text="Удалить", 
-                      command=lambda a=animal: self.delete_pet(a)).pack(side='left', padx=2)
+        query = self.pet_search_var.get()
+        if build_match_query(query) is None:
+            self.render_pets(self.user_animals)
+            return
+        
+        def found(animal_ids):
+            animals_by_id = {animal.id: animal for animal in self.user_animals}
+            self.render_pets([animals_by_id[i] for i in animal_ids if i in animals_by_id])
         
-        # Настройка сетки
-        for i in range(2):
-            self.pets_cards_frame.columnconfigure(i, weight=1)
+        self.worker.cancel('pets')
+        self.worker.submit(self.repo.search_pet_ids, self.current_user.id, query,
+                           on_done=found, group='pets')
+    
+    def render_pets(self, animals):
+        """Отрисовка карточек питомцев (перерисовываются только изменившиеся)"""
+        self.pets_list.set_items(animals, empty_text="Питомцы не найдены")
+    
+    def create_pet_card(self, parent):
+        """Пустая карточка питомца для переиспользования в списке"""
+        card = ttk.LabelFrame(parent, padding=10)
+        card.info_label = ttk.Label(card, justify='left')
+        card.info_label.pack(anchor='w')
+        
+        button_frame = ttk.Frame(card)
+        button_frame.pack(fill='x', pady=5)
+        
+        card.book_button = ttk.Button(button_frame, text="Записаться")
+        card.book_button.pack(side='left', padx=2)
+        card.delete_button = ttk.Button(button_frame, text="Удалить")
+        card.delete_button.pack(side='left', padx=2)
+        return card
+    
+    def fill_pet_card(self, card, animal):
+        """Заполнение карточки данными питомца"""
+        card.configure(text=animal.name)
+        card.info_label.configure(text=f"""Вид: {animal.species}
+Порода: {animal.breed}
+Возраст: {animal.age} лет
+Вес: {animal.weight} кг
+Особенности: {animal.notes}""")
+        card.book_button.configure(command=lambda: self.show_appointment_dialog(animal))
+        card.delete_button.configure(command=lambda: self.delete_pet(animal))
     
     def show_add_pet_dialog(self):
         """Диалог добавления питомца"""
@@ -416,42 +404,40 @@ class VetClinicClient:
                 return
             
             try:
-                conn = sqlite3.connect('vet_clinic_client.db')
-                cursor = conn.cursor()
-                cursor.execute(
-                    '''INSERT INTO client_animals 
-                    (client_phone, name, species, breed, age, weight, special_notes) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                    (self.current_user['phone'], name, species, breed, int(age), float(weight), notes)
-                )
-                conn.commit()
-                conn.close()
-                
-                self.load_user_animals()
+                age = int(age)
+                weight = float(weight)
+            except ValueError as e:
+                messagebox.showerror("Ошибка", f"Ошибка при добавлении: {str(e)}")
+                return
+            
+            def on_done(pet):
+                self.user_animals.append(pet)
                 self.update_pets_display()
                 dialog.destroy()
                 messagebox.showinfo("Успех", "Питомец добавлен!")
-                
-            except Exception as e:
+            
+            def on_error(e):
                 messagebox.showerror("Ошибка", f"Ошибка при добавлении: {str(e)}")
+            
+            self.worker.submit(self.repo.add_pet, self.current_user, name, species, breed,
+                               age, weight, notes,
+                               on_done=on_done, on_error=on_error, group='session', cancellable=False)
         
         ttk.Button(dialog, text="Добавить", command=add_pet).pack(pady=10)
     
     def delete_pet(self, animal):
         """Удаление питомца"""
-        result = messagebox.askyesno("Подтверждение", f"Удалить питомца {animal['name']}?")
+        result = messagebox.askyesno("Подтверждение", f"Удалить питомца {animal.name}?")
         if result:
-            conn = sqlite3.connect('vet_clinic_client.db')
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM client_animals WHERE id = ?', (animal['id'],))
-            conn.commit()
-            conn.close()
+            def on_done(_):
+                self.user_animals = [a for a in self.user_animals if a.id != animal.id]
+                self.update_pets_display()
+                messagebox.showinfo("Успех", "Питомец удален!")
             
-            self.load_user_animals()
-            self.update_pets_display()
-            messagebox.showinfo("Успех", "Питомец удален!")
+            self.worker.submit(self.repo.remove_pet, animal.id,
+                               on_done=on_done, group='session', cancellable=False)
     
-    def create_appointments_tab(self, parent):
+    def create_appointments_tab(self, parent, selected_animal=None):
         """Вкладка записи на прием"""
         self.appointments_frame = parent
         
@@ -460,7 +446,7 @@ class VetClinicClient:
         
         # Если есть питомцы, показываем форму записи
         if self.user_animals:
-            self.show_appointment_form()
+            self.show_appointment_form(selected_animal)
         else:
             ttk.Label(parent, text="Сначала добавьте питомца для записи на прием", 
                      font=('Arial', 12)).pack(pady=50)
@@ -473,15 +459,15 @@ class VetClinicClient:
         ttk.Label(form_frame, text="Питомец:").grid(row=0, column=0, sticky='w', pady=5)
         animal_var = tk.StringVar()
         animal_combo = ttk.Combobox(form_frame, textvariable=animal_var, width=20)
-        animal_combo['values'] = [animal['name'] for animal in self.user_animals]
+        animal_combo['values'] = [animal.name for animal in self.user_animals]
         if selected_animal:
-            animal_var.set(selected_animal['name'])
+            animal_var.set(selected_animal.name)
         animal_combo.grid(row=0, column=1, pady=5, padx=10)
         
         ttk.Label(form_frame, text="Услуга:").grid(row=1, column=0, sticky='w', pady=5)
         service_var = tk.StringVar()
         service_combo = ttk.Combobox(form_frame, textvariable=service_var, width=20)
-        service_combo['values'] = ["Осмотр", "Вакцинация", "Стерилизация", "Чистка зубов", "Стрижка", "Экстренный прием"]
+        service_combo['values'] = SERVICES
         service_combo.grid(row=1, column=1, pady=5, padx=10)
         
         ttk.Label(form_frame, text="Дата:").grid(row=2, column=0, sticky='w', pady=5)
@@ -494,14 +480,47 @@ class VetClinicClient:
         
         ttk.Label(form_frame, text="Время:").grid(row=3, column=0, sticky='w', pady=5)
         time_var = tk.StringVar()
-        time_combo = ttk.Combobox(form_frame, textvariable=time_var, width=20)
-        time_combo['values'] = ["09:00", "10:00", "11:00", "12:00", "14:00", "15:00", "16:00", "17:00"]
+        time_combo = ttk.Combobox(form_frame, textvariable=time_var, width=20, state='readonly')
         time_combo.grid(row=3, column=1, pady=5, padx=10)
+        slots_var = tk.StringVar()
+        ttk.Label(form_frame, textvariable=slots_var, foreground='gray').grid(
+            row=3, column=2, sticky='w', padx=10)
         
         ttk.Label(form_frame, text="Примечания:").grid(row=4, column=0, sticky='w', pady=5)
         notes_text = tk.Text(form_frame, width=20, height=4)
         notes_text.grid(row=4, column=1, pady=5, padx=10)
         
+        def refresh_slots(event=None):
+            """Свободное время на выбранную дату по расписанию врачей"""
+            service = service_var.get()
+            date = date_var.get().strip()
+            if not service or not date:
+                return
+            
+            def loaded(slots):
+                times = [slot.time for slot in slots if slot.date == date]
+                time_combo['values'] = times
+                if time_var.get() not in times:
+                    time_var.set(times[0] if times else "")
+                if times:
+                    slots_var.set(f"Свободно: {len(times)}")
+                elif slots:
+                    slots_var.set(f"На эту дату мест нет, ближайшее: {slots[0].date} {slots[0].time}")
+                else:
+                    slots_var.set("Свободного времени нет")
+            
+            def failed(e):
+                time_combo['values'] = []
+                slots_var.set("Дата в формате ГГГГ-ММ-ДД")
+            
+            self.worker.cancel('slots')
+            self.worker.submit(self.fetch_free_slots, service, date,
+                               on_done=loaded, on_error=failed, group='slots')
+        
+        service_combo.bind('<<ComboboxSelected>>', refresh_slots)
+        date_entry.bind('<FocusOut>', refresh_slots)
+        date_entry.bind('<Return>', refresh_slots)
+        
         def make_appointment():
             animal_name = animal_var.get()
             service = service_var.get()
@@ -513,123 +532,154 @@ class VetClinicClient:
                 messagebox.showerror("Ошибка", "Заполните все обязательные поля!")
                 return
             
-            try:
-                conn = sqlite3.connect('vet_clinic_client.db')
-                cursor = conn.cursor()
-                cursor.execute(
-                    '''INSERT INTO appointments 
-                    (client_phone, animal_name, service_type, appointment_date, appointment_time, status, doctor, notes) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                    (self.current_user['phone'], animal_name, service, date, time, 'Ожидание', 'Не назначен', notes)
-                )
-                conn.commit()
-                conn.close()
-                
+            # Запись ссылается на питомца по id, а не по кличке
+            index = animal_combo.current()
+            if index < 0:
+                matches = [i for i, a in enumerate(self.user_animals) if a.name == animal_name]
+                index = matches[0] if matches else -1
+            if index < 0:
+                messagebox.showerror("Ошибка", "Выберите питомца из списка!")
+                return
+            animal = self.user_animals[index]
+            
+            def on_done(appointment):
                 messagebox.showinfo("Успех", "Запись создана! Ожидайте подтверждения от администратора.")
+                self.worker.cancel('slots')
                 form_frame.destroy()
-                self.update_appointments_display()
-                
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Ошибка при создании записи: {str(e)}")
+                if self.appointments is None:
+                    self.update_appointments_display()
+                else:
+                    self.render_appointments([appointment] + self.appointments)
+            
+            def on_error(e):
+                from scheduling import SlotUnavailable
+                if isinstance(e, SlotUnavailable):
+                    messagebox.showerror("Ошибка", f"{e}. Выберите другое время.")
+                    refresh_slots()
+                else:
+                    messagebox.showerror("Ошибка", f"Ошибка при создании записи: {str(e)}")
+            
+            self.worker.submit(self.repo.book_appointment, self.current_user.id,
+                               animal, service, date, time, notes, STATUS_PENDING,
+                               on_done=on_done, on_error=on_error, group='session', cancellable=False)
         
         ttk.Button(form_frame, text="Записаться", 
                   command=make_appointment).grid(row=5, column=0, columnspan=2, pady=10)
         
         # Показ текущих записей
+        list_frame = ttk.LabelFrame(self.appointments_frame, text="Мои записи", padding=10)
+        list_frame.pack(fill='both', expand=True, pady=10)
+        self.appointments_list = VirtualList(list_frame, self.create_appointment_row,
+                                             self.fill_appointment_row, APPOINTMENT_ROW_HEIGHT,
+                                             key=lambda a: a.id)
+        self.appointments_list.pack(fill='both', expand=True)
+        self.appointments = None
         self.update_appointments_display()
     
     def show_appointment_dialog(self, animal):
-        """Диалог быстрой записи для конкретного животного"""
-        self.appointments_frame.destroy()
-        self.appointments_frame = ttk.Frame(ttk.Notebook(self.root).winfo_children()[1])  # Получаем вкладку записей
-        self.appointments_frame.pack(fill='both', expand=True)
-        self.show_appointment_form(animal)
+        """Переход к записи на прием для конкретного животного"""
+        for widget in self.appointments_tab.winfo_children():
+            widget.destroy()
+        self.notebook.select(self.appointments_tab)
+        self.create_appointments_tab(self.appointments_tab, animal)
     
     def update_appointments_display(self):
         """Обновление отображения записей"""
-        # Загрузка записей пользователя
-        conn = sqlite3.connect('vet_clinic_client.db')
-        cursor = conn.cursor()
-        cursor.execute(
-            'SELECT * FROM appointments WHERE client_phone = ? ORDER BY appointment_date DESC', 
-            (self.current_user['phone'],)
-        )
-        appointments = cursor.fetchall()
-        conn.close()
+        if self.appointments is None:
+            self.appointments_list.set_items([], empty_text="Загрузка записей...")
         
-        # Создание фрейма для отображения записей
-        if hasattr(self, 'appointments_list_frame'):
-            self.appointments_list_frame.destroy()
-        
-        self.appointments_list_frame = ttk.LabelFrame(self.appointments_frame, text="Мои записи", padding=10)
-        self.appointments_list_frame.pack(fill='both', expand=True, pady=10)
-        
-        if not appointments:
-            ttk.Label(self.appointments_list_frame, text="У вас пока нет записей").pack(pady=20)
-            return
-        
-        for appointment in appointments:
-            appt_frame = ttk.Frame(self.appointments_list_frame, relief='solid', padding=10)
-            appt_frame.pack(fill='x', pady=5, padx=5)
-            
-            status_color = '#90EE90' if appointment[6] == 'Подтвержден' else '#FFB6C1'
-            appt_frame.configure(style='')
-            
-            info_text = f"""Животное: {appointment[2]}
-Услуга: {appointment[3]}
-Дата: {appointment[4]} {appointment[5]}
-Статус: {appointment[6]}
-Врач: {appointment[7]}"""
-            
-            if appointment[8]:
-                info_text += f"\nПримечания: {appointment[8]}"
-            
-            ttk.Label(appt_frame, text=info_text, justify='left').pack(anchor='w')
-            
-            if appointment[6] == 'Ожидание':
-                ttk.Button(appt_frame, text="Отменить запись", 
-                          command=lambda a=appointment: self.cancel_appointment(a)).pack(anchor='e')
+        # Загрузка записей пользователя в фоне
+        self.worker.cancel('view')
+        self.worker.submit(self.repo.client_appointments, self.current_user.id,
+                           on_done=self.render_appointments, group='view')
+    
+    def render_appointments(self, appointments):
+        """Отрисовка списка записей (новые первыми)"""
+        self.appointments = sorted(appointments, key=lambda a: a.date or '', reverse=True)
+        self.appointments_list.set_items(self.appointments, empty_text="У вас пока нет записей")
+    
+    def create_appointment_row(self, parent):
+        """Пустая строка записи для переиспользования в списке"""
+        row = ttk.Frame(parent, relief='solid', padding=10)
+        row.info_label = ttk.Label(row, justify='left')
+        row.info_label.pack(anchor='w')
+        row.cancel_button = ttk.Button(row, text="Отменить запись")
+        return row
+    
+    def fill_appointment_row(self, row, appointment):
+        """Заполнение строки данными записи"""
+        info_text = f"""Животное: {appointment.animal_name}
+Услуга: {appointment.service}
+Дата: {appointment.date} {appointment.time}
+Статус: {appointment.status}
+Врач: {appointment.doctor}"""
+        
+        if appointment.notes:
+            info_text += f"\nПримечания: {appointment.notes}"
+        
+        row.info_label.configure(text=info_text)
+        
+        if appointment.status == STATUS_PENDING:
+            row.cancel_button.configure(command=lambda: self.cancel_appointment(appointment))
+            row.cancel_button.pack(anchor='e')
+        else:
+            row.cancel_button.pack_forget()
     
     def cancel_appointment(self, appointment):
         """Отмена записи"""
         result = messagebox.askyesno("Подтверждение", "Отменить запись?")
         if result:
-            conn = sqlite3.connect('vet_clinic_client.db')
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM appointments WHERE id = ?', (appointment[0],))
-            conn.commit()
-            conn.close()
+            def on_done(_):
+                if self.appointments is None:
+                    self.update_appointments_display()
+                else:
+                    self.render_appointments([a for a in self.appointments if a.id != appointment.id])
+                messagebox.showinfo("Успех", "Запись отменена!")
             
-            self.update_appointments_display()
-            messagebox.showinfo("Успех", "Запись отменена!")
+            self.worker.submit(self.repo.remove_appointment, appointment.id,
+                               on_done=on_done, group='session', cancellable=False)
     
     def create_history_tab(self, parent):
-        """Вкладка истории посещений"""
+        """Вкладка истории посещений (визиты питомцев из карточек клиники)"""
         ttk.Label(parent, text="История посещений и медицинские записи", 
                  style='Header.TLabel').pack(pady=10)
         
-        # Демо-история (в реальной системе здесь были бы данные из БД)
-        history_data = [
-            {"date": "2024-11-15", "animal": "Барсик", "service": "Вакцинация", "doctor": "Др. Смирнова", "diagnosis": "Здоров", "recommendations": "Повторная вакцинация через год"},
-            {"date": "2024-09-10", "animal": "Рекс", "service": "Осмотр", "doctor": "Др. Иванов", "diagnosis": "Легкая аллергия", "recommendations": "Сменить корм"},
-            {"date": "2024-07-05", "animal": "Барсик", "service": "Стрижка", "doctor": "Др. Петрова", "diagnosis": "-", "recommendations": "Регулярный уход за шерстью"},
-        ]
+        self.history_list = VirtualList(parent, self.create_visit_row, self.fill_visit_row,
+                                        VISIT_ROW_HEIGHT, key=lambda v: v.id,
+                                        empty_text="Загрузка истории...")
+        self.history_list.pack(fill='both', expand=True, pady=10)
+    
+    def update_history_display(self):
+        """Загрузка визитов всех питомцев клиента одним запросом"""
+        def loaded(visits):
+            self.history_list.set_items(visits, empty_text="Посещений пока не было")
         
-        for visit in history_data:
-            visit_frame = ttk.LabelFrame(parent, text=f"{visit['date']} - {visit['animal']}", padding=10)
-            visit_frame.pack(fill='x', pady=5, padx=10)
-            
-            visit_text = f"""Услуга: {visit['service']}
-Врач: {visit['doctor']}
-Диагноз: {visit['diagnosis']}
-Рекомендации: {visit['recommendations']}"""
-            
-            ttk.Label(visit_frame, text=visit_text, justify='left').pack(anchor='w')
+        self.worker.submit(self.repo.client_visits, self.current_user.id,
+                           on_done=loaded, group='view')
+    
+    def create_visit_row(self, parent):
+        """Пустая строка визита для переиспользования в списке"""
+        row = ttk.LabelFrame(parent, padding=10)
+        row.info_label = ttk.Label(row, justify='left')
+        row.info_label.pack(anchor='w')
+        return row
+    
+    def fill_visit_row(self, row, visit):
+        """Заполнение строки данными визита"""
+        row.configure(text=f"{visit.visit_date[:10]} - {visit.animal_name}")
+        row.info_label.configure(text=f"""Диагноз: {visit.diagnosis or '-'}
+Лечение: {visit.treatment or '-'}
+Стоимость: {visit.cost or 0:.2f} руб.""")
     
     def logout(self):
         """Выход из системы"""
+        # Результаты загрузок прежнего пользователя отбрасываются
+        self.worker.cancel('session', 'view', 'pets', 'slots')
         self.current_user = None
         self.user_animals = []
+        self.appointments_list = None
+        self.appointments = None
+        self.history_list = None
         self.create_login_screen()
     
     def clear_screen(self):
@@ -637,10 +687,37 @@ class VetClinicClient:
         for widget in self.root.winfo_children():
             widget.destroy()
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Клиентский портал ветлечебницы")
+    parser.add_argument('--demo', action='store_true', help="Добавить демо-клиентов и питомцев")
+    parser.add_argument('--dedup', action='store_true',
+                        help="Удалить дубли питомцев и записей и выйти")
+    parser.add_argument('--import-portal', metavar='PATH',
+                        help="Перенести данные из старой базы портала (vet_clinic_client.db) и выйти")
+    args = parser.parse_args(argv)
+    
+    if args.dedup or args.import_portal:
+        from repository import open_repository, DB_NAME
+        repo = open_repository(DB_NAME)
+        try:
+            if args.import_portal:
+                moved = repo.import_portal_database(args.import_portal)
+                print(f"Перенесено: клиентов {moved['clients']}, питомцев {moved['pets']}, "
+                      f"записей {moved['appointments']} (пропущено с неверной датой: {moved['skipped']})")
+            if args.dedup:
+                removed = repo.deduplicate()
+                print(f"Удалено дублей: питомцев {removed['animals']}, записей {removed['appointments']}")
+        finally:
+            repo.close()
+        return
+    
     root = tk.Tk()
-    app = VetClinicClient(root)
+    app = VetClinicClient(root, demo=args.demo)
     root.mainloop()
+    if app.worker is not None:
+        app.worker.shutdown()
+    if app.repo is not None:
+        app.repo.close()
 
 if __name__ == "__main__":
     main()
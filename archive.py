@@ -0,0 +1,287 @@
+# archive.py
+"""Архив старой истории визитов и записей на прием
+
+Визиты и записи старше горизонта (по умолчанию год) переносятся из основной
+базы в архивные файлы по годам рядом с ней: vet_clinic_archive_2019.db и
+т.д. Основные таблицы и их индексы остаются небольшими, а обычные запросы
+(история животного, записи клиента) читают только их. Полная история
+собирается из основной базы и архивов по явному запросу: архивные файлы
+подключаются к соединению потока через ATTACH по мере надобности.
+
+Перенос идет порциями: сначала строки копируются в архив (INSERT OR IGNORE),
+затем отдельной транзакцией удаляются из основной базы. При сбое между
+этими шагами строка окажется в обоих местах и будет перенесена повторно;
+чтение полной истории такие повторы отбрасывает. Сводная статистика
+продолжает учитывать перенесенные визиты: на время удаления триггер
+статистики отключается, а итоги по дням сохраняются в stats_archived_daily.
+
+    python archive.py --days 365   - перенос истории старше года
+    python archive.py --list       - архивные файлы и число строк в них
+"""
+import glob
+import os
+import re
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+from clinic_stats import STATS_ARCHIVED_TABLE
+
+# Горизонт "горячих" данных по умолчанию, дней
+ARCHIVE_HORIZON_DAYS = 365
+# Строк, переносимых одной транзакцией
+ARCHIVE_BATCH = 5000
+
+VISIT_COLUMNS = 'id, animal_id, visit_date, diagnosis, treatment, cost'
+APPOINTMENT_COLUMNS = ('id, client_id, animal_id, service_id, status_id, doctor_id, '
+                       'appointment_date, appointment_time, notes, start_minute, end_minute')
+
+# Миграция основной базы
+ARCHIVE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS archive_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        moving INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    'INSERT OR IGNORE INTO archive_state (id) VALUES (1)',
+    STATS_ARCHIVED_TABLE,
+    # Удаление при переносе в архив не уменьшает статистику
+    'DROP TRIGGER IF EXISTS trg_stats_visits_delete',
+    '''
+    CREATE TRIGGER trg_stats_visits_delete AFTER DELETE ON visits
+    WHEN (SELECT moving FROM archive_state WHERE id = 1) = 0
+    BEGIN
+        UPDATE stats_totals
+        SET total_visits = total_visits - 1,
+            total_income = total_income - COALESCE(OLD.cost, 0)
+        WHERE id = 1;
+        UPDATE stats_daily SET visits = visits - 1, income = income - COALESCE(OLD.cost, 0)
+            WHERE day = COALESCE(substr(OLD.visit_date, 1, 10), '');
+        DELETE FROM stats_daily WHERE day = COALESCE(substr(OLD.visit_date, 1, 10), '') AND visits <= 0;
+        UPDATE stats_monthly SET visits = visits - 1, income = income - COALESCE(OLD.cost, 0)
+            WHERE month = COALESCE(substr(OLD.visit_date, 1, 7), '');
+        DELETE FROM stats_monthly WHERE month = COALESCE(substr(OLD.visit_date, 1, 7), '') AND visits <= 0;
+    END
+    ''',
+]
+
+# Таблицы архивного файла (schema - имя подключенной базы)
+ARCHIVE_FILE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS {schema}.visits (
+        id INTEGER PRIMARY KEY,
+        animal_id INTEGER,
+        visit_date TEXT,
+        diagnosis TEXT,
+        treatment TEXT,
+        cost REAL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_visits_animal_date ON visits (animal_id, visit_date)',
+    '''
+    CREATE TABLE IF NOT EXISTS {schema}.appointments (
+        id INTEGER PRIMARY KEY,
+        client_id INTEGER,
+        animal_id INTEGER,
+        service_id INTEGER,
+        status_id INTEGER,
+        doctor_id INTEGER,
+        appointment_date TEXT,
+        appointment_time TEXT,
+        notes TEXT,
+        start_minute INTEGER,
+        end_minute INTEGER
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_appointments_client_date ON appointments (client_id, appointment_date)',
+]
+
+
+def horizon_date(days=ARCHIVE_HORIZON_DAYS, now=None):
+    """Дата (YYYY-MM-DD), раньше которой история переносится в архив"""
+    return ((now or datetime.now()) - timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+class VisitArchive:
+    def __init__(self, db):
+        self.db = db
+        base, _ = os.path.splitext(os.path.abspath(db.db_name))
+        self.prefix = base + '_archive_'
+
+    def path(self, year):
+        return f'{self.prefix}{year}.db'
+
+    def years(self):
+        """Годы, для которых есть архивные файлы"""
+        pattern = re.compile(re.escape(self.prefix) + r'(\d{4})\.db$')
+        matches = (pattern.match(path) for path in glob.glob(glob.escape(self.prefix) + '*.db'))
+        return sorted(match.group(1) for match in matches if match)
+
+    def _attach(self, year):
+        """Подключение архива года к соединению текущего потока; имя схемы"""
+        schema = f'archive_{year}'
+        conn = self.db.connection()
+        attached = [row[1] for row in conn.execute('PRAGMA database_list')]
+        if schema in attached:
+            return schema
+        # Лимит подключенных баз невелик (по умолчанию 10): освобождаем место
+        if len(attached) - 1 >= conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED):
+            for name in attached:
+                if name.startswith('archive_'):
+                    conn.execute(f'DETACH DATABASE {name}')
+        conn.execute('ATTACH DATABASE ? AS ' + schema, (self.path(year),))
+        return schema
+
+    # --- Перенос ---
+
+    def move(self, before, batch_size=ARCHIVE_BATCH):
+        """Перенос визитов и записей с датой раньше before в архивы по годам"""
+        moved = {'visits': 0, 'appointments': 0}
+        cursor = self.db.cursor()
+        cursor.execute('''
+            SELECT substr(visit_date, 1, 4) FROM visits WHERE visit_date < ?
+            UNION
+            SELECT substr(appointment_date, 1, 4) FROM appointments WHERE appointment_date < ?
+        ''', (before, before))
+        years = sorted(row[0] for row in cursor.fetchall() if row[0] and row[0].isdigit())
+
+        for year in years:
+            schema = self._attach(year)
+            with self.db.transaction(immediate=True) as cursor:
+                for sql in ARCHIVE_FILE_SCHEMA:
+                    cursor.execute(sql.format(schema=schema))
+            upper = min(before, str(int(year) + 1))
+            moved['visits'] += self._move_rows(schema, 'visits', 'visit_date', VISIT_COLUMNS,
+                                               year, upper, batch_size, keep_stats=True)
+            moved['appointments'] += self._move_rows(schema, 'appointments', 'appointment_date',
+                                                     APPOINTMENT_COLUMNS, year, upper, batch_size)
+        return moved
+
+    def _move_rows(self, schema, table, date_column, columns, lower, upper, batch_size, keep_stats=False):
+        where = f'{date_column} >= :lower AND {date_column} < :upper AND id <= :last'
+        total = 0
+        while True:
+            params = {'lower': lower, 'upper': upper}
+            cursor = self.db.cursor()
+            cursor.execute(
+                f'''SELECT id FROM main.{table} WHERE {date_column} >= :lower AND {date_column} < :upper
+                ORDER BY id LIMIT 1 OFFSET {batch_size - 1}''', params
+            )
+            row = cursor.fetchone()
+            params['last'] = row[0] if row else sys.maxsize
+
+            with self.db.transaction(immediate=True) as cursor:
+                cursor.execute(
+                    f'INSERT OR IGNORE INTO {schema}.{table} ({columns}) '
+                    f'SELECT {columns} FROM main.{table} WHERE {where}', params
+                )
+            # Удаляются только строки, уже лежащие в архиве
+            archived = f'{where} AND id IN (SELECT id FROM {schema}.{table} WHERE id <= :last)'
+            with self.db.transaction(immediate=True) as cursor:
+                if keep_stats:
+                    self._archive_stats(cursor, archived, params)
+                    cursor.execute('UPDATE archive_state SET moving = 1 WHERE id = 1')
+                cursor.execute(f'DELETE FROM main.{table} WHERE {archived}', params)
+                count = cursor.rowcount
+                if keep_stats:
+                    cursor.execute('UPDATE archive_state SET moving = 0 WHERE id = 1')
+            total += count
+            if row is None:
+                return total
+
+    @staticmethod
+    def _archive_stats(cursor, where, params):
+        # Итоги по дням переносимых визитов остаются в статистике
+        cursor.execute(f'''
+            INSERT INTO stats_archived_daily (day, visits, income)
+            SELECT COALESCE(substr(visit_date, 1, 10), ''), COUNT(*), COALESCE(SUM(cost), 0)
+            FROM main.visits WHERE {where} GROUP BY 1
+            ON CONFLICT (day) DO UPDATE SET visits = visits + excluded.visits,
+                                            income = income + excluded.income
+        ''', params)
+
+    # --- Чтение ---
+
+    def _select(self, sql, params):
+        """Строки запроса по всем архивам; {schema} - имя подключенного архива"""
+        rows = []
+        for year in self.years():
+            schema = self._attach(year)
+            rows.extend(self.db.execute(sql.format(schema=schema), params).fetchall())
+        return rows
+
+    def animal_visits(self, animal_id):
+        return self._select(
+            f'SELECT {VISIT_COLUMNS} FROM {{schema}}.visits WHERE animal_id = ?', (animal_id,)
+        )
+
+    def client_visits(self, client_id):
+        return self._select('''
+            SELECT v.id, v.animal_id, v.visit_date, v.diagnosis, v.treatment, v.cost, p.name
+            FROM main.client_animals p
+            JOIN {schema}.visits v ON v.animal_id = p.animal_id
+            WHERE p.client_id = ?
+        ''', (client_id,))
+
+    def client_appointments(self, client_id):
+        return self._select('''
+            SELECT ap.id, ap.client_id, COALESCE(a.name, '—'), s.name,
+                   ap.appointment_date, ap.appointment_time, st.name, d.name, ap.notes
+            FROM {schema}.appointments ap
+            LEFT JOIN main.client_animals a ON a.id = ap.animal_id
+            LEFT JOIN main.services s ON s.id = ap.service_id
+            LEFT JOIN main.appointment_statuses st ON st.id = ap.status_id
+            LEFT JOIN main.doctors d ON d.id = ap.doctor_id
+            WHERE ap.client_id = ?
+        ''', (client_id,))
+
+    def schemas(self):
+        """(год, имя схемы) по архивам; каждый подключается, когда до него дошла очередь"""
+        for year in self.years():
+            yield year, self._attach(year)
+
+    def summary(self):
+        """[(год, визитов, записей)] по архивным файлам"""
+        return [
+            (year,) + tuple(self.db.execute(
+                f'SELECT (SELECT COUNT(*) FROM {schema}.visits), '
+                f'(SELECT COUNT(*) FROM {schema}.appointments)'
+            ).fetchone())
+            for year, schema in self.schemas()
+        ]
+
+
+def merge_history(hot, archived, key):
+    """Объединение строк основной базы и архивов без повторов, новые первыми"""
+    seen = {record.id for record in hot}
+    merged = list(hot) + [record for record in archived if record.id not in seen]
+    merged.sort(key=key, reverse=True)
+    return merged
+
+
+def main(argv=None):
+    import argparse
+    from repository import open_repository, DB_NAME
+
+    parser = argparse.ArgumentParser(description="Архивирование старой истории визитов и записей")
+    parser.add_argument('--db', default=DB_NAME, help="Файл базы данных")
+    parser.add_argument('--days', type=int, default=ARCHIVE_HORIZON_DAYS,
+                        help="Переносить историю старше стольких дней")
+    parser.add_argument('--list', action='store_true', help="Показать архивы и выйти")
+    args = parser.parse_args(argv)
+
+    repo = open_repository(args.db)
+    try:
+        if not args.list:
+            moved = repo.archive_history(args.days)
+            print(f"Перенесено в архив: визитов {moved['visits']}, записей {moved['appointments']}")
+        for year, visits, appointments in repo.archive.summary():
+            print(f"  {repo.archive.path(year)}: визитов {visits}, записей {appointments}")
+    finally:
+        repo.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
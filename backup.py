@@ -0,0 +1,257 @@
+# backup.py
+"""Резервные копии базы на ходу
+
+Снимок снимается через online backup API SQLite, не останавливая работу с
+базой. Страницы копируются порциями по BACKUP_PAGES: каждая порция - своя
+короткая транзакция чтения, между порциями делается пауза, чтобы копия не
+задерживала запись и контрольные точки WAL. Если базу меняет другое
+соединение, SQLite начинает копирование заново; после BACKUP_RESTARTS таких
+перезапусков остаток снимается за один шаг - одной транзакцией чтения,
+которая в режиме WAL писателей не блокирует.
+
+Снимок - файл <база>_ГГГГММДД-ЧЧММСС-мкс.db.gz в каталоге <база>_backups рядом
+с базой и контрольная сумма SHA-256 рядом с ним (.sha256, формат sha256sum).
+Файлы пишутся через временные, сумма - последней, поэтому снимок без суммы
+считается незавершенным. Хранятся последние BACKUP_KEEP снимков. Архивные
+файлы истории (archive.py) в снимок не входят.
+
+Восстановление сначала сверяет контрольную сумму и проверяет распакованную
+копию через PRAGMA integrity_check, затем переписывает страницы рабочей
+базы тем же backup API, так что открытые соединения сразу видят
+восстановленные данные.
+
+    python backup.py create               - снять снимок
+    python backup.py list                 - снимки и их размер
+    python backup.py verify [снимок]      - проверка (по умолчанию последнего)
+    python backup.py restore снимок       - восстановление базы из снимка
+    python backup.py schedule --every 3600 - снимки по расписанию
+"""
+import glob
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import quote
+
+# Страниц, копируемых за один шаг (при странице 4 КБ - 4 МБ)
+BACKUP_PAGES = 1024
+# Пауза между шагами копирования, секунд
+BACKUP_PAUSE = 0.01
+# Перезапусков из-за записи, после которых остаток копируется за один шаг
+BACKUP_RESTARTS = 3
+# Сколько последних снимков хранить
+BACKUP_KEEP = 7
+# Интервал снимков по расписанию, секунд
+BACKUP_INTERVAL = 24 * 60 * 60
+
+SNAPSHOT_SUFFIX = '.db.gz'
+CHECKSUM_SUFFIX = '.sha256'
+
+
+class _Restarted(Exception):
+    """Копирование слишком часто начиналось заново"""
+
+
+def backup_path(db_name):
+    """Каталог снимков рядом с базой: vet_clinic_backups"""
+    return os.path.splitext(db_name)[0] + '_backups'
+
+
+def snapshots(directory):
+    """Завершенные снимки каталога (с контрольной суммой), старые первыми"""
+    paths = glob.glob(os.path.join(glob.escape(directory), '*' + SNAPSHOT_SUFFIX))
+    return sorted(path for path in paths if os.path.exists(path + CHECKSUM_SUFFIX))
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def copy_database(source, target, pages=BACKUP_PAGES, pause=BACKUP_PAUSE, restarts=BACKUP_RESTARTS):
+    """Копия базы соединения source в соединение target порциями по pages страниц"""
+    remaining = None
+    restarted = 0
+
+    def progress(status, left, total):
+        nonlocal remaining, restarted
+        if remaining is not None and left >= remaining:
+            restarted += 1
+            if restarted > restarts:
+                raise _Restarted()
+        remaining = left
+        time.sleep(pause)
+
+    try:
+        source.backup(target, pages=pages, progress=progress)
+    except _Restarted:
+        source.backup(target)
+
+
+def create_snapshot(db_name, directory=None, pages=BACKUP_PAGES):
+    """Снимок базы в каталоге directory (по умолчанию рядом с базой); путь снимка"""
+    directory = directory or backup_path(db_name)
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.splitext(os.path.basename(db_name))[0]
+    path = os.path.join(directory, f"{base}_{datetime.now():%Y%m%d-%H%M%S-%f}{SNAPSHOT_SUFFIX}")
+    copy = path + '.tmp.db'
+    packed = path + '.tmp'
+    try:
+        source = sqlite3.connect(db_name, timeout=5)
+        target = sqlite3.connect(copy)
+        try:
+            copy_database(source, target, pages)
+            # Копия наследует режим WAL: переводим в обычный журнал, чтобы снимок был одним файлом
+            target.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            target.close()
+            source.close()
+        with open(copy, 'rb') as f, gzip.open(packed, 'wb', compresslevel=6) as out:
+            shutil.copyfileobj(f, out, 1 << 20)
+        os.replace(packed, path)
+        with open(path + CHECKSUM_SUFFIX + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(f"{_sha256(path)}  {os.path.basename(path)}\n")
+        os.replace(path + CHECKSUM_SUFFIX + '.tmp', path + CHECKSUM_SUFFIX)
+    finally:
+        for temporary in (copy, packed):
+            if os.path.exists(temporary):
+                os.remove(temporary)
+    return path
+
+
+def prune(directory, keep=BACKUP_KEEP):
+    """Удаление снимков сверх keep последних; удаленные пути"""
+    old = snapshots(directory)[:-keep] if keep > 0 else []
+    for path in old:
+        os.remove(path + CHECKSUM_SUFFIX)
+        os.remove(path)
+    return old
+
+
+@contextmanager
+def _unpacked(snapshot):
+    """Распакованная во временный файл копия снимка после сверки контрольной суммы"""
+    try:
+        with open(snapshot + CHECKSUM_SUFFIX, encoding='utf-8') as f:
+            expected = f.read().split()[0]
+    except (OSError, IndexError):
+        raise ValueError(f"Нет контрольной суммы снимка {snapshot}")
+    if _sha256(snapshot) != expected:
+        raise ValueError(f"Контрольная сумма снимка {snapshot} не совпадает")
+
+    path = snapshot + '.restore.db'
+    try:
+        try:
+            with gzip.open(snapshot, 'rb') as f, open(path, 'wb') as out:
+                shutil.copyfileobj(f, out, 1 << 20)
+        except (OSError, EOFError, zlib.error) as e:
+            raise ValueError(f"Снимок {snapshot} не распаковывается: {e}")
+        yield path
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _integrity_problems(path):
+    conn = sqlite3.connect(f'file:{quote(path)}?mode=ro', uri=True)
+    try:
+        rows = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+    except sqlite3.DatabaseError as e:
+        return [str(e)]
+    finally:
+        conn.close()
+    return [] if rows == ['ok'] else rows
+
+
+def verify_snapshot(snapshot):
+    """Проверка снимка: контрольная сумма и integrity_check; пустой список - снимок цел"""
+    try:
+        with _unpacked(snapshot) as path:
+            return _integrity_problems(path)
+    except ValueError as e:
+        return [str(e)]
+
+
+def restore_snapshot(snapshot, target):
+    """Перезапись базы соединения target данными проверенного снимка"""
+    with _unpacked(snapshot) as path:
+        problems = _integrity_problems(path)
+        if problems:
+            raise ValueError(f"Снимок {snapshot} поврежден: {problems[0]}")
+        source = sqlite3.connect(path)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+
+
+def print_snapshots(paths):
+    if not paths:
+        print("Снимков нет")
+    for path in paths:
+        print(f"  {path}: {os.path.getsize(path) / (1 << 20):.1f} МБ")
+
+
+def main(argv=None):
+    import argparse
+    from repository import open_repository, DB_NAME
+
+    parser = argparse.ArgumentParser(description="Резервные копии базы")
+    parser.add_argument('command', choices=['create', 'list', 'verify', 'restore', 'schedule'])
+    parser.add_argument('snapshot', nargs='?', help="Файл снимка (для verify и restore)")
+    parser.add_argument('--db', default=DB_NAME, help="Файл базы данных")
+    parser.add_argument('--dir', help="Каталог снимков (по умолчанию рядом с базой)")
+    parser.add_argument('--keep', type=int, default=BACKUP_KEEP, help="Хранить снимков не больше")
+    parser.add_argument('--every', type=int, default=BACKUP_INTERVAL, help="Интервал снимков, секунд")
+    args = parser.parse_args(argv)
+
+    directory = args.dir or backup_path(args.db)
+    if args.command == 'list':
+        print_snapshots(snapshots(directory))
+        return 0
+    if args.command == 'verify':
+        found = snapshots(directory)
+        snapshot = args.snapshot or (found[-1] if found else None)
+        if snapshot is None:
+            print("Снимков нет")
+            return 1
+        problems = verify_snapshot(snapshot)
+        for problem in problems:
+            print(f"Ошибка: {problem}")
+        if not problems:
+            print(f"Снимок {snapshot} цел")
+        return 1 if problems else 0
+    if args.command == 'restore' and not args.snapshot:
+        parser.error("укажите файл снимка")
+
+    repo = open_repository(args.db)
+    try:
+        if args.command == 'restore':
+            repo.restore_backup(args.snapshot, directory)
+            print(f"База восстановлена из {args.snapshot}")
+            return 0
+        while True:
+            print(f"Снимок: {repo.backup(directory, args.keep)}")
+            if args.command == 'create':
+                return 0
+            time.sleep(args.every)
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        return 1
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        repo.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+# benchmark.py
+"""Измерение производительности операций клиники на синтетических данных
+
+    python benchmark.py --visits 100000 --output results.json
+    python benchmark.py --visits 100000 --compare baseline.json --threshold 1.5
+
+Без графического интерфейса замеряются методы VetClinicDB и репозитория
+портала, а также время запуска консоли (до меню и до первого ответа базы) и
+портала (до окна входа и до открытия базы; без дисплея пропускается).
+Результаты (минимум, медиана, p95 в миллисекундах)
+записываются в JSON; с --compare медианы сравниваются с прошлым прогоном и
+при замедлении больше порога программа завершается с кодом 1.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from synthetic_data import ClinicDataset, populate, DIAGNOSES, SERVICES
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Портал в отдельном процессе: метки печатаются после отрисовки окна входа и открытия базы
+PORTAL_STARTUP = """
+import tkinter as tk
+import app
+root = tk.Tk()
+client = app.VetClinicClient(root)
+root.update()
+print('login', flush=True)
+while client.repo is None:
+    root.update()
+print('ready', flush=True)
+client.worker.shutdown()
+client.repo.close()
+root.destroy()
+"""
+
+
+def measure(func, repeat):
+    """Время выполнения func в миллисекундах для каждого из repeat запусков"""
+    timings = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        func(i)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def summarize(timings):
+    ordered = sorted(timings)
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return {
+        'runs': len(ordered),
+        'min_ms': round(ordered[0], 4),
+        'median_ms': round(statistics.median(ordered), 4),
+        'p95_ms': round(ordered[p95_index], 4),
+        'mean_ms': round(statistics.fmean(ordered), 4),
+    }
+
+
+def run_benchmarks(db_name, info, repeat, seed=7):
+    from main import VetClinicDB
+
+    rng = random.Random(seed)
+    clinic = VetClinicDB(db_name)
+    repo = clinic.repo
+
+    animal_ids = [rng.randint(1, info['animals']) for _ in range(repeat)]
+    logins = [rng.choice(info['clients']) for _ in range(repeat)]
+    words = [rng.choice(DIAGNOSES)[0].split()[0][:4] for _ in range(repeat)]
+    # Окна ищутся внутри синтетической истории записей, чтобы расписание было занято
+    history_start = ClinicDataset(0).start
+    slot_dates = [(history_start + timedelta(days=rng.randrange(365))).strftime("%Y-%m-%d")
+                  for _ in range(repeat)]
+    services = [rng.choice(SERVICES) for _ in range(repeat)]
+
+    cases = {
+        # Консоль администратора
+        'staff.get_statistics': lambda i: clinic.get_statistics(),
+        'staff.get_income_by_month': lambda i: clinic.get_income_by_month(),
+        'staff.get_animal_visits': lambda i: clinic.get_animal_visits(animal_ids[i]),
+        'staff.get_animals_page': lambda i: clinic.get_animals_page(animal_ids[i], 20),
+        'staff.search': lambda i: clinic.search(words[i]),
+        'staff.add_visit': lambda i: clinic.add_visit(animal_ids[i], 'Осмотр', 'Нет', 100.0),
+        'staff.add_visits_bulk_1000': lambda i: clinic.add_visits_bulk(
+            {'animal_id': animal_ids[i], 'diagnosis': 'Осмотр', 'cost': 100} for _ in range(1000)
+        ),
+        # Портал клиента
+        'portal.login': lambda i: repo.find_client(logins[i][1], logins[i][2]),
+        'portal.client_pets': lambda i: repo.client_pets(logins[i][0]),
+        'portal.client_appointments': lambda i: repo.client_appointments(logins[i][0]),
+        'portal.client_visits': lambda i: repo.client_visits(logins[i][0]),
+        'portal.search_pet_ids': lambda i: repo.search_pet_ids(logins[i][0], 'алл'),
+        'portal.free_slots': lambda i: repo.scheduler.free_slots(
+            services[i], slot_dates[i], count=10, now=history_start
+        ),
+    }
+
+    results = {}
+    # Сообщения add_visit не нужны в выводе замеров
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        for name, case in cases.items():
+            results[name] = summarize(measure(case, repeat))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    clinic.close()
+    return results
+
+
+def time_to_markers(args, cwd, markers, stdin_data=b''):
+    """Время от запуска процесса до появления каждой метки в его выводе, мс
+
+    None, если процесс завершился раньше (например, нет дисплея для Tk).
+    """
+    env = dict(os.environ, PYTHONPATH=HERE)
+    started = time.perf_counter()
+    process = subprocess.Popen(args, cwd=cwd, env=env, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    process.stdin.write(stdin_data)
+    process.stdin.flush()
+    timings, output = [], b''
+    for marker in markers:
+        marker = marker.encode('utf-8')
+        while marker not in output:
+            chunk = process.stdout.read1(65536)
+            if not chunk:
+                process.wait()
+                return None
+            output += chunk
+        timings.append((time.perf_counter() - started) * 1000)
+        output = output[output.index(marker) + len(marker):]
+    process.communicate()
+    return timings
+
+
+def run_startup_benchmarks(db_name, repeat):
+    """Запуск main.py и app.py в отдельных процессах на копии базы"""
+    workdir = tempfile.mkdtemp(prefix='vet_startup_')
+    shutil.copy(db_name, os.path.join(workdir, 'vet_clinic.db'))
+
+    cases = {
+        # До меню и до результата первого пункта (статистика) с выходом
+        ('startup.console_menu', 'startup.console_first_query'): (
+            [sys.executable, os.path.join(HERE, 'main.py')],
+            ['Выберите действие', 'Всего животных'], '5\n0\n'.encode('utf-8'),
+        ),
+        ('startup.portal_login_screen', 'startup.portal_database_ready'): (
+            [sys.executable, '-c', PORTAL_STARTUP], ['login', 'ready'], b'',
+        ),
+    }
+    results = {}
+    try:
+        for names, (args, markers, stdin_data) in cases.items():
+            runs = []
+            for _ in range(repeat):
+                timings = time_to_markers(args, workdir, markers, stdin_data)
+                if timings is None:
+                    break
+                runs.append(timings)
+            if not runs:
+                print(f"{names[0].split('.')[1]}: пропущено (процесс завершился без меток)", file=sys.stderr)
+                continue
+            for i, name in enumerate(names):
+                results[name] = summarize([timings[i] for timings in runs])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Операции, медиана которых выросла больше чем в threshold раз"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or previous['median_ms'] <= 0:
+            continue
+        ratio = current['median_ms'] / previous['median_ms']
+        if ratio > threshold:
+            regressions.append((name, previous['median_ms'], current['median_ms'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности ветлечебницы")
+    parser.add_argument('--visits', type=int, default=10000, help="Размер набора данных (визитов)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=50, help="Запусков каждой операции")
+    parser.add_argument('--startup-repeat', type=int, default=10,
+                        help="Запусков main.py и app.py для замера старта (0 - не замерять)")
+    parser.add_argument('--workdir', help="Каталог для баз (по умолчанию временный)")
+    parser.add_argument('--output', default='bench_results.json', help="Файл результатов JSON")
+    parser.add_argument('--compare', help="JSON прошлого прогона для поиска регрессий")
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help="Допустимое замедление медианы относительно --compare")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='vet_bench_')
+    db_name = os.path.join(workdir, f'clinic_{args.visits}_{args.seed}.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_name + suffix):
+            os.remove(db_name + suffix)
+
+    dataset = ClinicDataset(args.visits, seed=args.seed)
+    started = time.perf_counter()
+    info = populate(dataset, db_name)
+    generation_s = time.perf_counter() - started
+
+    results = run_benchmarks(db_name, info, args.repeat)
+    if args.startup_repeat > 0:
+        results.update(run_startup_benchmarks(db_name, args.startup_repeat))
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'dataset': {
+            'visits': dataset.visits,
+            'animals': dataset.animals,
+            'clients': dataset.clients,
+            'appointments': dataset.appointments,
+            'seed': dataset.seed,
+            'generation_s': round(generation_s, 2),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for name, summary in results.items():
+        print(f"{name:32} медиана {summary['median_ms']:10.3f} мс   p95 {summary['p95_ms']:10.3f} мс")
+    print(f"Результаты записаны в {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after, ratio in regressions:
+            print(f"РЕГРЕССИЯ {name}: {before:.3f} -> {after:.3f} мс (x{ratio:.2f})", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
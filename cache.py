@@ -0,0 +1,157 @@
+# cache.py
+"""Кэш данных клиентов портала в памяти процесса
+
+Значения хранятся по ключу (вид данных, id клиента) и вытесняются по
+давности использования (LRU), когда суммарное число закэшированных строк
+превышает предел. Запись в базу через репозиторий сбрасывает ровно те
+ключи, которые она меняет. Изменения из других процессов и соединений
+определяются по PRAGMA data_version; при его изменении кэш читает журнал
+изменений (changelog.py) и сбрасывает только затронутых клиентов, а если
+журнал недоступен, сжат дальше прочитанного или изменений слишком много -
+очищается целиком.
+"""
+import threading
+from collections import OrderedDict
+
+from changelog import ChangelogGap
+
+# Предел числа строк (записей) во всем кэше
+MAX_ROWS = 50000
+# Больше изменений за раз - дешевле очистить кэш, чем разбирать журнал
+MAX_CHANGES = 1000
+
+# Виды данных клиента, которые затрагивает изменение строки таблицы
+CHANGE_KINDS = {
+    'client_animals': ('pets', 'visits', 'appointments'),
+    'visits': ('visits',),
+    'appointments': ('appointments',),
+}
+
+
+class ReadThroughCache:
+    def __init__(self, db, max_rows=MAX_ROWS, changes=None):
+        self.db = db
+        self.changes = changes
+        self.max_rows = max_rows
+        self.rows = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # Загрузки в процессе: ключ -> [число загрузок, поколение ключа];
+        # запись есть только пока ключ кто-то загружает
+        self._loads = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._seq = None
+
+    def _check_version(self):
+        # data_version у каждого соединения свой, поэтому он хранится по потокам
+        # (первое обращение потока тоже проверяет изменения: его прошлой версии не знаем)
+        version = self.db.execute('PRAGMA data_version').fetchone()[0]
+        if getattr(self._local, 'data_version', None) != version:
+            if not self._apply_changes():
+                self.clear()
+            self._local.data_version = version
+
+    def _apply_changes(self):
+        """Сброс клиентов по журналу изменений; False - нужно очистить кэш целиком"""
+        if self.changes is None:
+            return False
+        with self._lock:
+            since = self._seq
+        if since is None:
+            # Первая проверка: запоминается конец журнала, кэш очищается
+            with self._lock:
+                self._seq = self.changes.head()
+            return False
+        try:
+            changes = self.changes.changes(since, MAX_CHANGES)
+        except ChangelogGap:
+            changes = None
+        if changes is None or len(changes) == MAX_CHANGES:
+            with self._lock:
+                self._seq = self.changes.head()
+            return False
+        for change in changes:
+            kinds = CHANGE_KINDS.get(change.table, ())
+            if change.client_id is not None:
+                self.invalidate(change.client_id, *kinds)
+            else:
+                for kind in kinds:
+                    self.invalidate_kind(kind)
+        if changes:
+            with self._lock:
+                self._seq = max(self._seq, changes[-1].seq)
+        return True
+
+    def get(self, kind, client_id, load):
+        """Значение из кэша или результат load() с сохранением в кэш"""
+        self._check_version()
+        key = (kind, client_id)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(self._entries[key])
+            self.misses += 1
+            loading = self._loads.setdefault(key, [0, 0])
+            loading[0] += 1
+            generation = (self._epoch, loading[1])
+
+        try:
+            value = tuple(load())
+        except BaseException:
+            with self._lock:
+                self._finish_load(key)
+            raise
+
+        with self._lock:
+            # Пока шла загрузка, ключ могли сбросить: такое значение уже устарело
+            if generation == (self._epoch, self._loads[key][1]):
+                self._store(key, value)
+            self._finish_load(key)
+        return list(value)
+
+    def _finish_load(self, key):
+        loading = self._loads[key]
+        loading[0] -= 1
+        if not loading[0]:
+            del self._loads[key]
+
+    def _store(self, key, value):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.rows -= len(old) + 1
+        self._entries[key] = value
+        self.rows += len(value) + 1
+        while self.rows > self.max_rows and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self.rows -= len(evicted) + 1
+
+    def invalidate(self, client_id, *kinds):
+        """Сброс данных клиента указанных видов"""
+        with self._lock:
+            for kind in kinds:
+                key = (kind, client_id)
+                loading = self._loads.get(key)
+                if loading is not None:
+                    loading[1] += 1
+                value = self._entries.pop(key, None)
+                if value is not None:
+                    self.rows -= len(value) + 1
+
+    def invalidate_kind(self, kind):
+        """Сброс данных одного вида у всех клиентов"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == kind]:
+                self.rows -= len(self._entries.pop(key)) + 1
+            # Загрузки этого вида, начатые до сброса, не должны попасть в кэш
+            self._epoch += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.rows = 0
+            # Загрузки, начатые до очистки, не должны попасть в кэш
+            self._epoch += 1
@@ -0,0 +1,315 @@
+# changelog.py
+"""Журнал изменений для инкрементальной синхронизации
+
+Триггеры на animals, visits, clients, client_animals и appointments
+дописывают в changelog строку на каждую вставку, изменение и удаление:
+номер seq, таблица (кодом из CHANGE_TABLES), id строки, операция
+('I', 'U', 'D'), клиент, к которому относится строка, и время. Данные
+строк не копируются - потребитель читает их текущее состояние из базы,
+поэтому журнал остается компактным. Перенос истории в архив (archive.py)
+виден как удаление строк основной базы.
+
+Номера seq растут монотонно и не используются повторно (AUTOINCREMENT), а
+так как запись в SQLite идет одной транзакцией за раз, изменения видны
+читателям строго в порядке номеров: прочитав все до N, потребитель не
+получит позже номер меньше N.
+
+Потребитель регистрируется (его позиция - текущий конец журнала, после
+чего он снимает полную копию нужных таблиц), читает изменения порциями
+после своей позиции и подтверждает прочитанное. Сжатие удаляет строки,
+подтвержденные всеми потребителями и старше CHANGELOG_RETENTION; если
+нужные потребителю строки уже удалены, чтение завершается ChangelogGap -
+копию нужно снять заново.
+
+    python changelog.py tail --since 0      - изменения после номера
+    python changelog.py consumers           - потребители и их позиции
+    python changelog.py compact             - сжатие журнала
+"""
+import sys
+from dataclasses import dataclass
+
+# Коды таблиц в журнале (не меняются: по ним читаются старые строки)
+CHANGE_TABLES = {
+    'animals': 1,
+    'visits': 2,
+    'clients': 3,
+    'client_animals': 4,
+    'appointments': 5,
+}
+TABLE_NAMES = {code: table for table, code in CHANGE_TABLES.items()}
+
+# Изменений в одной порции чтения
+CHANGE_BATCH = 1000
+# Сколько хранить прочитанные всеми потребителями изменения, секунд
+CHANGELOG_RETENTION = 24 * 60 * 60
+# Подтверждений, после которых журнал сжимается автоматически
+COMPACT_EVERY = 10000
+
+# Клиент строки ({row} - NEW или OLD): по нему сбрасывается кэш портала
+CLIENT_OF = {
+    'animals': '(SELECT client_id FROM client_animals WHERE animal_id = {row}.id LIMIT 1)',
+    'visits': '(SELECT client_id FROM client_animals WHERE animal_id = {row}.animal_id LIMIT 1)',
+    'clients': '{row}.id',
+    'client_animals': '{row}.client_id',
+    'appointments': '{row}.client_id',
+}
+# Таблицы, строка которых может перейти к другому клиенту
+MOVABLE_TABLES = ('visits', 'client_animals', 'appointments')
+
+
+class ChangelogGap(Exception):
+    """Нужные потребителю изменения уже удалены сжатием журнала"""
+
+
+@dataclass(frozen=True, slots=True)
+class Change:
+    """Изменение строки: op - 'I', 'U' или 'D'; changed_at - секунды UTC"""
+    seq: int
+    table: str
+    row_id: int
+    op: str
+    client_id: int
+    changed_at: int
+
+
+def _log(table, op, row):
+    return (
+        'INSERT INTO changelog (table_code, row_id, op, client_id) '
+        f"VALUES ({CHANGE_TABLES[table]}, {row}.id, '{op}', {CLIENT_OF[table].format(row=row)});"
+    )
+
+
+def _triggers(table):
+    # Строка, перешедшая к другому клиенту, отмечается и у прежнего
+    moved = ''
+    if table in MOVABLE_TABLES:
+        old, new = CLIENT_OF[table].format(row='OLD'), CLIENT_OF[table].format(row='NEW')
+        moved = (
+            'INSERT INTO changelog (table_code, row_id, op, client_id) '
+            f"SELECT {CHANGE_TABLES[table]}, NEW.id, 'U', {old} WHERE {old} IS NOT {new};"
+        )
+    return [
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_changelog_{table}_insert AFTER INSERT ON {table}
+        BEGIN {_log(table, 'I', 'NEW')} END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_changelog_{table}_update AFTER UPDATE ON {table}
+        BEGIN {_log(table, 'U', 'NEW')} {moved} END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_changelog_{table}_delete AFTER DELETE ON {table}
+        BEGIN {_log(table, 'D', 'OLD')} END
+        ''',
+    ]
+
+
+# Миграция общей базы
+CHANGELOG_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS changelog (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_code INTEGER NOT NULL,
+        row_id INTEGER NOT NULL,
+        op TEXT NOT NULL,
+        client_id INTEGER,
+        changed_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS changelog_consumers (
+        name TEXT PRIMARY KEY,
+        position INTEGER NOT NULL,
+        acknowledged_at INTEGER
+    ) WITHOUT ROWID
+    ''',
+    # compacted - последний удаленный сжатием номер
+    '''
+    CREATE TABLE IF NOT EXISTS changelog_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        compacted INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    'INSERT OR IGNORE INTO changelog_state (id) VALUES (1)',
+] + [trigger for table in CHANGE_TABLES for trigger in _triggers(table)]
+
+
+class ChangeFeed:
+    """Чтение журнала изменений порциями, позиции потребителей и сжатие"""
+
+    def __init__(self, db):
+        self.db = db
+        self._acknowledged = 0
+
+    def head(self):
+        """Номер последнего записанного изменения (0 - изменений еще не было)"""
+        row = self.db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changelog'").fetchone()
+        return row[0] if row else 0
+
+    def changes(self, since=0, limit=CHANGE_BATCH):
+        """Изменения с номером больше since по порядку: [Change] (не больше limit)"""
+        # Одним запросом, чтобы сжатие не прошло между проверкой и выборкой
+        rows = self.db.execute('''
+            SELECT s.compacted, c.seq, c.table_code, c.row_id, c.op, c.client_id, c.changed_at
+            FROM changelog_state s
+            LEFT JOIN (SELECT * FROM changelog WHERE seq > :since ORDER BY seq LIMIT :limit) c
+            WHERE s.id = 1
+            ORDER BY c.seq
+        ''', {'since': since, 'limit': limit}).fetchall()
+        compacted = rows[0][0]
+        if since < compacted:
+            raise ChangelogGap(f"Изменения до {compacted} удалены из журнала, запрошены после {since}")
+        return [Change(seq, TABLE_NAMES[code], row_id, op, client_id, changed_at)
+                for _, seq, code, row_id, op, client_id, changed_at in rows if seq is not None]
+
+    def stream(self, since=0, batch_size=CHANGE_BATCH):
+        """Порции изменений после since, пока журнал не дочитан до конца"""
+        while True:
+            batch = self.changes(since, batch_size)
+            if not batch:
+                return
+            yield batch
+            since = batch[-1].seq
+
+    # --- Потребители ---
+
+    def register(self, consumer):
+        """Регистрация потребителя с позицией в конце журнала; позиция
+
+        Уже зарегистрированный потребитель сохраняет свою позицию.
+        """
+        with self.db.transaction(immediate=True) as cursor:
+            cursor.execute('''
+                INSERT OR IGNORE INTO changelog_consumers (name, position)
+                VALUES (?, COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'changelog'), 0))
+            ''', (consumer,))
+            cursor.execute('SELECT position FROM changelog_consumers WHERE name = ?', (consumer,))
+            return cursor.fetchone()[0]
+
+    def unregister(self, consumer):
+        with self.db.transaction() as cursor:
+            cursor.execute('DELETE FROM changelog_consumers WHERE name = ?', (consumer,))
+
+    def position(self, consumer):
+        """Последний подтвержденный потребителем номер"""
+        row = self.db.execute('SELECT position FROM changelog_consumers WHERE name = ?',
+                              (consumer,)).fetchone()
+        if row is None:
+            raise KeyError(f"Потребитель {consumer!r} не зарегистрирован")
+        return row[0]
+
+    def pull(self, consumer, limit=CHANGE_BATCH):
+        """Следующая порция изменений потребителя (после его позиции)"""
+        return self.changes(self.position(consumer), limit)
+
+    def acknowledge(self, consumer, seq):
+        """Подтверждение обработки изменений до seq включительно"""
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                UPDATE changelog_consumers
+                SET position = MAX(position, ?), acknowledged_at = CAST(strftime('%s', 'now') AS INTEGER)
+                WHERE name = ?
+            ''', (seq, consumer))
+            if not cursor.rowcount:
+                raise KeyError(f"Потребитель {consumer!r} не зарегистрирован")
+        self._acknowledged += 1
+        if self._acknowledged % COMPACT_EVERY == 0:
+            self.compact()
+
+    def consumers(self):
+        """[(потребитель, позиция, время подтверждения)]"""
+        return self.db.execute(
+            'SELECT name, position, acknowledged_at FROM changelog_consumers ORDER BY name'
+        ).fetchall()
+
+    def reset(self, after):
+        """Сброс журнала после восстановления базы из снимка
+
+        after - конец журнала до восстановления. Номера продолжаются после
+        него, а чтение с любой прежней позиции завершается ChangelogGap:
+        потребители и кэши снимают данные заново.
+        """
+        with self.db.transaction(immediate=True) as cursor:
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changelog'")
+            row = cursor.fetchone()
+            mark = max(after, row[0] if row else 0) + 1
+            cursor.execute('DELETE FROM changelog')
+            if row:
+                cursor.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'changelog'", (mark,))
+            else:
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('changelog', ?)", (mark,))
+            cursor.execute('UPDATE changelog_state SET compacted = ? WHERE id = 1', (mark,))
+
+    def compact(self, retention=CHANGELOG_RETENTION, batch_size=CHANGE_BATCH * 10):
+        """Удаление изменений, подтвержденных всеми потребителями и старше retention секунд
+
+        Удаляется порциями по batch_size строк, каждая - отдельной транзакцией.
+        Возвращает число удаленных строк.
+        """
+        cursor = self.db.cursor()
+        cursor.execute('SELECT MIN(position) FROM changelog_consumers')
+        confirmed = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT MAX(seq) FROM changelog WHERE changed_at < CAST(strftime('%s', 'now') AS INTEGER) - ?",
+            (retention,)
+        )
+        expired = cursor.fetchone()[0] or 0
+        upto = min(expired, self.head() if confirmed is None else confirmed)
+
+        removed = 0
+        while True:
+            cursor = self.db.cursor()
+            cursor.execute(f'SELECT seq FROM changelog WHERE seq <= ? ORDER BY seq LIMIT 1 OFFSET {batch_size - 1}',
+                           (upto,))
+            row = cursor.fetchone()
+            last = row[0] if row else upto
+            with self.db.transaction(immediate=True) as cursor:
+                cursor.execute('DELETE FROM changelog WHERE seq <= ?', (last,))
+                removed += cursor.rowcount
+                cursor.execute('UPDATE changelog_state SET compacted = MAX(compacted, ?) WHERE id = 1', (last,))
+            if row is None:
+                return removed
+
+
+def print_changes(changes):
+    if not changes:
+        print("Изменений нет")
+    for change in changes:
+        client = f", клиент {change.client_id}" if change.client_id is not None else ''
+        print(f"  {change.seq}: {change.op} {change.table} #{change.row_id}{client}")
+
+
+def main(argv=None):
+    import argparse
+    from repository import open_repository, DB_NAME
+
+    parser = argparse.ArgumentParser(description="Журнал изменений базы")
+    parser.add_argument('command', choices=['tail', 'consumers', 'compact'])
+    parser.add_argument('--db', default=DB_NAME, help="Файл базы данных")
+    parser.add_argument('--since', type=int, default=0, help="Изменения после этого номера")
+    parser.add_argument('--limit', type=int, default=CHANGE_BATCH, help="Изменений не больше")
+    parser.add_argument('--retention', type=int, default=CHANGELOG_RETENTION,
+                        help="Хранить изменения не меньше стольких секунд (для compact)")
+    args = parser.parse_args(argv)
+
+    repo = open_repository(args.db)
+    try:
+        feed = repo.changes
+        if args.command == 'tail':
+            print(f"Конец журнала: {feed.head()}")
+            print_changes(feed.changes(args.since, args.limit))
+        elif args.command == 'consumers':
+            for name, position, acknowledged_at in feed.consumers():
+                print(f"  {name}: позиция {position}")
+        else:
+            print(f"Удалено из журнала: {feed.compact(args.retention)}")
+    except ChangelogGap as e:
+        print(f"Ошибка: {e}")
+        return 1
+    finally:
+        repo.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
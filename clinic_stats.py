@@ -0,0 +1,282 @@
+# clinic_stats.py
+"""Материализованная статистика клиники
+
+Сводные таблицы поддерживаются триггерами на animals и visits, поэтому
+актуальны при любом способе записи (меню, пакетный импорт, внешние
+программы), а чтение статистики не зависит от размера истории.
+
+    python clinic_stats.py verify  - сверка сводных таблиц с исходными данными
+    python clinic_stats.py rebuild - полный пересчет сводных таблиц
+"""
+import sys
+
+# Допустимое расхождение сумм из-за накопления ошибки округления
+INCOME_TOLERANCE = 0.01
+
+# Итоги по дням визитов, перенесенных в архив (archive.py)
+STATS_ARCHIVED_TABLE = '''
+    CREATE TABLE IF NOT EXISTS stats_archived_daily (
+        day TEXT PRIMARY KEY,
+        visits INTEGER NOT NULL,
+        income REAL NOT NULL
+    ) WITHOUT ROWID
+    '''
+
+# Визиты по дням с учетом архива: (day, visits, income)
+VISITS_BY_DAY = '''
+    SELECT COALESCE(substr(visit_date, 1, 10), '') AS day, COUNT(*) AS visits,
+           COALESCE(SUM(cost), 0) AS income
+    FROM visits GROUP BY 1
+    UNION ALL
+    SELECT day, visits, income FROM stats_archived_daily
+'''
+
+STATS_SCHEMA = [
+    # Общие итоги: ровно одна строка
+    '''
+    CREATE TABLE IF NOT EXISTS stats_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total_animals INTEGER NOT NULL DEFAULT 0,
+        total_visits INTEGER NOT NULL DEFAULT 0,
+        total_income REAL NOT NULL DEFAULT 0
+    )
+    ''',
+    'INSERT OR IGNORE INTO stats_totals (id) VALUES (1)',
+    # Животные по видам
+    '''
+    CREATE TABLE IF NOT EXISTS stats_species (
+        species TEXT PRIMARY KEY,
+        count INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''',
+    # Визиты и доход по дням и по месяцам
+    '''
+    CREATE TABLE IF NOT EXISTS stats_daily (
+        day TEXT PRIMARY KEY,
+        visits INTEGER NOT NULL,
+        income REAL NOT NULL
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS stats_monthly (
+        month TEXT PRIMARY KEY,
+        visits INTEGER NOT NULL,
+        income REAL NOT NULL
+    ) WITHOUT ROWID
+    ''',
+    STATS_ARCHIVED_TABLE,
+
+    # Триггеры животных
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_stats_animals_insert AFTER INSERT ON animals
+    BEGIN
+        UPDATE stats_totals SET total_animals = total_animals + 1 WHERE id = 1;
+        INSERT INTO stats_species (species, count) VALUES (NEW.species, 1)
+            ON CONFLICT (species) DO UPDATE SET count = count + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_stats_animals_delete AFTER DELETE ON animals
+    BEGIN
+        UPDATE stats_totals SET total_animals = total_animals - 1 WHERE id = 1;
+        UPDATE stats_species SET count = count - 1 WHERE species = OLD.species;
+        DELETE FROM stats_species WHERE species = OLD.species AND count <= 0;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_stats_animals_species AFTER UPDATE OF species ON animals
+    WHEN OLD.species IS NOT NEW.species
+    BEGIN
+        UPDATE stats_species SET count = count - 1 WHERE species = OLD.species;
+        DELETE FROM stats_species WHERE species = OLD.species AND count <= 0;
+        INSERT INTO stats_species (species, count) VALUES (NEW.species, 1)
+            ON CONFLICT (species) DO UPDATE SET count = count + 1;
+    END
+    ''',
+
+    # Триггеры визитов
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_stats_visits_insert AFTER INSERT ON visits
+    BEGIN
+        UPDATE stats_totals
+        SET total_visits = total_visits + 1,
+            total_income = total_income + COALESCE(NEW.cost, 0)
+        WHERE id = 1;
+        INSERT INTO stats_daily (day, visits, income)
+            VALUES (COALESCE(substr(NEW.visit_date, 1, 10), ''), 1, COALESCE(NEW.cost, 0))
+            ON CONFLICT (day) DO UPDATE SET visits = visits + 1, income = income + excluded.income;
+        INSERT INTO stats_monthly (month, visits, income)
+            VALUES (COALESCE(substr(NEW.visit_date, 1, 7), ''), 1, COALESCE(NEW.cost, 0))
+            ON CONFLICT (month) DO UPDATE SET visits = visits + 1, income = income + excluded.income;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_stats_visits_delete AFTER DELETE ON visits
+    BEGIN
+        UPDATE stats_totals
+        SET total_visits = total_visits - 1,
+            total_income = total_income - COALESCE(OLD.cost, 0)
+        WHERE id = 1;
+        UPDATE stats_daily SET visits = visits - 1, income = income - COALESCE(OLD.cost, 0)
+            WHERE day = COALESCE(substr(OLD.visit_date, 1, 10), '');
+        DELETE FROM stats_daily WHERE day = COALESCE(substr(OLD.visit_date, 1, 10), '') AND visits <= 0;
+        UPDATE stats_monthly SET visits = visits - 1, income = income - COALESCE(OLD.cost, 0)
+            WHERE month = COALESCE(substr(OLD.visit_date, 1, 7), '');
+        DELETE FROM stats_monthly WHERE month = COALESCE(substr(OLD.visit_date, 1, 7), '') AND visits <= 0;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_stats_visits_update AFTER UPDATE OF visit_date, cost ON visits
+    BEGIN
+        UPDATE stats_totals
+        SET total_income = total_income - COALESCE(OLD.cost, 0) + COALESCE(NEW.cost, 0)
+        WHERE id = 1;
+        UPDATE stats_daily SET visits = visits - 1, income = income - COALESCE(OLD.cost, 0)
+            WHERE day = COALESCE(substr(OLD.visit_date, 1, 10), '');
+        DELETE FROM stats_daily WHERE day = COALESCE(substr(OLD.visit_date, 1, 10), '') AND visits <= 0;
+        UPDATE stats_monthly SET visits = visits - 1, income = income - COALESCE(OLD.cost, 0)
+            WHERE month = COALESCE(substr(OLD.visit_date, 1, 7), '');
+        DELETE FROM stats_monthly WHERE month = COALESCE(substr(OLD.visit_date, 1, 7), '') AND visits <= 0;
+        INSERT INTO stats_daily (day, visits, income)
+            VALUES (COALESCE(substr(NEW.visit_date, 1, 10), ''), 1, COALESCE(NEW.cost, 0))
+            ON CONFLICT (day) DO UPDATE SET visits = visits + 1, income = income + excluded.income;
+        INSERT INTO stats_monthly (month, visits, income)
+            VALUES (COALESCE(substr(NEW.visit_date, 1, 7), ''), 1, COALESCE(NEW.cost, 0))
+            ON CONFLICT (month) DO UPDATE SET visits = visits + 1, income = income + excluded.income;
+    END
+    ''',
+]
+
+
+def read_statistics(cursor):
+    """Итоги по животным, визитам и доходу и число животных по видам (из сводных таблиц)"""
+    cursor.execute('SELECT total_animals, total_visits, total_income FROM stats_totals WHERE id = 1')
+    total_animals, total_visits, total_income = cursor.fetchone()
+
+    cursor.execute('SELECT species, count FROM stats_species ORDER BY species')
+    species_count = cursor.fetchall()
+
+    return {
+        'total_animals': total_animals,
+        'species_count': species_count,
+        'total_income': total_income,
+        'total_visits': total_visits
+    }
+
+
+def income_by_month(cursor, start=None, end=None):
+    """Визиты и доход по месяцам (YYYY-MM): [(месяц, визиты, доход)], границы включительно"""
+    cursor.execute('''
+        SELECT month, visits, income FROM stats_monthly
+        WHERE month >= COALESCE(?, '') AND month <= COALESCE(?, '9999-12')
+        ORDER BY month
+    ''', (start, end))
+    return cursor.fetchall()
+
+
+def rebuild_statistics(cursor):
+    """Полный пересчет сводных таблиц по animals, visits и итогам архива"""
+    cursor.execute('DELETE FROM stats_species')
+    cursor.execute('DELETE FROM stats_daily')
+    cursor.execute('DELETE FROM stats_monthly')
+
+    cursor.execute(f'''
+        UPDATE stats_totals SET
+            total_animals = (SELECT COUNT(*) FROM animals),
+            total_visits = (SELECT COALESCE(SUM(visits), 0) FROM ({VISITS_BY_DAY})),
+            total_income = (SELECT COALESCE(SUM(income), 0) FROM ({VISITS_BY_DAY}))
+        WHERE id = 1
+    ''')
+    cursor.execute('''
+        INSERT INTO stats_species (species, count)
+        SELECT species, COUNT(*) FROM animals GROUP BY species
+    ''')
+    cursor.execute(f'''
+        INSERT INTO stats_daily (day, visits, income)
+        SELECT day, SUM(visits), SUM(income) FROM ({VISITS_BY_DAY}) GROUP BY day
+    ''')
+    cursor.execute(f'''
+        INSERT INTO stats_monthly (month, visits, income)
+        SELECT substr(day, 1, 7), SUM(visits), SUM(income) FROM ({VISITS_BY_DAY}) GROUP BY 1
+    ''')
+
+
+def verify_statistics(cursor):
+    """Сверка сводных таблиц с полным пересчетом; возвращает список расхождений"""
+    problems = []
+
+    cursor.execute('SELECT total_animals, total_visits, total_income FROM stats_totals WHERE id = 1')
+    stored = cursor.fetchone()
+    cursor.execute(f'''
+        SELECT (SELECT COUNT(*) FROM animals),
+               (SELECT COALESCE(SUM(visits), 0) FROM ({VISITS_BY_DAY})),
+               (SELECT COALESCE(SUM(income), 0) FROM ({VISITS_BY_DAY}))
+    ''')
+    actual = cursor.fetchone()
+
+    if stored is None:
+        return ["Нет строки итогов в stats_totals"]
+    if stored[0] != actual[0]:
+        problems.append(f"Всего животных: {stored[0]} вместо {actual[0]}")
+    if stored[1] != actual[1]:
+        problems.append(f"Всего визитов: {stored[1]} вместо {actual[1]}")
+    if abs(stored[2] - actual[2]) > INCOME_TOLERANCE:
+        problems.append(f"Общий доход: {stored[2]:.2f} вместо {actual[2]:.2f}")
+
+    cursor.execute('SELECT species, count FROM stats_species')
+    stored_species = dict(cursor.fetchall())
+    cursor.execute('SELECT species, COUNT(*) FROM animals GROUP BY species')
+    actual_species = dict(cursor.fetchall())
+    if stored_species != actual_species:
+        problems.append("Расходится разбивка животных по видам")
+
+    for table, key, length in (('stats_daily', 'day', 10), ('stats_monthly', 'month', 7)):
+        cursor.execute(f'SELECT {key}, visits, income FROM {table}')
+        stored_periods = {row[0]: row[1:] for row in cursor.fetchall()}
+        cursor.execute(f'''
+            SELECT substr(day, 1, {length}), SUM(visits), SUM(income)
+            FROM ({VISITS_BY_DAY}) GROUP BY 1
+        ''')
+        actual_periods = {row[0]: row[1:] for row in cursor.fetchall()}
+
+        if stored_periods.keys() != actual_periods.keys():
+            problems.append(f"{table}: не совпадает набор периодов")
+            continue
+        for period, (visits, income) in actual_periods.items():
+            stored_visits, stored_income = stored_periods[period]
+            if stored_visits != visits or abs(stored_income - income) > INCOME_TOLERANCE:
+                problems.append(f"{table}: расхождение за {period}")
+
+    return problems
+
+
+def main(argv=None):
+    import argparse
+    from main import VetClinicDB
+
+    parser = argparse.ArgumentParser(description="Обслуживание сводной статистики")
+    parser.add_argument('command', choices=['verify', 'rebuild'])
+    parser.add_argument('--db', default='vet_clinic.db', help="Файл базы данных")
+    args = parser.parse_args(argv)
+
+    clinic = VetClinicDB(args.db)
+    try:
+        if args.command == 'rebuild':
+            clinic.rebuild_statistics()
+            print("Статистика пересчитана")
+            return 0
+
+        problems = clinic.verify_statistics()
+    finally:
+        clinic.close()
+
+    if problems:
+        for problem in problems:
+            print(problem, file=sys.stderr)
+        return 1
+    print("Статистика согласована")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+# dates.py
+"""Канонический формат дат и времени в базе
+
+Дата визита хранится как 'YYYY-MM-DD HH:MM:SS', дата записи на прием - как
+'YYYY-MM-DD', время - как 'HH:MM'. Триггеры отклоняют вставку и изменение
+строк в другом формате, а миграция приводит к нему старые строки, набранные
+вручную ('15.03.2024', '9:30' и т.п.).
+
+Для запросов по диапазонам у таблиц есть целочисленные столбцы visits.visit_ts
+и appointments.start_ts - секунды от 1970-01-01 по часам клиники (время
+хранится без часового пояса и считается как UTC). Это вычисляемые столбцы
+(GENERATED ... VIRTUAL): место в таблице они не занимают, а индексы по ним
+позволяют выбирать "визиты за месяц" или "записи на завтра" диапазоном.
+"""
+from datetime import datetime
+
+from scheduling import fill_appointment_minutes
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+DATE_FORMAT = "%Y-%m-%d"
+TIME_FORMAT = "%H:%M"
+
+# Форматы, в которых даты встречаются в старых данных и вводе пользователей
+INPUT_DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d.%m.%y", "%d/%m/%Y", "%Y/%m/%d", "%Y.%m.%d")
+INPUT_TIME_FORMATS = ("%H:%M:%S", "%H:%M", "%H.%M", "%H-%M", "%H")
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _parse(value, formats):
+    value = str(value).strip()
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError(f"Не удалось разобрать дату или время: {value!r}")
+
+
+def parse_date(value):
+    """Дата в любом из INPUT_DATE_FORMATS -> 'YYYY-MM-DD'"""
+    return _parse(value, INPUT_DATE_FORMATS).strftime(DATE_FORMAT)
+
+
+def parse_clock(value):
+    """Время '9:30', '09.30', '10' и т.п. -> 'HH:MM'"""
+    return _parse(value, INPUT_TIME_FORMATS).strftime(TIME_FORMAT)
+
+
+def parse_datetime(value):
+    """Дата со временем или без него (также 'YYYY-MM-DDTHH:MM') -> 'YYYY-MM-DD HH:MM:SS'"""
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    text = str(value).strip().replace('T', ' ')
+    date_part, _, time_part = text.partition(' ')
+    parsed = _parse(date_part, INPUT_DATE_FORMATS)
+    if time_part:
+        clock = _parse(time_part, INPUT_TIME_FORMATS)
+        parsed = parsed.replace(hour=clock.hour, minute=clock.minute, second=clock.second)
+    return parsed.strftime(DATETIME_FORMAT)
+
+
+def to_epoch(value):
+    """Дата или дата со временем -> секунды (как visit_ts и start_ts)"""
+    return int((datetime.strptime(parse_datetime(value), DATETIME_FORMAT) - EPOCH).total_seconds())
+
+
+# Проверки формата в SQL (NULL для строки в неверном формате)
+VISIT_DATE_INVALID = 'NEW.visit_date IS NULL OR NEW.visit_date IS NOT datetime(NEW.visit_date)'
+APPOINTMENT_INVALID = (
+    'NEW.appointment_date IS NULL OR NEW.appointment_date IS NOT date(NEW.appointment_date) '
+    "OR NEW.appointment_time IS NOT strftime('%H:%M', NEW.appointment_time)"
+)
+# Условие "строка записи в каноническом формате" для выборок (schema.appointments ap)
+APPOINTMENT_VALID = (
+    "ap.appointment_date IS date(ap.appointment_date) "
+    "AND ap.appointment_time IS strftime('%H:%M', ap.appointment_time)"
+)
+
+
+def normalize_visit_dates(cursor):
+    """Приведение дат визитов к канону; возвращает число строк, которые разобрать не удалось"""
+    cursor.execute('SELECT id, visit_date FROM visits WHERE visit_date IS NOT datetime(visit_date)')
+    fixed, failed = [], 0
+    for visit_id, value in cursor.fetchall():
+        try:
+            fixed.append((parse_datetime(value), visit_id))
+        except ValueError:
+            failed += 1
+    cursor.executemany('UPDATE visits SET visit_date = ? WHERE id = ?', fixed)
+    return failed
+
+
+def canonical_appointment_dates(cursor, schema='main'):
+    """Канонические дата и время записей в неверном формате (база не меняется)
+
+    Возвращает ([(дата, время, id записи)], число неразобранных строк).
+    """
+    cursor.execute(f'''
+        SELECT id, appointment_date, appointment_time FROM {schema}.appointments ap
+        WHERE NOT ({APPOINTMENT_VALID})
+    ''')
+    fixed, failed = [], 0
+    for appointment_id, date, time in cursor.fetchall():
+        try:
+            fixed.append((parse_date(date), parse_clock(time), appointment_id))
+        except ValueError:
+            failed += 1
+    return fixed, failed
+
+
+def normalize_appointment_dates(cursor, schema='main'):
+    """Приведение даты и времени записей к канону; возвращает число неразобранных строк"""
+    fixed, failed = canonical_appointment_dates(cursor, schema)
+    # Интервал пересчитывается по новому времени
+    cursor.executemany(
+        f'''UPDATE {schema}.appointments
+        SET appointment_date = ?, appointment_time = ?, start_minute = NULL, end_minute = NULL
+        WHERE id = ?''',
+        fixed
+    )
+    return failed
+
+
+def _normalize_existing(cursor):
+    normalize_visit_dates(cursor)
+    normalize_appointment_dates(cursor)
+    fill_appointment_minutes(cursor)
+
+
+DATES_SCHEMA = [
+    _normalize_existing,
+    '''
+    ALTER TABLE visits ADD COLUMN visit_ts INTEGER
+    GENERATED ALWAYS AS (CAST(strftime('%s', visit_date) AS INTEGER)) VIRTUAL
+    ''',
+    '''
+    ALTER TABLE appointments ADD COLUMN start_ts INTEGER
+    GENERATED ALWAYS AS (CAST(strftime('%s', appointment_date) AS INTEGER) + start_minute * 60) VIRTUAL
+    ''',
+    # Выручка за период (покрывающий индекс) и расписание на день по врачам
+    'CREATE INDEX IF NOT EXISTS idx_visits_ts ON visits (visit_ts, cost)',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_appointments_start
+    ON appointments (start_ts, doctor_id, status_id, start_minute, end_minute)
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_visits_date_insert BEFORE INSERT ON visits
+    WHEN {VISIT_DATE_INVALID}
+    BEGIN
+        SELECT RAISE(ABORT, 'visit_date: ожидается YYYY-MM-DD HH:MM:SS');
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_visits_date_update BEFORE UPDATE OF visit_date ON visits
+    WHEN {VISIT_DATE_INVALID}
+    BEGIN
+        SELECT RAISE(ABORT, 'visit_date: ожидается YYYY-MM-DD HH:MM:SS');
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_appointments_date_insert BEFORE INSERT ON appointments
+    WHEN {APPOINTMENT_INVALID}
+    BEGIN
+        SELECT RAISE(ABORT, 'appointment_date/time: ожидается YYYY-MM-DD и HH:MM');
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_appointments_date_update
+    BEFORE UPDATE OF appointment_date, appointment_time ON appointments
+    WHEN {APPOINTMENT_INVALID}
+    BEGIN
+        SELECT RAISE(ABORT, 'appointment_date/time: ожидается YYYY-MM-DD и HH:MM');
+    END
+    ''',
+]
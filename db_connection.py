@@ -0,0 +1,176 @@
+# db_connection.py
+import os
+import sqlite3
+import threading
+import atexit
+from contextlib import contextmanager
+
+from query_stats import QueryStats, InstrumentedConnection
+
+# Настройки соединения, применяются один раз при открытии
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -16000),      # ~16 МБ страничного кэша
+    ('mmap_size', 268435456),    # 256 МБ отображения файла в память
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 5000),
+)
+
+# Размер кэша подготовленных выражений на одно соединение
+CACHED_STATEMENTS = 256
+
+
+class ConnectionManager:
+    """Менеджер соединений SQLite: одно постоянное соединение на поток"""
+
+    def __init__(self, db_name, pragmas=PRAGMAS, cached_statements=CACHED_STATEMENTS):
+        self.db_name = db_name
+        self.pragmas = pragmas
+        self.cached_statements = cached_statements
+        # Замеры всех запросов; журнал медленных - рядом с файлом базы
+        slow_log = None if db_name == ':memory:' else os.path.splitext(db_name)[0] + '_slow_queries.log'
+        self.stats = QueryStats(slow_log)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._closed = False
+
+    def _connect(self):
+        """Открытие и настройка нового соединения"""
+        # check_same_thread=False нужен только для закрытия из другого потока,
+        # само соединение используется лишь потоком-владельцем
+        conn = sqlite3.connect(
+            self.db_name,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            factory=InstrumentedConnection
+        )
+        conn.stats = self.stats
+        for name, value in self.pragmas:
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def connection(self):
+        """Соединение текущего потока (создается при первом обращении)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            with self._lock:
+                if self._closed:
+                    raise sqlite3.ProgrammingError(f"Менеджер соединений {self.db_name} закрыт")
+                conn = self._connect()
+                self._connections.append(conn)
+            self._local.conn = conn
+        return conn
+
+    def cursor(self):
+        """Курсор на соединении текущего потока"""
+        return self.connection().cursor()
+
+    def execute(self, sql, params=()):
+        """Выполнение одного запроса на чтение"""
+        return self.connection().execute(sql, params)
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """Транзакция: commit при успехе, rollback при ошибке
+        
+        immediate=True сразу берет блокировку на запись (BEGIN IMMEDIATE),
+        иначе транзакция открывается модулем sqlite3 перед первой вставкой.
+        Вложенный вызов в том же потоке становится точкой сохранения
+        (SAVEPOINT): его ошибка откатывает только его изменения, а фиксирует
+        все внешняя транзакция - так несколько операций записываются одним
+        commit.
+        """
+        conn = self.connection()
+        depth = getattr(self._local, 'depth', 0)
+        if depth:
+            yield from self._savepoint(conn, depth)
+            return
+        
+        cursor = conn.cursor()
+        self._local.depth = 1
+        self._local.on_commit = []
+        try:
+            if immediate and not conn.in_transaction:
+                cursor.execute('BEGIN IMMEDIATE')
+            yield cursor
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._local.depth = 0
+            callbacks, self._local.on_commit = self._local.on_commit, []
+            cursor.close()
+        for callback in callbacks:
+            callback()
+    
+    def _savepoint(self, conn, depth):
+        name = f'sp_{depth}'
+        cursor = conn.cursor()
+        self._local.depth = depth + 1
+        registered = len(self._local.on_commit)
+        try:
+            cursor.execute(f'SAVEPOINT {name}')
+            yield cursor
+            cursor.execute(f'RELEASE {name}')
+        except BaseException:
+            cursor.execute(f'ROLLBACK TO {name}')
+            cursor.execute(f'RELEASE {name}')
+            # Изменения точки сохранения отменены - их обработчики тоже
+            del self._local.on_commit[registered:]
+            raise
+        finally:
+            self._local.depth = depth
+            cursor.close()
+
+    def on_commit(self, callback):
+        """Вызов callback после commit внешней транзакции текущего потока
+
+        Вне транзакции callback вызывается сразу. Если транзакция или точка
+        сохранения, в которой он зарегистрирован, откатывается, callback не
+        вызывается.
+        """
+        if getattr(self._local, 'depth', 0):
+            self._local.on_commit.append(callback)
+        else:
+            callback()
+
+    def close(self):
+        """Закрытие всех соединений менеджера"""
+        with self._lock:
+            self._closed = True
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager(db_name):
+    """Общий менеджер соединений для файла базы данных"""
+    with _managers_lock:
+        manager = _managers.get(db_name)
+        if manager is None or manager._closed:
+            manager = ConnectionManager(db_name)
+            _managers[db_name] = manager
+        return manager
+
+
+def close_all():
+    """Закрытие всех открытых менеджеров (вызывается при завершении)"""
+    with _managers_lock:
+        managers = list(_managers.values())
+        _managers.clear()
+    for manager in managers:
+        manager.close()
+
+
+atexit.register(close_all)
@@ -0,0 +1,13 @@
+# defaults.py
+"""Общие значения по умолчанию
+
+Модуль без зависимостей: консоль импортирует его при запуске, до загрузки
+репозитория, поэтому здесь только константы.
+"""
+DB_NAME = 'vet_clinic.db'
+
+# Размер пакета по умолчанию: одна транзакция (и один fsync) на пакет
+DEFAULT_BATCH_SIZE = 1000
+
+# Количество животных на одной странице списка
+PAGE_SIZE = 20
@@ -0,0 +1,250 @@
+# federation.py
+"""Сводные запросы по базам нескольких филиалов
+
+У каждого филиала своя база (vet_clinic.db). ClinicFederation рассылает
+запрос - статистику, выручку за период или поиск визитов - по файлам баз в
+пул процессов и сводит частичные результаты: итоги складываются, разбивки
+по видам и месяцам суммируются, а лучшие найденные визиты филиалов
+чередуются (ранг bm25 считается по корпусу своей базы, и ранги разных баз
+между собой не сравнимы). Используются процессы, а не потоки: выборка и разбор строк
+идут в Python и под GIL в потоках не распараллелились бы.
+
+Рабочий процесс открывает каждую базу только на чтение (mode=ro) и держит
+одно соединение на файл, пока жив пул. Миграции не выполняются: базы
+филиалов обновляет их собственная программа. База, которую прочитать не
+удалось (старая схема, поврежденный файл, упавший рабочий процесс), не
+прерывает запрос - ошибка попадает в errors, а итоги считаются по остальным.
+
+    python federation.py stats north.db south.db
+    python federation.py search "отит" branches/*.db
+    python federation.py revenue --start 2024-12-01 --end 2025-01-01 branches/*.db
+"""
+import os
+import sqlite3
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import zip_longest
+from urllib.parse import quote
+
+from clinic_stats import income_by_month, read_statistics
+from dates import to_epoch
+from reports import period_revenue
+from search import search_visit_rows
+
+# Соединения рабочего процесса: путь к базе -> sqlite3.Connection
+_connections = {}
+
+
+def _connection(path):
+    conn = _connections.get(path)
+    if conn is None:
+        conn = _connections[path] = sqlite3.connect(f'file:{quote(path)}?mode=ro', uri=True)
+    return conn
+
+
+def _branch_statistics(conn):
+    cursor = conn.cursor()
+    stats = read_statistics(cursor)
+    stats['income_by_month'] = income_by_month(cursor)
+    return stats
+
+
+def _branch_search(conn, query, limit):
+    return search_visit_rows(conn.cursor(), query, limit)
+
+
+def _branch_revenue(conn, start, end):
+    return tuple(period_revenue(conn, start, end))
+
+
+# Запросы, выполняемые в рабочих процессах по одной базе
+TASKS = {
+    'statistics': _branch_statistics,
+    'search': _branch_search,
+    'revenue': _branch_revenue,
+}
+
+
+def _run(task, path, args):
+    return TASKS[task](_connection(path), *args)
+
+
+def branch_name(path):
+    """Имя филиала по файлу базы: north.db -> north"""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+@dataclass(frozen=True, slots=True)
+class BranchVisit:
+    """Визит, найденный в базе филиала; rank - ранг bm25 внутри этой базы"""
+    branch: str
+    visit: object
+    rank: float
+
+
+class ClinicFederation:
+    """Запросы по базам филиалов в пуле процессов
+
+    errors - {филиал: текст ошибки} по последнему запросу.
+    """
+
+    def __init__(self, paths, processes=None):
+        self.paths = [os.path.abspath(path) for path in paths]
+        missing = [path for path in self.paths if not os.path.exists(path)]
+        if missing:
+            raise FileNotFoundError(f"Нет файлов баз: {', '.join(missing)}")
+        processes = processes or min(len(self.paths), os.cpu_count() or 1)
+        self._pool = ProcessPoolExecutor(max_workers=max(1, processes))
+        self.errors = {}
+
+    def _fan_out(self, task, *args):
+        """{путь: результат} по всем базам; ошибки - в self.errors"""
+        futures = {path: self._pool.submit(_run, task, path, args) for path in self.paths}
+        results, self.errors = {}, {}
+        for path, future in futures.items():
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                # Любая ошибка филиала (в том числе BrokenProcessPool) не
+                # должна срывать сводный отчет по остальным
+                self.errors[branch_name(path)] = str(e) or type(e).__name__
+        return results
+
+    def statistics(self):
+        """Статистика сети в формате ClinicRepository.statistics()
+
+        Дополнительно: 'income_by_month' - [(месяц, визиты, доход)] по всем
+        филиалам и 'branches' - [(филиал, животных, визитов, доход)].
+        """
+        results = self._fan_out('statistics')
+        species, months = Counter(), {}
+        for stats in results.values():
+            species.update(dict(stats['species_count']))
+            for month, visits, income in stats['income_by_month']:
+                total_visits, total_income = months.get(month, (0, 0.0))
+                months[month] = (total_visits + visits, total_income + income)
+        return {
+            'total_animals': sum(stats['total_animals'] for stats in results.values()),
+            'species_count': sorted(species.items()),
+            'total_income': sum(stats['total_income'] for stats in results.values()),
+            'total_visits': sum(stats['total_visits'] for stats in results.values()),
+            'income_by_month': [(month,) + months[month] for month in sorted(months)],
+            'branches': [
+                (branch_name(path), stats['total_animals'], stats['total_visits'], stats['total_income'])
+                for path, stats in results.items()
+            ],
+        }
+
+    def revenue(self, start, end):
+        """Выручка за период [start, end): ((визитов, выручка), [(филиал, визитов, выручка)])"""
+        # Неверная дата - ошибка запроса (ValueError), а не каждого филиала
+        to_epoch(start)
+        to_epoch(end)
+        results = self._fan_out('revenue', start, end)
+        branches = [(branch_name(path), visits, income) for path, (visits, income) in results.items()]
+        total = (sum(row[1] for row in branches), sum(row[2] for row in branches))
+        return total, branches
+
+    def search(self, query, limit=20):
+        """Визиты по диагнозу и лечению во всех филиалах: [BranchVisit]
+
+        Ранги bm25 разных баз несравнимы, поэтому общего порядка нет: первыми
+        идут лучшие визиты каждого филиала, затем вторые и т. д.
+        """
+        from repository import Visit
+
+        results = self._fan_out('search', query, limit)
+        ranked = [
+            [BranchVisit(branch_name(path), Visit(*row[:-1]), row[-1]) for row in rows]
+            for path, rows in results.items()
+        ]
+        found = [item for place in zip_longest(*ranked) for item in place if item is not None]
+        return found[:limit]
+
+    def close(self):
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def print_statistics(stats):
+    print("\nСтатистика сети клиник:")
+    for branch, animals, visits, income in stats['branches']:
+        print(f"  {branch}: животных {animals}, визитов {visits}, доход {income:.2f} руб.")
+    print(f"Всего животных: {stats['total_animals']}")
+    print("Животные по видам:")
+    for species, count in stats['species_count']:
+        print(f"  {species}: {count}")
+    print(f"Всего визитов: {stats['total_visits']}")
+    print(f"Общий доход: {stats['total_income']:.2f} руб.")
+    months = stats['income_by_month'][-12:]
+    if months:
+        print("Доход по месяцам:")
+        for month, visits, income in months:
+            print(f"  {month}: {visits} визитов, {income:.2f} руб.")
+
+
+def print_errors(errors):
+    for branch, message in errors.items():
+        print(f"Ошибка в базе {branch}: {message}")
+
+
+def _print_report(federation, args):
+    if args.report == 'stats':
+        print_statistics(federation.statistics())
+    elif args.report == 'revenue':
+        (visits, income), branches = federation.revenue(args.start, args.end)
+        print(f"\nВыручка с {args.start} по {args.end} (не включая):")
+        for branch, branch_visits, branch_income in branches:
+            print(f"  {branch}: {branch_visits} визитов, {branch_income:.2f} руб.")
+        print(f"Всего: {visits} визитов, {income:.2f} руб.")
+    else:
+        found = federation.search(args.query, args.limit)
+        if not found:
+            print("Ничего не найдено")
+        for item in found:
+            visit = item.visit
+            print(f"[{item.branch}] Дата: {visit.visit_date}, Животное: {visit.animal_name} "
+                  f"(ID {visit.animal_id}), Диагноз: {visit.diagnosis}, Лечение: {visit.treatment}, "
+                  f"Стоимость: {visit.cost}")
+    print_errors(federation.errors)
+    return 1 if federation.errors else 0
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Сводные запросы по базам нескольких филиалов")
+    parser.add_argument('report', choices=['stats', 'search', 'revenue'])
+    parser.add_argument('databases', nargs='+', help="Файлы баз филиалов")
+    parser.add_argument('--query', '-q', help="Текст поиска (для search)")
+    parser.add_argument('--limit', type=int, default=20, help="Найденных визитов не больше")
+    parser.add_argument('--start', help="Начало периода (для revenue)")
+    parser.add_argument('--end', help="Конец периода, не включая")
+    parser.add_argument('--processes', type=int, help="Рабочих процессов (по умолчанию - по числу ядер)")
+    args = parser.parse_args(argv)
+
+    databases = args.databases
+    if args.report == 'search' and args.query is None:
+        args.query, databases = databases[0], databases[1:]
+    if not databases:
+        parser.error("не указаны файлы баз")
+    if args.report == 'revenue' and not (args.start and args.end):
+        parser.error("для revenue нужны --start и --end")
+
+    with ClinicFederation(databases, args.processes) as federation:
+        try:
+            return _print_report(federation, args)
+        except ValueError as e:
+            print(f"Ошибка: {e}")
+            return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+# import_data.py
+"""Пакетный импорт животных и визитов из CSV/JSONL вне интерактивного меню
+
+Примеры:
+    python import_data.py animals archive_animals.csv
+    python import_data.py visits visits.jsonl --db vet_clinic.db --batch-size 5000
+"""
+import argparse
+import csv
+import json
+import sys
+
+from main import VetClinicDB, DEFAULT_BATCH_SIZE
+
+
+def read_csv(path):
+    """Построчное чтение CSV с заголовком"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            yield row
+
+
+def read_jsonl(path):
+    """Построчное чтение JSONL (пустые строки пропускаются)"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # Передаем дальше как ошибочную строку, чтобы не сбить нумерацию
+                yield None
+
+
+def read_rows(path, file_format=None):
+    """Генератор строк файла по формату или расширению"""
+    file_format = file_format or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    if file_format == 'jsonl':
+        return read_jsonl(path)
+    return read_csv(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Импорт данных в базу ветлечебницы")
+    parser.add_argument('kind', choices=['animals', 'visits'], help="Что импортировать")
+    parser.add_argument('path', help="Файл CSV или JSONL")
+    parser.add_argument('--db', default='vet_clinic.db', help="Файл базы данных")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="Формат файла (по умолчанию по расширению)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Строк в одной транзакции")
+    args = parser.parse_args(argv)
+
+    clinic = VetClinicDB(args.db)
+    rows = read_rows(args.path, args.format)
+
+    try:
+        if args.kind == 'animals':
+            result = clinic.add_animals_bulk(rows, batch_size=args.batch_size)
+        else:
+            result = clinic.add_visits_bulk(rows, batch_size=args.batch_size)
+    finally:
+        clinic.close()
+
+    print(f"Импортировано записей: {result['inserted']}")
+    if result['errors']:
+        print(f"Строк с ошибками: {len(result['errors'])}", file=sys.stderr)
+        for line_no, message in result['errors']:
+            print(f"  строка {line_no}: {message}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,135 +1,195 @@
 # vet_clinic_db.py
-import sqlite3
+import threading
 from datetime import datetime
-import random
+from defaults import DB_NAME, DEFAULT_BATCH_SIZE, PAGE_SIZE
 
 class VetClinicDB:
-    def __init__(self, db_name="vet_clinic.db"):
+    """Консоль администратора поверх общего репозитория
+    
+    Репозиторий (импорт модулей и проверка схемы) открывается при первом
+    обращении или заранее в фоне через preload(), поэтому меню консоли
+    появляется сразу после запуска.
+    """
+    
+    def __init__(self, db_name=DB_NAME):
         self.db_name = db_name
-        self.init_database()
+        self._repo = None
+        self._lock = threading.Lock()
     
-    def init_database(self):
-        """Инициализация базы данных"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        # Таблица животных
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS animals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                species TEXT NOT NULL,
-                breed TEXT,
-                age INTEGER,
-                owner_name TEXT,
-                phone TEXT,
-                registration_date TEXT
-            )
-        ''')
-        
-        # Таблица визитов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS visits (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                animal_id INTEGER,
-                visit_date TEXT,
-                diagnosis TEXT,
-                treatment TEXT,
-                cost REAL,
-                FOREIGN KEY (animal_id) REFERENCES animals (id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+    @property
+    def repo(self):
+        if self._repo is None:
+            with self._lock:
+                if self._repo is None:
+                    from repository import open_repository
+                    self._repo = open_repository(self.db_name)
+        return self._repo
+    
+    @property
+    def db(self):
+        return self.repo.db
+    
+    def preload(self):
+        """Открытие базы в фоновом потоке, пока пользователь выбирает пункт меню"""
+        threading.Thread(target=self._preload, name='db-preload', daemon=True).start()
+    
+    def _preload(self):
+        try:
+            self.repo
+        except Exception:
+            pass  # Ошибка повторится и будет показана при первом обращении из меню
     
     def add_animal(self, name, species, breed, age, owner_name, phone):
         """Добавление нового животного"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO animals (name, species, breed, age, owner_name, phone, registration_date)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (name, species, breed, age, owner_name, phone, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        
-        conn.commit()
-        conn.close()
+        animal_id = self.repo.add_animal(name, species, breed, age, owner_name, phone)
         print(f"Животное {name} успешно добавлено!")
+        return animal_id
     
     def add_visit(self, animal_id, diagnosis, treatment, cost):
         """Добавление записи о визите"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO visits (animal_id, visit_date, diagnosis, treatment, cost)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (animal_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), diagnosis, treatment, cost))
-        
-        conn.commit()
-        conn.close()
+        visit_id = self.repo.add_visit(animal_id, diagnosis, treatment, cost)
         print(f"Визит для животного ID {animal_id} записан!")
+        return visit_id
+    
+    def add_animals_bulk(self, rows, batch_size=DEFAULT_BATCH_SIZE):
+        """Пакетное добавление животных (см. ClinicRepository.add_animals_bulk)"""
+        return self.repo.add_animals_bulk(rows, batch_size)
+    
+    def add_visits_bulk(self, rows, batch_size=DEFAULT_BATCH_SIZE):
+        """Пакетное добавление визитов (см. ClinicRepository.add_visits_bulk)"""
+        return self.repo.add_visits_bulk(rows, batch_size)
     
     def get_all_animals(self):
         """Получение списка всех животных"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM animals')
-        animals = cursor.fetchall()
-        
-        conn.close()
-        return animals
+        return list(self.iter_animals())
     
-    def get_animal_visits(self, animal_id):
-        """Получение истории визитов животного"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT v.visit_date, v.diagnosis, v.treatment, v.cost 
-            FROM visits v 
-            WHERE v.animal_id = ? 
-            ORDER BY v.visit_date DESC
-        ''', (animal_id,))
-        
-        visits = cursor.fetchall()
-        conn.close()
-        return visits
+    def iter_animals(self, batch_size=500):
+        """Потоковый обход всех животных без загрузки таблицы в память"""
+        return self.repo.iter_animals(batch_size)
+    
+    def get_animals_page(self, after_id=0, limit=PAGE_SIZE):
+        """Страница животных с ID больше after_id (постраничный вывод по ключу)"""
+        return self.repo.animals_page(after_id, limit)
+    
+    def get_animal_visits(self, animal_id, full_history=False):
+        """Получение истории визитов животного (full_history - вместе с архивом)"""
+        return self.repo.animal_visits(animal_id, full_history)
+    
+    def has_archive(self):
+        """Есть ли перенесенная в архив история"""
+        return bool(self.repo.archive.years())
+    
+    def search(self, query, limit=20):
+        """Полнотекстовый поиск визитов по диагнозу и лечению"""
+        return self.repo.search_visits(query, limit)
+    
+    def find_owners(self, query, limit=20):
+        """Владельцы по части номера, последним цифрам ('*4567') или имени с опечатками"""
+        return self.repo.find_owners(query, limit)
+
+    def get_owner_animals(self, owner):
+        """Животные владельца: [(id, кличка, вид, порода)]"""
+        return self.repo.owner_animals(owner)
     
     def get_statistics(self):
-        """Получение статистики клиники"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        # Общее количество животных
-        cursor.execute('SELECT COUNT(*) FROM animals')
-        total_animals = cursor.fetchone()[0]
-        
-        # Количество животных по видам
-        cursor.execute('SELECT species, COUNT(*) FROM animals GROUP BY species')
-        species_count = cursor.fetchall()
-        
-        # Общий доход
-        cursor.execute('SELECT SUM(cost) FROM visits')
-        total_income = cursor.fetchone()[0] or 0
+        """Получение статистики клиники (из сводных таблиц)"""
+        return self.repo.statistics()
+    
+    def get_income_by_day(self, start=None, end=None):
+        """Визиты и доход по дням: [(день, визиты, доход)], границы включительно"""
+        return self.repo.income_by_day(start, end)
+    
+    def get_income_by_month(self, start=None, end=None):
+        """Визиты и доход по месяцам (YYYY-MM): [(месяц, визиты, доход)]"""
+        return self.repo.income_by_month(start, end)
+    
+    def get_agenda(self, date):
+        """Расписание приема на день"""
+        return self.repo.agenda(date)
+    
+    def get_revenue(self, start, end):
+        """(визитов, выручка) за период [start, end)"""
+        return self.repo.revenue(start, end)
+    
+    def get_doctor_load(self, start, end):
+        """Загрузка врачей за период [start, end)"""
+        return self.repo.doctor_load(start, end)
+    
+    def rebuild_statistics(self):
+        """Полный пересчет сводной статистики"""
+        self.repo.rebuild_statistics()
+
+    def get_query_stats(self):
+        """Замеры SQL-запросов с запуска программы"""
+        return self.repo.metrics()['queries']
+
+    def export_metrics(self, path=None):
+        """Сохранение снимка метрик в JSON-файл; возвращает путь"""
+        return self.repo.export_metrics(path)
+    
+    def has_analytics(self):
+        """Есть ли колоночная выгрузка для аналитики"""
+        import os
+        from analytics import analytics_path
+        return os.path.exists(analytics_path(self.db_name))
+
+    def export_analytics(self):
+        """Обновление колоночной выгрузки для аналитики; манифест выгрузки"""
+        return self.repo.export_analytics()
+
+    def get_revenue_report(self, start=None, end=None):
+        """Выручка по видам, врачам, услугам и месяцам по последней выгрузке"""
+        from analytics import ColumnStore, analytics_path, revenue_report
+        with ColumnStore(analytics_path(self.db_name)) as store:
+            return store.manifest['created'], revenue_report(store, start, end)
+    
+    def backup(self):
+        """Снимок базы на ходу в каталоге резервных копий; путь снимка"""
+        return self.repo.backup()
+
+    def verify_backup(self, path):
+        """Проверка снимка; пустой список - снимок цел"""
+        from backup import verify_snapshot
+        return verify_snapshot(path)
+    
+    def verify_statistics(self):
+        """Сверка сводной статистики с данными; пустой список - расхождений нет"""
+        return self.repo.verify_statistics()
+    
+    def close(self):
+        """Закрытие соединений с базой данных"""
+        with self._lock:
+            if self._repo is not None:
+                self._repo.close()
+
+def show_animals_paged(clinic, page_size=PAGE_SIZE):
+    """Постраничный вывод списка животных"""
+    print("\nСписок животных:")
+    after_id = 0
+    page_no = 1
+    
+    while True:
+        animals = clinic.get_animals_page(after_id, page_size)
+        if not animals:
+            if page_no == 1:
+                print("Животных пока нет")
+            break
         
-        # Количество визитов
-        cursor.execute('SELECT COUNT(*) FROM visits')
-        total_visits = cursor.fetchone()[0]
+        for animal in animals:
+            print(f"ID: {animal.id}, Имя: {animal.name}, Вид: {animal.species}, Порода: {animal.breed}, Возраст: {animal.age}, Владелец: {animal.owner_name}")
         
-        conn.close()
+        if len(animals) < page_size:
+            break
         
-        return {
-            'total_animals': total_animals,
-            'species_count': species_count,
-            'total_income': total_income,
-            'total_visits': total_visits
-        }
+        after_id = animals[-1].id
+        page_no += 1
+        answer = input(f"-- Страница {page_no - 1}. Enter - далее, q - выход: ")
+        if answer.strip().lower() == 'q':
+            break
 
 def main():
     clinic = VetClinicDB()
+    clinic.preload()
     
     while True:
         print("\n=== Система управления ветлечебницей ===")
@@ -138,7 +198,13 @@ def main():
         print("3. Показать всех животных")
         print("4. Показать историю визитов")
         print("5. Статистика клиники")
-        print("6. Выход")
+        print("6. Поиск по диагнозам и лечению")
+        print("7. Отчеты: расписание, выручка, загрузка врачей")
+        print("8. Статистика запросов к базе (stats)")
+        print("9. Поиск владельца по телефону или имени")
+        print("10. Аналитика выручки по всей истории")
+        print("11. Резервная копия базы (backup)")
+        print("0. Выход")
         
         choice = input("Выберите действие: ")
         
@@ -159,17 +225,15 @@ def main():
             clinic.add_visit(animal_id, diagnosis, treatment, cost)
             
         elif choice == '3':
-            animals = clinic.get_all_animals()
-            print("\nСписок животных:")
-            for animal in animals:
-                print(f"ID: {animal[0]}, Имя: {animal[1]}, Вид: {animal[2]}, Порода: {animal[3]}, Возраст: {animal[4]}, Владелец: {animal[5]}")
+            show_animals_paged(clinic)
                 
         elif choice == '4':
             animal_id = int(input("ID животного: "))
-            visits = clinic.get_animal_visits(animal_id)
+            full_history = clinic.has_archive() and input("Включая архив? (y/N): ").strip().lower() == 'y'
+            visits = clinic.get_animal_visits(animal_id, full_history)
             print(f"\nИстория визитов животного ID {animal_id}:")
             for visit in visits:
-                print(f"Дата: {visit[0]}, Диагноз: {visit[1]}, Лечение: {visit[2]}, Стоимость: {visit[3]}")
+                print(f"Дата: {visit.visit_date}, Диагноз: {visit.diagnosis}, Лечение: {visit.treatment}, Стоимость: {visit.cost}")
                 
         elif choice == '5':
             stats = clinic.get_statistics()
@@ -180,8 +244,70 @@ def main():
                 print(f"  {species}: {count}")
             print(f"Всего визитов: {stats['total_visits']}")
             print(f"Общий доход: {stats['total_income']:.2f} руб.")
+            months = clinic.get_income_by_month()[-12:]
+            if months:
+                print("Доход по месяцам:")
+                for month, visits, income in months:
+                    print(f"  {month}: {visits} визитов, {income:.2f} руб.")
             
         elif choice == '6':
+            query = input("Поиск: ")
+            results = clinic.search(query)
+            if not results:
+                print("Ничего не найдено")
+            for visit in results:
+                print(f"Дата: {visit.visit_date}, Животное: {visit.animal_name} (ID {visit.animal_id}), Диагноз: {visit.diagnosis}, Лечение: {visit.treatment}, Стоимость: {visit.cost}")
+            
+        elif choice == '7':
+            from reports import month_range, week_range, print_agenda, print_revenue, print_load
+            date = input("Дата (Enter - сегодня): ").strip() or datetime.now().strftime("%Y-%m-%d")
+            try:
+                print_agenda(clinic.get_agenda(date), date)
+                start, end = month_range(date)
+                print_revenue(*clinic.get_revenue(start, end), start, end)
+                start, end = week_range(date)
+                print_load(clinic.get_doctor_load(start, end), start, end)
+            except ValueError as e:
+                print(f"Ошибка: {e}")
+            
+        elif choice in ('8', 'stats'):
+            from query_stats import print_report
+            print_report(clinic.get_query_stats())
+            if input("Сохранить снимок метрик в файл? (y/N): ").strip().lower() == 'y':
+                print(f"Метрики сохранены в {clinic.export_metrics()}")
+            
+        elif choice == '9':
+            from owners import print_owners
+            query = input("Телефон, его часть, *последние цифры или имя: ")
+            print_owners(clinic.find_owners(query), clinic.get_owner_animals)
+            
+        elif choice in ('10', 'analytics'):
+            from analytics import print_revenue_report
+            if (not clinic.has_analytics()
+                    or input("Обновить выгрузку из базы? (y/N): ").strip().lower() == 'y'):
+                rows = clinic.export_analytics()['tables']['visits']['rows']
+                print(f"Выгружено визитов: {rows}")
+            start = input("С месяца (YYYY-MM, Enter - вся история): ").strip() or None
+            end = input("По месяц, не включая (Enter - до конца): ").strip() or None
+            try:
+                created, report = clinic.get_revenue_report(start, end)
+                print(f"Выгрузка от {created}")
+                print_revenue_report(report)
+            except ValueError as e:
+                print(f"Ошибка: {e}")
+            
+        elif choice in ('11', 'backup'):
+            path = clinic.backup()
+            print(f"Снимок сохранен: {path}")
+            if input("Проверить снимок? (y/N): ").strip().lower() == 'y':
+                problems = clinic.verify_backup(path)
+                for problem in problems:
+                    print(f"Ошибка: {problem}")
+                if not problems:
+                    print("Снимок цел")
+            
+        elif choice == '0':
+            clinic.close()
             print("До свидания!")
             break
         else:
@@ -0,0 +1,109 @@
+# migrations.py
+import sqlite3
+
+# Размер порции для шагов, выполняемых по частям
+DEFAULT_BATCH_SIZE = 5000
+
+
+class BatchedStep:
+    """Шаг миграции, выполняемый порциями по диапазонам rowid таблицы
+
+    Каждая порция - отдельная короткая транзакция, поэтому копирование
+    большой таблицы не блокирует запись на все время переноса. Запросы
+    получают именованные параметры :lo и :hi (полуинтервал rowid) и должны
+    быть идемпотентными (INSERT OR IGNORE и т.п.), чтобы прерванную миграцию
+    можно было безопасно повторить. Строки, добавленные после начала
+    переноса, должны переноситься триггерами, созданными шагом ранее.
+    """
+
+    def __init__(self, table, statements, batch_size=DEFAULT_BATCH_SIZE):
+        self.table = table
+        self.statements = [statements] if isinstance(statements, str) else list(statements)
+        self.batch_size = batch_size
+
+    def run(self, db):
+        max_rowid = db.execute(f'SELECT MAX(rowid) FROM {self.table}').fetchone()[0] or 0
+        for lo in range(0, max_rowid + 1, self.batch_size):
+            params = {'lo': lo, 'hi': lo + self.batch_size}
+            with db.transaction(immediate=True) as cursor:
+                for sql in self.statements:
+                    cursor.execute(sql, params)
+
+
+def schema_version(db):
+    """Текущая версия схемы из PRAGMA user_version"""
+    return db.execute('PRAGMA user_version').fetchone()[0]
+
+
+def check_versions(migrations):
+    """Проверка списка миграций при импорте: версии с 1 и строго возрастают
+
+    Версия записывается в PRAGMA user_version, поэтому у каждой миграции
+    номер задается явно и после выпуска не меняется.
+    """
+    versions = [version for version, _ in migrations]
+    assert versions and versions[0] >= 1, f"Версии миграций начинаются с 1: {versions}"
+    assert all(a < b for a, b in zip(versions, versions[1:])), \
+        f"Версии миграций должны строго возрастать: {versions}"
+
+
+def latest_version(migrations):
+    """Номер последней известной миграции"""
+    return max((version for version, _ in migrations), default=0)
+
+
+def _run_steps(cursor, steps):
+    for step in steps:
+        if callable(step):
+            step(cursor)
+        else:
+            cursor.execute(step)
+
+
+def run_migrations(db, migrations):
+    """Применение недостающих миграций к базе данных
+
+    migrations - список пар (версия, шаги); шаг - SQL-строка или функция,
+    принимающая курсор. Каждая миграция выполняется в своей короткой
+    транзакции вместе с записью новой версии в PRAGMA user_version, так что
+    блокировка на запись держится не дольше одного шага обновления, а
+    прерванное обновление продолжится при следующем запуске.
+
+    Шаги BatchedStep делят миграцию на части: предшествующие им шаги
+    фиксируются отдельной транзакцией, сам шаг выполняется порциями, а
+    версия записывается вместе с последней группой шагов.
+    """
+    current = schema_version(db)
+    applied = []
+
+    # Быстрый путь при каждом запуске: схема уже актуальна
+    if current >= latest_version(migrations):
+        return applied
+
+    for version, steps in sorted(migrations, key=lambda m: m[0]):
+        if version <= current:
+            continue
+
+        try:
+            pending = []
+            for step in steps:
+                if isinstance(step, BatchedStep):
+                    with db.transaction(immediate=True) as cursor:
+                        _run_steps(cursor, pending)
+                    pending = []
+                    step.run(db)
+                else:
+                    pending.append(step)
+
+            with db.transaction(immediate=True) as cursor:
+                _run_steps(cursor, pending)
+                cursor.execute(f'PRAGMA user_version = {int(version)}')
+        except sqlite3.Error as e:
+            raise sqlite3.DatabaseError(
+                f"Ошибка миграции {db.db_name} до версии {version}: {e}"
+            ) from e
+
+        current = version
+        applied.append(version)
+
+    return applied
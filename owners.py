@@ -0,0 +1,413 @@
+# owners.py
+"""Поиск владельцев по телефону и имени
+
+Владелец - пара (телефон, имя) из карточек животных клиники
+(animals.phone, owner_name) и клиентов портала (clients). Таблица owners
+собирается триггерами и хранит телефон в формате E.164 (+79161234567),
+как бы его ни набрали: '8 (916) 123-45-67', '916 1234567', '+7 916...'.
+
+По телефону ищется начало нормализованного номера (диапазон по индексу
+owners.phone, поэтому неполный номер '8916123' тоже находится) или
+последние цифры: '*4567'. Имена индексируются дважды: по словам (FTS5
+unicode61 с префиксами до 5 букв) - для поиска по началу слов, и
+по триграммам (токенизатор trigram) - для опечаток. Если слов запроса
+нашлось меньше, чем нужно, кандидаты добираются по самым редким триграммам
+запроса (частоты - из owners_vocab). Результаты упорядочиваются по
+похожести на запрос - доле общих триграмм слов, как в pg_trgm. Регистр и
+«ё»/«е» не различаются.
+
+    python owners.py 916123          - по началу номера
+    python owners.py '*4567'         - по последним цифрам
+    python owners.py 'Петорв Иван'   - по имени с опечаткой
+"""
+import re
+import sys
+from dataclasses import dataclass
+from itertools import combinations
+
+from search import TOKENIZE, build_match_query
+
+# Символы, которые убираются из номера перед нормализацией (так же в SQL)
+PHONE_SEPARATORS = ' -()+.'
+# Сколько самых редких триграмм запроса берется для выбора кандидатов
+# (кандидат должен содержать хотя бы половину из них)
+FUZZY_TRIGRAMS = 4
+# Кандидатов на ранжирование не больше
+MAX_CANDIDATES = 300
+# Частоты триграмм запоминаются (fts5vocab считает их обходом индекса)
+TRIGRAM_CACHE_SIZE = 50000
+# Наименьшая похожесть имени для нечеткого совпадения
+MIN_SIMILARITY = 0.3
+# Последние цифры номера, по которым есть индекс
+PHONE_TAIL = 4
+
+_PHONE_QUERY = re.compile(r'[\d\s()+\-.*]+')
+
+
+def _phone_digits_sql(phone):
+    digits = f"COALESCE({phone}, '')"
+    for char in PHONE_SEPARATORS:
+        digits = f"replace({digits}, '{char}', '')"
+    return digits
+
+
+def e164_sql(phone):
+    """SQL-выражение: номер в формате E.164 (для российских номеров +7...)"""
+    digits = _phone_digits_sql(phone)
+    return f'''(CASE
+        WHEN {digits} = '' THEN ''
+        WHEN length({digits}) = 11 AND substr({digits}, 1, 1) = '8' THEN '+7' || substr({digits}, 2)
+        WHEN length({digits}) = 10 THEN '+7' || {digits}
+        ELSE '+' || {digits} END)'''
+
+
+def name_key_sql(name):
+    """SQL-выражение: имя для поиска (без «ё» и крайних пробелов)"""
+    return f"replace(replace(trim(COALESCE({name}, '')), 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _digits(text):
+    return ''.join(char for char in str(text or '') if char not in PHONE_SEPARATORS)
+
+
+def normalize_phone(phone):
+    """Номер в формате E.164; совпадает с e164_sql. Пустая строка - пустой номер"""
+    digits = _digits(phone).strip()
+    if not digits:
+        return ''
+    if len(digits) == 11 and digits[0] == '8':
+        return '+7' + digits[1:]
+    if len(digits) == 10:
+        return '+7' + digits
+    return '+' + digits
+
+
+def phone_prefix(text):
+    """Начало номера в формате E.164 по неполному вводу"""
+    text = text.strip()
+    digits = _digits(text)
+    if text.startswith('+'):
+        return '+' + digits
+    if digits[:1] == '8':
+        return '+7' + digits[1:]
+    if digits[:1] == '7':
+        return '+' + digits
+    # Код города или оператора без 8/+7: '916', '495'
+    return '+7' + digits
+
+
+def name_key(name):
+    return ' '.join(str(name or '').lower().replace('ё', 'е').split())
+
+
+def word_trigrams(text):
+    """Триграммы слов с отступами, как в pg_trgm: '  и', ' ив', 'ива', ..."""
+    grams = set()
+    for word in name_key(text).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+OWNER_COLUMNS = 'id, phone, name, animals, client_id'
+
+
+def _add_owner(phone, name, animals, client_id):
+    return f'''
+        INSERT INTO owners (phone, name, search_name, animals, client_id)
+        SELECT {e164_sql(phone)}, trim(COALESCE({name}, '')), {name_key_sql(name)}, {animals}, {client_id}
+        WHERE {e164_sql(phone)} <> '' OR trim(COALESCE({name}, '')) <> ''
+        ON CONFLICT (phone, name) DO UPDATE SET animals = animals + excluded.animals,
+            client_id = COALESCE(excluded.client_id, client_id);
+    '''
+
+
+def _remove_owner(phone, name, animals, client):
+    where = f"phone = {e164_sql(phone)} AND name = trim(COALESCE({name}, ''))"
+    release = 'NULL' if client else 'client_id'
+    return f'''
+        UPDATE owners SET animals = animals - {animals}, client_id = {release} WHERE {where};
+        DELETE FROM owners WHERE {where} AND animals <= 0 AND client_id IS NULL;
+    '''
+
+
+def _owner_triggers(table, phone, name, animals, client_id):
+    client = client_id != 'NULL'
+    new_client = f'NEW.{client_id}' if client else 'NULL'
+    return [
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_owners_{table}_insert AFTER INSERT ON {table}
+        BEGIN
+            {_add_owner(f'NEW.{phone}', f'NEW.{name}', animals, new_client)}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_owners_{table}_delete AFTER DELETE ON {table}
+        BEGIN
+            {_remove_owner(f'OLD.{phone}', f'OLD.{name}', animals, client)}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_owners_{table}_update AFTER UPDATE OF {phone}, {name} ON {table}
+        BEGIN
+            {_remove_owner(f'OLD.{phone}', f'OLD.{name}', animals, client)}
+            {_add_owner(f'NEW.{phone}', f'NEW.{name}', animals, new_client)}
+        END
+        ''',
+    ]
+
+
+def _fts_triggers(index):
+    """Синхронизация индекса FTS5 (external content) с таблицей owners"""
+    return [
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{index}_insert AFTER INSERT ON owners
+        BEGIN
+            INSERT INTO {index} (rowid, search_name) VALUES (NEW.id, NEW.search_name);
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{index}_delete AFTER DELETE ON owners
+        BEGIN
+            INSERT INTO {index} ({index}, rowid, search_name) VALUES ('delete', OLD.id, OLD.search_name);
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{index}_update AFTER UPDATE OF search_name ON owners
+        BEGIN
+            INSERT INTO {index} ({index}, rowid, search_name) VALUES ('delete', OLD.id, OLD.search_name);
+            INSERT INTO {index} (rowid, search_name) VALUES (NEW.id, NEW.search_name);
+        END
+        ''',
+    ]
+
+
+OWNERS_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS owners (
+        id INTEGER PRIMARY KEY,
+        phone TEXT NOT NULL,
+        name TEXT NOT NULL,
+        search_name TEXT NOT NULL,
+        animals INTEGER NOT NULL DEFAULT 0,
+        client_id INTEGER,
+        UNIQUE (phone, name)
+    )
+    ''',
+    f'''
+    INSERT INTO owners (phone, name, search_name, animals)
+    SELECT phone, name, search_name, COUNT(*) FROM (
+        SELECT {e164_sql('phone')} AS phone, trim(COALESCE(owner_name, '')) AS name,
+               {name_key_sql('owner_name')} AS search_name
+        FROM animals
+    )
+    WHERE phone <> '' OR name <> ''
+    GROUP BY phone, name
+    ''',
+    f'''
+    INSERT INTO owners (phone, name, search_name, client_id)
+    SELECT {e164_sql('phone')}, trim(COALESCE(name, '')), {name_key_sql('name')}, id
+    FROM clients WHERE true
+    ON CONFLICT (phone, name) DO UPDATE SET client_id = excluded.client_id
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_owners_phone_tail ON owners (substr(phone, -4))',
+    'CREATE INDEX IF NOT EXISTS idx_owners_client ON owners (client_id)',
+    # Карточки животных владельца по нормализованному номеру
+    f'CREATE INDEX IF NOT EXISTS idx_animals_owner_phone ON animals ({e164_sql("phone")}, owner_name)',
+    f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS owners_fts USING fts5(
+        search_name, content='owners', content_rowid='id',
+        tokenize="{TOKENIZE}", prefix='2 3 4 5'
+    )
+    ''',
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS owners_trigram_fts USING fts5(
+        search_name, content='owners', content_rowid='id', tokenize='trigram'
+    )
+    ''',
+    "INSERT INTO owners_fts (owners_fts) VALUES ('rebuild')",
+    "INSERT INTO owners_trigram_fts (owners_trigram_fts) VALUES ('rebuild')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS owners_vocab USING fts5vocab(owners_trigram_fts, 'row')",
+] + _fts_triggers('owners_fts') + _fts_triggers('owners_trigram_fts') \
+  + _owner_triggers('animals', 'phone', 'owner_name', 1, 'NULL') \
+  + _owner_triggers('clients', 'phone', 'name', 0, 'id')
+
+
+@dataclass(frozen=True, slots=True)
+class Owner:
+    """Владелец: нормализованный телефон и имя"""
+    id: int
+    phone: str
+    name: str
+    animals: int
+    client_id: int = None
+    # Похожесть имени на запрос (для поиска по имени)
+    score: float = None
+
+
+class OwnerLookup:
+    def __init__(self, db):
+        self.db = db
+        # Триграмма -> число владельцев; для выбора редких триграмм точность не важна
+        self._frequencies = {}
+
+    def find(self, query, limit=20):
+        """Поиск по номеру (если в запросе только цифры и разделители) или по имени"""
+        query = (query or '').strip()
+        if not query:
+            return []
+        if _PHONE_QUERY.fullmatch(query) and any(char.isdigit() for char in query):
+            return self.by_phone(query, limit)
+        return self.by_name(query, limit)
+
+    def _owners(self, sql, params):
+        return [Owner(*row) for row in self.db.execute(sql, params).fetchall()]
+
+    def by_phone(self, text, limit=20):
+        """Владельцы по началу номера или по последним цифрам ('*4567')"""
+        if text.strip().startswith('*'):
+            digits = _digits(text.strip()[1:]).replace('*', '')
+            if not digits:
+                return []
+            if len(digits) < PHONE_TAIL:
+                # Все окончания из 4 цифр, заканчивающиеся на digits - поиск по индексу
+                width = PHONE_TAIL - len(digits)
+                tails = [f'{head:0{width}d}{digits}' for head in range(10 ** width)]
+                return self._owners(
+                    f'''SELECT {OWNER_COLUMNS} FROM owners
+                    WHERE substr(phone, -4) IN ({', '.join('?' * len(tails))}) LIMIT ?''',
+                    (*tails, limit)
+                )
+            return self._owners(
+                f'''SELECT {OWNER_COLUMNS} FROM owners
+                WHERE substr(phone, -4) = ? AND phone LIKE ? ORDER BY phone LIMIT ?''',
+                (digits[-PHONE_TAIL:], '%' + digits, limit)
+            )
+        prefix = phone_prefix(text.replace('*', ''))
+        # Цифры меньше ':', поэтому [prefix, prefix + ':') - все номера с этим началом
+        return self._owners(
+            f'SELECT {OWNER_COLUMNS} FROM owners WHERE phone >= ? AND phone < ? ORDER BY phone LIMIT ?',
+            (prefix, prefix + ':', limit)
+        )
+
+    def by_phone_exact(self, phone):
+        """Владельцы с точно этим номером (в любой записи)"""
+        return self._owners(
+            f'SELECT {OWNER_COLUMNS} FROM owners WHERE phone = ? ORDER BY name',
+            (normalize_phone(phone),)
+        )
+
+    def by_name(self, text, limit=20):
+        """Владельцы по имени: начала слов или похожее имя, лучшие совпадения первыми"""
+        key = name_key(text)
+        match = build_match_query(key)
+        if not match:
+            return []
+        query_grams = word_trigrams(key)
+        words = re.findall(r'\w+', key)
+
+        # Сначала слова целиком, затем начала слов, при нехватке - похожие имена
+        candidates = self._candidates('owners_fts', ' AND '.join(_fts_phrase(word) for word in words))
+        if len(candidates) < limit:
+            candidates.update(self._candidates('owners_fts', match))
+        exact = set(candidates)
+        if len(candidates) < limit:
+            # Слова, которые есть в индексе, обязательны, похожие ищутся для остальных
+            known = [word for word in words if self._candidates('owners_fts', _fts_phrase(word), 1)]
+            typos = [word for word in words if word not in known] or words
+            candidates.update(self._candidates('owners_trigram_fts', self._fuzzy_match(known, typos)))
+
+        scored = []
+        for owner in candidates.values():
+            grams = word_trigrams(owner.name)
+            score = len(query_grams & grams) / len(query_grams | grams) if grams else 0.0
+            if owner.id in exact or score >= MIN_SIMILARITY:
+                scored.append((owner.id not in exact, -score, owner.name, owner.phone, owner, score))
+        scored.sort(key=lambda item: item[:4])
+        return [Owner(owner.id, owner.phone, owner.name, owner.animals, owner.client_id, round(score, 3))
+                for *_, owner, score in scored[:limit]]
+
+    def _fuzzy_match(self, known, typos):
+        """Запрос MATCH: все known и не меньше половины самых редких триграмм слов typos"""
+        grams = {word[i:i + 3] for word in typos for i in range(len(word) - 2)}
+        frequencies = self._trigram_frequencies(grams)
+        # Триграмм с опечаткой обычно нет в словаре - они отпадают сами
+        present = sorted((count, term) for term, count in frequencies.items() if count)
+        rarest = [term for _, term in present[:FUZZY_TRIGRAMS]]
+        parts = [_fts_phrase(word) for word in known if word not in typos]
+        if rarest:
+            needed = (len(rarest) + 1) // 2
+            parts.append('(' + ' OR '.join(
+                '(' + ' AND '.join(_fts_phrase(term) for term in group) + ')'
+                for group in combinations(rarest, needed)
+            ) + ')')
+        return ' AND '.join(parts) or None
+
+    def _trigram_frequencies(self, grams):
+        missing = [gram for gram in grams if gram not in self._frequencies]
+        if missing:
+            if len(self._frequencies) + len(missing) > TRIGRAM_CACHE_SIZE:
+                self._frequencies.clear()
+            found = dict(self.db.execute(
+                f"SELECT term, doc FROM owners_vocab WHERE term IN ({', '.join('?' * len(missing))})",
+                missing
+            ).fetchall())
+            for gram in missing:
+                self._frequencies[gram] = found.get(gram, 0)
+        return {gram: self._frequencies.get(gram, 0) for gram in grams}
+
+    def _candidates(self, index, match, limit=MAX_CANDIDATES):
+        if not match:
+            return {}
+        rows = self.db.execute(f'''
+            SELECT {', '.join('o.' + column for column in OWNER_COLUMNS.split(', '))}
+            FROM {index} f JOIN owners o ON o.id = f.rowid
+            WHERE {index} MATCH ? LIMIT ?
+        ''', (match, limit)).fetchall()
+        return {row[0]: Owner(*row) for row in rows}
+
+    def animals(self, owner):
+        """Карточки животных владельца: [(id, кличка, вид, порода)]"""
+        return self.db.execute(f'''
+            SELECT id, name, species, breed FROM animals
+            WHERE {e164_sql('phone')} = ? AND trim(COALESCE(owner_name, '')) = ?
+            ORDER BY id
+        ''', (owner.phone, owner.name)).fetchall()
+
+
+def print_owners(owners, show_animals=None):
+    if not owners:
+        print("Владельцы не найдены")
+    for owner in owners:
+        portal = ", клиент портала" if owner.client_id else ""
+        match = f" (похожесть {owner.score:.2f})" if owner.score is not None else ""
+        print(f"  {owner.phone or '—'}  {owner.name or '—'}: животных {owner.animals}{portal}{match}")
+        if show_animals:
+            for animal_id, name, species, breed in show_animals(owner):
+                print(f"      ID {animal_id}: {name}, {species}" + (f", {breed}" if breed else ""))
+
+
+def main(argv=None):
+    import argparse
+    from repository import open_repository, DB_NAME
+
+    parser = argparse.ArgumentParser(description="Поиск владельцев по телефону и имени")
+    parser.add_argument('query', help="Номер или его часть, '*4567' или имя")
+    parser.add_argument('--db', default=DB_NAME, help="Файл базы данных")
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    repo = open_repository(args.db)
+    try:
+        print_owners(repo.find_owners(args.query, args.limit), repo.owner_animals)
+    finally:
+        repo.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
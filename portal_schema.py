@@ -0,0 +1,209 @@
+# portal_schema.py
+"""Нормализованная схема записей портала
+
+Записи на прием ссылаются на клиентов и питомцев целочисленными ключами,
+а статус, врач и услуга вынесены в справочники. Переход со старой схемы
+(client_phone / animal_name / строки в каждой записи) выполняется онлайн:
+новые таблицы заполняются порциями, изменения старых таблиц во время
+переноса дублируются триггерами, а подмена таблиц - одна короткая
+транзакция в конце.
+"""
+from migrations import BatchedStep
+from search import PETS_FTS_SCHEMA
+
+SERVICES = ["Осмотр", "Вакцинация", "Стерилизация", "Чистка зубов", "Стрижка", "Экстренный прием"]
+STATUSES = ['Ожидание', 'Подтвержден', 'Завершен', 'Отменен']
+DOCTORS = ['Не назначен', 'Др. Смирнова', 'Др. Иванов', 'Др. Петрова']
+
+# Статус и врач новой записи
+STATUS_PENDING = 'Ожидание'
+STATUS_CONFIRMED = 'Подтвержден'
+DOCTOR_UNASSIGNED = 'Не назначен'
+# Имя клиента, созданного при переносе для питомцев и записей без клиента
+CLIENT_UNREGISTERED = 'Не зарегистрирован'
+
+LOOKUP_TABLES = ('services', 'appointment_statuses', 'doctors')
+
+
+def lookup_id(cursor, table, name):
+    """ID значения справочника (значение добавляется при отсутствии)"""
+    if name is None:
+        return None
+    if table not in LOOKUP_TABLES:
+        raise ValueError(f"Неизвестный справочник: {table}")
+    cursor.execute(f'INSERT OR IGNORE INTO {table} (name) VALUES (?)', (name,))
+    cursor.execute(f'SELECT id FROM {table} WHERE name = ?', (name,))
+    return cursor.fetchone()[0]
+
+
+def _seed(table, names):
+    values = ', '.join('(?)' for _ in names)
+    return lambda cursor: cursor.execute(f'INSERT OR IGNORE INTO {table} (name) VALUES {values}', names)
+
+
+# Телефона строки старой таблицы может не быть среди клиентов (или он пуст):
+# для него заводится клиент-заглушка, иначе питомец или запись потерялись бы
+_UNREGISTERED_CLIENT = f'''
+    INSERT OR IGNORE INTO clients (phone, name)
+    VALUES (COALESCE(NEW.client_phone, ''), '{CLIENT_UNREGISTERED}');
+'''
+
+
+def _unregistered_clients(table):
+    """То же для порции строк table при переносе существующих данных"""
+    return f'''
+        INSERT OR IGNORE INTO clients (phone, name)
+        SELECT DISTINCT COALESCE(client_phone, ''), '{CLIENT_UNREGISTERED}' FROM {table}
+        WHERE id >= :lo AND id < :hi
+    '''
+
+
+# Перенос одной строки старой client_animals (NEW.*) в новую таблицу
+_MIRROR_ANIMAL = _UNREGISTERED_CLIENT + '''
+    INSERT OR REPLACE INTO client_animals_new
+        (id, client_id, name, species, breed, age, weight, special_notes)
+    SELECT NEW.id, c.id, NEW.name, NEW.species, NEW.breed, NEW.age, NEW.weight, NEW.special_notes
+    FROM clients c WHERE c.phone = COALESCE(NEW.client_phone, '');
+'''
+
+# Перенос одной строки старой appointments (NEW.*) в новую таблицу
+_MIRROR_APPOINTMENT = _UNREGISTERED_CLIENT + '''
+    INSERT OR IGNORE INTO services (name) SELECT NEW.service_type WHERE NEW.service_type IS NOT NULL;
+    INSERT OR IGNORE INTO appointment_statuses (name) SELECT NEW.status WHERE NEW.status IS NOT NULL;
+    INSERT OR IGNORE INTO doctors (name) SELECT NEW.doctor WHERE NEW.doctor IS NOT NULL;
+    INSERT OR REPLACE INTO appointments_new
+        (id, client_id, animal_id, service_id, status_id, doctor_id,
+         appointment_date, appointment_time, notes)
+    SELECT NEW.id, c.id,
+           (SELECT MIN(a.id) FROM client_animals a
+            WHERE a.client_phone = NEW.client_phone AND a.name = NEW.animal_name),
+           (SELECT id FROM services WHERE name = NEW.service_type),
+           (SELECT id FROM appointment_statuses WHERE name = NEW.status),
+           (SELECT id FROM doctors WHERE name = NEW.doctor),
+           NEW.appointment_date, NEW.appointment_time, NEW.notes
+    FROM clients c WHERE c.phone = COALESCE(NEW.client_phone, '');
+'''
+
+NORMALIZE_STEPS = [
+    # Справочники
+    'CREATE TABLE IF NOT EXISTS services (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)',
+    'CREATE TABLE IF NOT EXISTS appointment_statuses (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)',
+    'CREATE TABLE IF NOT EXISTS doctors (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)',
+    _seed('services', SERVICES),
+    _seed('appointment_statuses', STATUSES),
+    _seed('doctors', DOCTORS),
+
+    # Новые таблицы с целочисленными внешними ключами
+    '''
+    CREATE TABLE IF NOT EXISTS client_animals_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_id INTEGER NOT NULL REFERENCES clients (id) ON DELETE CASCADE,
+        name TEXT,
+        species TEXT,
+        breed TEXT,
+        age INTEGER,
+        weight REAL,
+        special_notes TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS appointments_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_id INTEGER NOT NULL REFERENCES clients (id) ON DELETE CASCADE,
+        animal_id INTEGER REFERENCES client_animals (id) ON DELETE SET NULL,
+        service_id INTEGER REFERENCES services (id),
+        status_id INTEGER REFERENCES appointment_statuses (id),
+        doctor_id INTEGER REFERENCES doctors (id),
+        appointment_date TEXT,
+        appointment_time TEXT,
+        notes TEXT
+    )
+    ''',
+
+    # Дублирование изменений старых таблиц на время переноса
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_normalize_animals_insert AFTER INSERT ON client_animals
+    BEGIN {_MIRROR_ANIMAL} END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_normalize_animals_update AFTER UPDATE ON client_animals
+    BEGIN {_MIRROR_ANIMAL} END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_normalize_animals_delete AFTER DELETE ON client_animals
+    BEGIN DELETE FROM client_animals_new WHERE id = OLD.id; END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_normalize_appointments_insert AFTER INSERT ON appointments
+    BEGIN {_MIRROR_APPOINTMENT} END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_normalize_appointments_update AFTER UPDATE ON appointments
+    BEGIN {_MIRROR_APPOINTMENT} END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_normalize_appointments_delete AFTER DELETE ON appointments
+    BEGIN DELETE FROM appointments_new WHERE id = OLD.id; END
+    ''',
+
+    # Перенос существующих строк порциями
+    BatchedStep('client_animals', [
+        _unregistered_clients('client_animals'),
+        '''
+        INSERT OR IGNORE INTO client_animals_new
+            (id, client_id, name, species, breed, age, weight, special_notes)
+        SELECT a.id, c.id, a.name, a.species, a.breed, a.age, a.weight, a.special_notes
+        FROM client_animals a JOIN clients c ON c.phone = COALESCE(a.client_phone, '')
+        WHERE a.id >= :lo AND a.id < :hi
+        ''',
+    ]),
+    BatchedStep('appointments', [
+        _unregistered_clients('appointments'),
+        '''
+        INSERT OR IGNORE INTO services (name)
+        SELECT DISTINCT service_type FROM appointments
+        WHERE id >= :lo AND id < :hi AND service_type IS NOT NULL
+        ''',
+        '''
+        INSERT OR IGNORE INTO appointment_statuses (name)
+        SELECT DISTINCT status FROM appointments
+        WHERE id >= :lo AND id < :hi AND status IS NOT NULL
+        ''',
+        '''
+        INSERT OR IGNORE INTO doctors (name)
+        SELECT DISTINCT doctor FROM appointments
+        WHERE id >= :lo AND id < :hi AND doctor IS NOT NULL
+        ''',
+        '''
+        INSERT OR IGNORE INTO appointments_new
+            (id, client_id, animal_id, service_id, status_id, doctor_id,
+             appointment_date, appointment_time, notes)
+        SELECT ap.id, c.id,
+               (SELECT MIN(a.id) FROM client_animals a
+                WHERE a.client_phone = ap.client_phone AND a.name = ap.animal_name),
+               s.id, st.id, d.id,
+               ap.appointment_date, ap.appointment_time, ap.notes
+        FROM appointments ap
+        JOIN clients c ON c.phone = COALESCE(ap.client_phone, '')
+        LEFT JOIN services s ON s.name = ap.service_type
+        LEFT JOIN appointment_statuses st ON st.name = ap.status
+        LEFT JOIN doctors d ON d.name = ap.doctor
+        WHERE ap.id >= :lo AND ap.id < :hi
+        ''',
+    ]),
+
+    # Подмена таблиц
+    'DROP TRIGGER IF EXISTS trg_normalize_animals_insert',
+    'DROP TRIGGER IF EXISTS trg_normalize_animals_update',
+    'DROP TRIGGER IF EXISTS trg_normalize_animals_delete',
+    'DROP TRIGGER IF EXISTS trg_normalize_appointments_insert',
+    'DROP TRIGGER IF EXISTS trg_normalize_appointments_update',
+    'DROP TRIGGER IF EXISTS trg_normalize_appointments_delete',
+    'DROP TABLE client_animals',
+    'ALTER TABLE client_animals_new RENAME TO client_animals',
+    'DROP TABLE appointments',
+    'ALTER TABLE appointments_new RENAME TO appointments',
+    'CREATE INDEX IF NOT EXISTS idx_client_animals_client ON client_animals (client_id)',
+    'CREATE INDEX IF NOT EXISTS idx_appointments_client_date ON appointments (client_id, appointment_date)',
+    'CREATE INDEX IF NOT EXISTS idx_appointments_animal ON appointments (animal_id)',
+] + PETS_FTS_SCHEMA  # триггеры FTS удалены вместе со старой таблицей питомцев
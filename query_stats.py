@@ -0,0 +1,367 @@
+# query_stats.py
+"""Замеры SQL-запросов и журнал медленных запросов
+
+Соединения ConnectionManager создаются с InstrumentedConnection, поэтому
+через эти классы проходит любой запрос проекта: cursor.execute,
+connection.execute, executemany и commit. Запросы группируются по форме:
+текст без литералов и лишних пробелов, списки IN (?, ?, ...) свернуты.
+Для каждой формы считаются число выполнений, ошибки, гистограмма задержек,
+возвращенные (или измененные) строки и время ожидания блокировки.
+
+Время выборки включает и чтение строк (fetch*, итерация): запрос
+учитывается, когда курсор дочитан, выполняет следующий запрос или
+закрывается. Ожиданием блокировки считается время BEGIN IMMEDIATE и
+запросов, завершившихся ошибкой "database is locked"; ожидание внутри
+других запросов SQLite отдельно не сообщает.
+
+Запросы дольше SLOW_QUERY_MS пишутся с планом (EXPLAIN QUERY PLAN) в
+журнал <база>_slow_queries.log с ротацией по размеру.
+"""
+import os
+import re
+import sqlite3
+import threading
+from bisect import bisect_left
+from datetime import datetime
+from time import perf_counter
+
+# Порог медленного запроса, мс
+SLOW_QUERY_MS = 50
+# Ротация журнала медленных запросов: размер файла и число старых копий
+SLOW_LOG_BYTES = 1024 * 1024
+SLOW_LOG_BACKUPS = 3
+# Верхние границы корзин гистограммы, мс (последняя корзина - все, что дольше)
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+# Не больше стольких форм запросов (остальные попадают в общую строку)
+MAX_SHAPES = 1000
+OTHER_SHAPE = '(прочие запросы)'
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def query_shape(sql):
+    """Форма запроса: литералы заменены на ?, пробелы схлопнуты"""
+    shape = _NUMBER.sub('?', _STRING.sub('?', sql))
+    return _IN_LIST.sub('(?, ...)', _SPACES.sub(' ', shape).strip())
+
+
+def _is_lock_error(error):
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+class ShapeStats:
+    """Накопленные замеры одной формы запроса"""
+    __slots__ = ('count', 'errors', 'total_ms', 'max_ms', 'rows', 'lock_wait_ms', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.lock_wait_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def percentile(self, fraction):
+        """Оценка перцентиля по гистограмме (верхняя граница корзины), мс"""
+        if not self.count:
+            return 0.0
+        needed = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= needed:
+                return round(min(bound, self.max_ms), 3)
+        return round(self.max_ms, 3)
+
+    def as_dict(self, shape):
+        return {
+            'query': shape,
+            'count': self.count,
+            'errors': self.errors,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'max_ms': round(self.max_ms, 3),
+            'rows': self.rows,
+            'lock_wait_ms': round(self.lock_wait_ms, 3),
+            'histogram': {
+                (f'<={bound}' if i < len(BUCKETS_MS) else f'>{BUCKETS_MS[-1]}'): count
+                for i, (bound, count) in enumerate(zip(BUCKETS_MS + (None,), self.buckets))
+                if count
+            },
+        }
+
+
+class QueryStats:
+    """Замеры запросов одной базы (общие для всех ее соединений)"""
+
+    def __init__(self, slow_log=None, slow_ms=SLOW_QUERY_MS):
+        self.slow_log = slow_log
+        self.slow_ms = slow_ms
+        self.started = datetime.now()
+        self.slow_queries = 0
+        self._shapes = {}
+        # Текст запроса -> (ShapeStats, это BEGIN IMMEDIATE): форма вычисляется один раз
+        self._by_sql = {}
+        self._lock = threading.Lock()
+        self._logger = None
+
+    def _register(self, sql):
+        shape = query_shape(sql)
+        with self._lock:
+            if len(self._by_sql) >= MAX_SHAPES * 4:
+                self._by_sql.clear()
+            if shape not in self._shapes and len(self._shapes) >= MAX_SHAPES:
+                shape = OTHER_SHAPE
+            entry = (self._shapes.setdefault(shape, ShapeStats()), shape.startswith('BEGIN IMMEDIATE'))
+            self._by_sql[sql] = entry
+        return entry
+
+    def record(self, sql, seconds, rows=0, error=None, conn=None, parameters=()):
+        """Учет одного выполнения запроса"""
+        elapsed = seconds * 1000
+        entry = self._by_sql.get(sql) or self._register(sql)
+        stats, locking = entry
+        lock_wait = elapsed if locking or (error is not None and _is_lock_error(error)) else 0.0
+        bucket = bisect_left(BUCKETS_MS, elapsed)
+
+        with self._lock:
+            stats.count += 1
+            stats.total_ms += elapsed
+            stats.rows += rows
+            stats.buckets[bucket] += 1
+            if elapsed > stats.max_ms:
+                stats.max_ms = elapsed
+            if lock_wait:
+                stats.lock_wait_ms += lock_wait
+            if error is not None:
+                stats.errors += 1
+
+        if elapsed >= self.slow_ms and self.slow_log:
+            self._log_slow(sql, elapsed, rows, error, conn, parameters)
+
+    def _log_slow(self, sql, elapsed, rows, error, conn, parameters):
+        with self._lock:
+            self.slow_queries += 1
+            if self._logger is None:
+                # logging.handlers тянет socket: импорт только при первом медленном запросе
+                import logging
+                import logging.handlers
+                self._logger = logging.getLogger(f'vet_clinic.slow_queries.{self.slow_log}')
+                self._logger.propagate = False
+                handler = logging.handlers.RotatingFileHandler(
+                    self.slow_log, maxBytes=SLOW_LOG_BYTES, backupCount=SLOW_LOG_BACKUPS,
+                    encoding='utf-8', delay=True
+                )
+                handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+                self._logger.addHandler(handler)
+                self._logger.setLevel(logging.INFO)
+        lines = [f'{elapsed:.1f} мс, строк {rows}' + (f', ошибка: {error}' if error else ''),
+                 '    ' + _SPACES.sub(' ', sql).strip()]
+        lines.extend('    ' + line for line in explain(conn, sql, parameters))
+        self._logger.info('\n'.join(lines))
+
+    def snapshot(self, limit=None):
+        """Метрики по формам запросов, самые затратные первыми"""
+        with self._lock:
+            queries = [stats.as_dict(shape) for shape, stats in self._shapes.items()]
+            slow_queries = self.slow_queries
+        queries.sort(key=lambda query: query['total_ms'], reverse=True)
+        return {
+            'since': self.started.strftime("%Y-%m-%d %H:%M:%S"),
+            'slow_query_ms': self.slow_ms,
+            'slow_queries': slow_queries,
+            'slow_log': self.slow_log,
+            'statements': sum(query['count'] for query in queries),
+            'queries': queries[:limit] if limit else queries,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._shapes = {}
+            self._by_sql = {}
+            self.slow_queries = 0
+            self.started = datetime.now()
+
+
+def explain(conn, sql, parameters=()):
+    """Строки плана запроса; пусто, если план получить нельзя (BEGIN, PRAGMA и т.п.)"""
+    if conn is None or not isinstance(parameters, (tuple, list, dict)):
+        return []
+    try:
+        # Обычный курсор: сам план в статистику не попадает
+        cursor = sqlite3.Cursor(conn)
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, parameters)
+        rows = cursor.fetchall()
+        cursor.close()
+    except sqlite3.Error:
+        return []
+    depth = {0: 0}
+    plan = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, 0) + 1
+        plan.append('  ' * depth[node] + detail)
+    return plan
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Курсор, учитывающий время и строки своих запросов"""
+    _pending = None
+
+    def execute(self, sql, parameters=()):
+        if self._pending is not None:
+            self._finish()
+        started = perf_counter()
+        try:
+            super().execute(sql, parameters)
+        except sqlite3.Error as error:
+            self.connection.stats.record(sql, perf_counter() - started, error=error,
+                                         conn=self.connection, parameters=parameters)
+            raise
+        if self.description is None:
+            # Не выборка: строк для чтения не будет
+            self.connection.stats.record(sql, perf_counter() - started, max(self.rowcount, 0),
+                                         conn=self.connection, parameters=parameters)
+        else:
+            self._pending = [sql, parameters, perf_counter() - started, 0]
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        started = perf_counter()
+        error = None
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        except sqlite3.Error as e:
+            error = e
+            raise
+        finally:
+            self.connection.stats.record(sql, perf_counter() - started,
+                                         max(self.rowcount, 0), error, self.connection, None)
+
+    def executescript(self, sql_script):
+        self._finish()
+        started = perf_counter()
+        error = None
+        try:
+            return super().executescript(sql_script)
+        except sqlite3.Error as e:
+            error = e
+            raise
+        finally:
+            self.connection.stats.record(sql_script, perf_counter() - started, 0, error)
+
+    def _fetched(self, started, rows, done):
+        pending = self._pending
+        if pending is not None:
+            pending[2] += perf_counter() - started
+            pending[3] += rows
+            if done:
+                self._finish()
+
+    def _finish(self):
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            sql, parameters, seconds, rows = pending
+            self.connection.stats.record(sql, seconds, rows, conn=self.connection, parameters=parameters)
+
+    def fetchone(self):
+        started = perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        started = perf_counter()
+        rows = super().fetchmany(size)
+        self._fetched(started, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        started = perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows), True)
+        return rows
+
+    def __next__(self):
+        started = perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(started, 0, True)
+            raise
+        self._fetched(started, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Выборка, дочитанная не до конца (обычно fetchone), учитывается здесь
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Соединение, все курсоры которого учитываются в stats"""
+    stats = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # Сокращения sqlite3.Connection создают курсор в обход cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def commit(self):
+        started = perf_counter()
+        error = None
+        try:
+            super().commit()
+        except sqlite3.Error as e:
+            error = e
+            raise
+        finally:
+            self.stats.record('COMMIT', perf_counter() - started, error=error)
+
+
+def export_metrics(metrics, path):
+    """Запись снимка метрик в JSON-файл (через временный файл)"""
+    import json
+    temporary = path + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(metrics, f, ensure_ascii=False, indent=2)
+    os.replace(temporary, path)
+    return path
+
+
+def print_report(snapshot, limit=10):
+    """Сводка для консоли: самые затратные формы запросов"""
+    print(f"\nЗапросы с {snapshot['since']}: {snapshot['statements']} выполнений, "
+          f"медленных (>= {snapshot['slow_query_ms']} мс): {snapshot['slow_queries']}")
+    if snapshot['slow_log'] and snapshot['slow_queries']:
+        print(f"Журнал медленных запросов: {snapshot['slow_log']}")
+    for query in snapshot['queries'][:limit]:
+        text = query['query'] if len(query['query']) <= 100 else query['query'][:97] + '...'
+        print(f"  {query['total_ms']:9.1f} мс  x{query['count']:<6} p50 {query['p50_ms']:g} "
+              f"p95 {query['p95_ms']:g} max {query['max_ms']:g} мс, строк {query['rows']}"
+              + (f", ошибок {query['errors']}" if query['errors'] else '')
+              + (f", ожидание блокировки {query['lock_wait_ms']:.1f} мс" if query['lock_wait_ms'] else ''))
+        print(f"      {text}")
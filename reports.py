@@ -0,0 +1,171 @@
+# reports.py
+"""Отчеты по диапазонам дат: расписание на день, выручка и загрузка врачей
+
+Все запросы выбирают строки диапазоном по целочисленным visit_ts и start_ts
+(см. dates.py) и идут по индексам idx_visits_ts и idx_appointments_start,
+не разбирая строки дат. Границы периода: начало включительно, конец - нет.
+Отчеты читают основную базу; визиты, перенесенные в архив (archive.py),
+учитываются в сводной статистике (income_by_day, income_by_month).
+
+    python reports.py agenda --date 2024-12-16
+    python reports.py revenue --start 2024-12-01 --end 2025-01-01
+    python reports.py load --start 2024-12-16 --end 2024-12-23
+"""
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from dates import parse_date, to_epoch
+from scheduling import STATUS_CANCELLED, format_time
+
+DAY = 24 * 60 * 60
+
+
+@dataclass(frozen=True, slots=True)
+class AgendaItem:
+    """Запись в расписании дня"""
+    id: int
+    time: str
+    end: str
+    doctor: str
+    service: str
+    client: str
+    phone: str
+    pet: str
+    status: str
+
+
+def day_range(date):
+    """(начало, конец) суток в секундах"""
+    start = to_epoch(parse_date(date))
+    return start, start + DAY
+
+
+def month_range(date):
+    """Календарный месяц, в который попадает дата: ('YYYY-MM-01', первое число следующего)"""
+    first = datetime.strptime(parse_date(date), "%Y-%m-%d").replace(day=1)
+    following = (first + timedelta(days=32)).replace(day=1)
+    return first.strftime("%Y-%m-%d"), following.strftime("%Y-%m-%d")
+
+
+def week_range(date):
+    """Неделя с понедельника, в которую попадает дата"""
+    day = datetime.strptime(parse_date(date), "%Y-%m-%d")
+    monday = day - timedelta(days=day.weekday())
+    return monday.strftime("%Y-%m-%d"), (monday + timedelta(days=7)).strftime("%Y-%m-%d")
+
+
+def daily_agenda(db, date, doctor=None):
+    """Записи на день по времени начала, без отмененных: [AgendaItem]"""
+    start, end = day_range(date)
+    params = [start, end, STATUS_CANCELLED]
+    doctor_filter = ''
+    if doctor:
+        doctor_filter = 'AND d.name = ?'
+        params.append(doctor)
+
+    cursor = db.cursor()
+    cursor.execute(f'''
+        SELECT ap.id, ap.appointment_time, ap.end_minute, d.name, s.name,
+               c.name, c.phone, COALESCE(p.name, '—'), st.name
+        FROM appointments ap
+        JOIN clients c ON c.id = ap.client_id
+        LEFT JOIN client_animals p ON p.id = ap.animal_id
+        LEFT JOIN services s ON s.id = ap.service_id
+        LEFT JOIN appointment_statuses st ON st.id = ap.status_id
+        LEFT JOIN doctors d ON d.id = ap.doctor_id
+        WHERE ap.start_ts >= ? AND ap.start_ts < ?
+          AND ap.status_id IS NOT (SELECT id FROM appointment_statuses WHERE name = ?)
+          {doctor_filter}
+        ORDER BY ap.start_ts, d.name
+    ''', params)
+    return [
+        AgendaItem(appointment_id, time, format_time(end_minute) if end_minute is not None else '',
+                   doctor_name, service, client, phone, pet, status)
+        for appointment_id, time, end_minute, doctor_name, service, client, phone, pet, status
+        in cursor.fetchall()
+    ]
+
+
+def period_revenue(db, start, end):
+    """(визитов, выручка) за период; границы - даты или даты со временем"""
+    cursor = db.cursor()
+    cursor.execute(
+        'SELECT COUNT(*), COALESCE(SUM(cost), 0) FROM visits WHERE visit_ts >= ? AND visit_ts < ?',
+        (to_epoch(start), to_epoch(end))
+    )
+    return cursor.fetchone()
+
+
+def doctor_load(db, start, end):
+    """Загрузка врачей за период: [(врач, записей, занято минут)], самые загруженные первыми"""
+    cursor = db.cursor()
+    cursor.execute('''
+        SELECT d.name, COUNT(*), COALESCE(SUM(ap.end_minute - ap.start_minute), 0)
+        FROM appointments ap
+        JOIN doctors d ON d.id = ap.doctor_id
+        WHERE ap.start_ts >= ? AND ap.start_ts < ?
+          AND ap.status_id IS NOT (SELECT id FROM appointment_statuses WHERE name = ?)
+        GROUP BY ap.doctor_id
+        ORDER BY 3 DESC, d.name
+    ''', (to_epoch(start), to_epoch(end), STATUS_CANCELLED))
+    return cursor.fetchall()
+
+
+def print_agenda(items, date):
+    print(f"\nРасписание на {parse_date(date)}:")
+    if not items:
+        print("  Записей нет")
+    for item in items:
+        print(f"  {item.time}-{item.end} {item.doctor}: {item.service}, {item.pet} "
+              f"({item.client}, {item.phone}) - {item.status}")
+
+
+def print_revenue(visits, income, start, end):
+    print(f"\nВыручка с {start} по {end} (не включая): {visits} визитов, {income:.2f} руб.")
+
+
+def print_load(rows, start, end):
+    print(f"\nЗагрузка врачей с {start} по {end} (не включая):")
+    if not rows:
+        print("  Записей нет")
+    for doctor, appointments, minutes in rows:
+        print(f"  {doctor}: {appointments} записей, {minutes / 60:.1f} ч")
+
+
+def main(argv=None):
+    import argparse
+    from repository import open_repository, DB_NAME
+
+    today = datetime.now().strftime("%Y-%m-%d")
+    parser = argparse.ArgumentParser(description="Отчеты клиники по периодам")
+    parser.add_argument('report', choices=['agenda', 'revenue', 'load'])
+    parser.add_argument('--db', default=DB_NAME, help="Файл базы данных")
+    parser.add_argument('--date', default=today, help="День расписания")
+    parser.add_argument('--doctor', help="Только один врач (для agenda)")
+    parser.add_argument('--start', help="Начало периода (по умолчанию - текущий месяц или неделя)")
+    parser.add_argument('--end', help="Конец периода, не включая")
+    args = parser.parse_args(argv)
+
+    repo = open_repository(args.db)
+    try:
+        if args.report == 'agenda':
+            print_agenda(repo.agenda(args.date, args.doctor), args.date)
+            return 0
+        default_range = month_range if args.report == 'revenue' else week_range
+        start, end = default_range(args.date)
+        start, end = args.start or start, args.end or end
+        if args.report == 'revenue':
+            print_revenue(*repo.revenue(start, end), start, end)
+        else:
+            print_load(repo.doctor_load(start, end), start, end)
+    except ValueError as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 2
+    finally:
+        repo.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1033 @@
+# repository.py
+"""Единый слой доступа к данным консоли администратора и клиентского портала
+
+Обе программы работают с одной базой vet_clinic.db: животные и визиты
+клиники, клиенты портала, их питомцы и записи на прием. Питомец портала
+связан с карточкой животного клиники (client_animals.animal_id), поэтому
+история визитов питомца - это обычные визиты клиники.
+
+Методы возвращают записи-классы (Animal, Visit, Client, Pet, Appointment)
+вместо кортежей; SQL собран здесь, а не в main.py и app.py. Питомцы, записи
+и визиты клиента читаются через кэш (cache.py); методы записи сбрасывают
+затронутые ключи после фиксации транзакции. Конкурентные записи из
+нескольких потоков можно объединять в общие транзакции через очередь
+self.writes (write_queue.py).
+"""
+import os
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+
+from defaults import DB_NAME, DEFAULT_BATCH_SIZE, PAGE_SIZE
+from cache import ReadThroughCache
+from db_connection import get_manager
+from migrations import check_versions, run_migrations
+from clinic_stats import STATS_SCHEMA, income_by_month, read_statistics, rebuild_statistics, verify_statistics
+from search import VISITS_FTS_SCHEMA, PETS_FTS_SCHEMA, build_match_query, search_visit_rows
+from portal_schema import NORMALIZE_STEPS, lookup_id
+from scheduling import SCHEDULE_SCHEMA, Scheduler, fill_appointment_minutes
+from dates import DATES_SCHEMA, APPOINTMENT_VALID, canonical_appointment_dates, parse_datetime
+from reports import daily_agenda, period_revenue, doctor_load
+from archive import ARCHIVE_SCHEMA, ARCHIVE_HORIZON_DAYS, VisitArchive, horizon_date, merge_history
+from query_stats import export_metrics
+from owners import OWNERS_SCHEMA, OwnerLookup, e164_sql, name_key, normalize_phone
+from changelog import CHANGELOG_SCHEMA, ChangeFeed
+
+# Поля строк для пакетного импорта
+ANIMAL_FIELDS = ('name', 'species', 'breed', 'age', 'owner_name', 'phone')
+VISIT_FIELDS = ('animal_id', 'diagnosis', 'treatment', 'cost')
+
+
+# --- Записи ---
+
+@dataclass(frozen=True, slots=True)
+class Animal:
+    id: int
+    name: str
+    species: str
+    breed: str = None
+    age: int = None
+    owner_name: str = None
+    phone: str = None
+    registration_date: str = None
+
+
+@dataclass(frozen=True, slots=True)
+class Visit:
+    id: int
+    animal_id: int
+    visit_date: str
+    diagnosis: str = None
+    treatment: str = None
+    cost: float = 0.0
+    animal_name: str = None
+
+
+@dataclass(frozen=True, slots=True)
+class Client:
+    id: int
+    phone: str
+    name: str
+    email: str = None
+
+
+@dataclass(frozen=True, slots=True)
+class Pet:
+    id: int
+    client_id: int
+    name: str
+    species: str = None
+    breed: str = None
+    age: int = None
+    weight: float = None
+    notes: str = None
+    animal_id: int = None
+
+
+@dataclass(frozen=True, slots=True)
+class Appointment:
+    id: int
+    client_id: int
+    animal_name: str
+    service: str
+    date: str
+    time: str
+    status: str
+    doctor: str
+    notes: str = None
+
+
+# --- Схема ---
+
+# Старая отдельная база консоли администратора (vet_clinic.db)
+STAFF_MIGRATIONS = [
+    (1, [
+        # Таблица животных
+        '''
+        CREATE TABLE IF NOT EXISTS animals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            species TEXT NOT NULL,
+            breed TEXT,
+            age INTEGER,
+            owner_name TEXT,
+            phone TEXT,
+            registration_date TEXT
+        )
+        ''',
+        # Таблица визитов
+        '''
+        CREATE TABLE IF NOT EXISTS visits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            animal_id INTEGER,
+            visit_date TEXT,
+            diagnosis TEXT,
+            treatment TEXT,
+            cost REAL,
+            FOREIGN KEY (animal_id) REFERENCES animals (id)
+        )
+        ''',
+    ]),
+    (2, [
+        # Покрывающий индекс для истории визитов животного
+        '''
+        CREATE INDEX IF NOT EXISTS idx_visits_animal_date
+        ON visits (animal_id, visit_date, diagnosis, treatment, cost)
+        ''',
+    ]),
+    # Сводные таблицы статистики с триггерами и первичным заполнением
+    (3, STATS_SCHEMA + [rebuild_statistics]),
+    # Полнотекстовый индекс диагнозов и лечения
+    (4, VISITS_FTS_SCHEMA),
+]
+
+# Старая отдельная база портала (vet_clinic_client.db)
+PORTAL_MIGRATIONS = [
+    (1, [
+        # Таблица пользователей
+        '''
+        CREATE TABLE IF NOT EXISTS clients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            phone TEXT UNIQUE,
+            name TEXT,
+            email TEXT,
+            registration_date TEXT
+        )
+        ''',
+        # Таблица животных клиентов
+        '''
+        CREATE TABLE IF NOT EXISTS client_animals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_phone TEXT,
+            name TEXT,
+            species TEXT,
+            breed TEXT,
+            age INTEGER,
+            weight REAL,
+            special_notes TEXT,
+            FOREIGN KEY (client_phone) REFERENCES clients (phone)
+        )
+        ''',
+        # Таблица записей на прием
+        '''
+        CREATE TABLE IF NOT EXISTS appointments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_phone TEXT,
+            animal_name TEXT,
+            service_type TEXT,
+            appointment_date TEXT,
+            appointment_time TEXT,
+            status TEXT,
+            doctor TEXT,
+            notes TEXT
+        )
+        ''',
+    ]),
+    (2, [
+        # Вход по телефону и имени без обращения к таблице
+        'CREATE INDEX IF NOT EXISTS idx_clients_phone_name ON clients (phone, name)',
+        # Питомцы клиента
+        'CREATE INDEX IF NOT EXISTS idx_client_animals_phone ON client_animals (client_phone)',
+        # Записи клиента, отсортированные по дате
+        '''
+        CREATE INDEX IF NOT EXISTS idx_appointments_phone_date
+        ON appointments (client_phone, appointment_date)
+        ''',
+    ]),
+    # Полнотекстовый индекс кличек и особенностей питомцев
+    (3, PETS_FTS_SCHEMA),
+    # Целочисленные ключи вместо телефона и клички, справочники статусов, врачей и услуг
+    (4, NORMALIZE_STEPS),
+    # Часы работы врачей, длительность услуг и интервалы записей
+    (5, SCHEDULE_SCHEMA),
+]
+
+# Шаги миграций портала по его версиям (для общей базы)
+PORTAL_STEPS = dict(PORTAL_MIGRATIONS)
+
+
+def link_pets(cursor):
+    """Карточка клиники для каждого питомца портала, у которого ее нет
+
+    Питомец связывается с животным того же владельца (по телефону в формате
+    E.164) и с той же кличкой, а при отсутствии такого животного оно создается.
+    """
+    cursor.execute('SELECT id, phone, name FROM animals ORDER BY id DESC')
+    animals = {(normalize_phone(phone), name): animal_id for animal_id, phone, name in cursor.fetchall()}
+
+    cursor.execute('''
+        SELECT p.id, p.name, p.species, p.breed, p.age, c.name, c.phone
+        FROM client_animals p JOIN clients c ON c.id = p.client_id
+        WHERE p.animal_id IS NULL
+        ORDER BY p.id
+    ''')
+    registered = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for pet_id, name, species, breed, age, owner_name, phone in cursor.fetchall():
+        key = (normalize_phone(phone), name)
+        animal_id = animals.get(key)
+        if animal_id is None:
+            cursor.execute(
+                '''INSERT INTO animals (name, species, breed, age, owner_name, phone, registration_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                (name or '', species or '', breed, age, owner_name, key[0] or phone, registered)
+            )
+            animal_id = animals[key] = cursor.lastrowid
+        cursor.execute('UPDATE client_animals SET animal_id = ? WHERE id = ?', (animal_id, pet_id))
+
+
+# Миграции общей базы: база консоли (1-4), схема портала (5-9 - версии 1-5
+# его отдельной базы), затем общие. Номер хранится в PRAGMA user_version,
+# поэтому задан явно: новая миграция получает следующий номер в конце списка
+MIGRATIONS = STAFF_MIGRATIONS + [
+    (5, PORTAL_STEPS[1]),
+    (6, PORTAL_STEPS[2]),
+    (7, PORTAL_STEPS[3]),
+    (8, PORTAL_STEPS[4]),
+    (9, PORTAL_STEPS[5]),
+    # Карточки клиники для питомцев портала
+    (10, [
+        'ALTER TABLE client_animals ADD COLUMN animal_id INTEGER REFERENCES animals (id)',
+        link_pets,
+        'CREATE INDEX IF NOT EXISTS idx_client_animals_animal ON client_animals (animal_id)',
+    ]),
+    # Перенос старой истории в архивы по годам без потери статистики
+    (11, ARCHIVE_SCHEMA),
+    # Канонические даты, столбцы visit_ts/start_ts и индексы по ним
+    (12, DATES_SCHEMA),
+    # Владельцы с телефонами E.164 и триграммный индекс имен
+    (13, OWNERS_SCHEMA),
+    # Журнал изменений для синхронизации и сброса кэша
+    (14, CHANGELOG_SCHEMA),
+]
+check_versions(STAFF_MIGRATIONS)
+check_versions(PORTAL_MIGRATIONS)
+check_versions(MIGRATIONS)
+
+
+def open_repository(db_name=DB_NAME):
+    """Репозиторий с приведенной к актуальной версии схемой"""
+    db = get_manager(db_name)
+    run_migrations(db, MIGRATIONS)
+    return ClinicRepository(db)
+
+
+class ClinicRepository:
+    def __init__(self, db):
+        self.db = db
+        self.scheduler = Scheduler(db)
+        self.changes = ChangeFeed(db)
+        self.cache = ReadThroughCache(db, changes=self.changes)
+        self.archive = VisitArchive(db)
+        self.owners = OwnerLookup(db)
+        self._writes = None
+
+    @property
+    def writes(self):
+        """Очередь групповой фиксации (создается при первом обращении)"""
+        if self._writes is None:
+            # Импорт здесь: concurrent.futures заметно замедляет запуск консоли
+            from write_queue import WriteQueue
+            self._writes = WriteQueue(self.db, on_rollback=self._forget_uncommitted)
+        return self._writes
+
+    def _forget_uncommitted(self):
+        # Пакет очереди записи откатился целиком: индекс занятости и кэш
+        # могли успеть учесть его изменения
+        self.scheduler.invalidate()
+        self.cache.clear()
+
+    # --- Животные и визиты ---
+
+    def add_animal(self, name, species, breed, age, owner_name, phone):
+        """Добавление животного; возвращает его ID (телефон сохраняется в формате E.164)"""
+        phone = normalize_phone(phone) or phone
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                INSERT INTO animals (name, species, breed, age, owner_name, phone, registration_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (name, species, breed, age, owner_name, phone, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            return cursor.lastrowid
+
+    def add_visit(self, animal_id, diagnosis, treatment, cost):
+        """Добавление визита; возвращает его ID"""
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                INSERT INTO visits (animal_id, visit_date, diagnosis, treatment, cost)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (animal_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), diagnosis, treatment, cost))
+            visit_id = cursor.lastrowid
+            cursor.execute('SELECT client_id FROM client_animals WHERE animal_id = ?', (animal_id,))
+            owners = [row[0] for row in cursor.fetchall()]
+        for client_id in owners:
+            self.cache.invalidate(client_id, 'visits')
+        return visit_id
+
+    def add_animals_bulk(self, rows, batch_size=DEFAULT_BATCH_SIZE):
+        """Пакетное добавление животных
+
+        rows - итерируемый источник словарей (или последовательностей в порядке
+        ANIMAL_FIELDS, необязательный седьмой элемент - дата регистрации).
+        Строки с ошибками пропускаются и попадают в отчет, остальные
+        вставляются через executemany транзакциями по batch_size строк.
+        """
+        return self._insert_bulk('''
+            INSERT INTO animals (name, species, breed, age, owner_name, phone, registration_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows, self._validate_animal, batch_size)
+
+    def add_visits_bulk(self, rows, batch_size=DEFAULT_BATCH_SIZE):
+        """Пакетное добавление визитов (поля VISIT_FIELDS и необязательная visit_date)"""
+        try:
+            return self._insert_bulk('''
+                INSERT INTO visits (animal_id, visit_date, diagnosis, treatment, cost)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows, self._visit_validator(), batch_size)
+        finally:
+            self.cache.invalidate_kind('visits')
+
+    def _insert_bulk(self, sql, rows, validate, batch_size):
+        """Общий цикл пакетной вставки с построчной проверкой"""
+        if batch_size < 1:
+            raise ValueError("Размер пакета должен быть положительным")
+
+        inserted = 0
+        errors = []
+        batch = []
+
+        for line_no, row in enumerate(rows, start=1):
+            if row is None:
+                errors.append((line_no, "некорректная строка"))
+                continue
+            try:
+                batch.append((line_no, validate(row)))
+            except (ValueError, TypeError, KeyError) as e:
+                errors.append((line_no, str(e)))
+                continue
+
+            if len(batch) >= batch_size:
+                inserted += self._flush_batch(sql, batch, errors)
+                batch = []
+
+        if batch:
+            inserted += self._flush_batch(sql, batch, errors)
+
+        # Ошибки базы добавляются при записи пакета, позже ошибок проверки
+        errors.sort(key=lambda error: error[0])
+        return {'inserted': inserted, 'errors': errors}
+
+    def _flush_batch(self, sql, batch, errors):
+        """Запись одного пакета [(номер строки, параметры)] в одной транзакции
+
+        Если база отвергла строку (ограничение, проверка даты в триггере),
+        пакет повторяется построчно: такие строки попадают в errors, остальные
+        вставляются. Ошибки работы с базой (блокировка, диск) не перехватываются.
+        """
+        try:
+            with self.db.transaction() as cursor:
+                cursor.executemany(sql, [params for _, params in batch])
+            return len(batch)
+        except sqlite3.OperationalError:
+            raise
+        except sqlite3.DatabaseError:
+            pass
+
+        inserted = 0
+        with self.db.transaction():
+            for line_no, params in batch:
+                try:
+                    with self.db.transaction() as cursor:
+                        cursor.execute(sql, params)
+                except sqlite3.OperationalError:
+                    raise
+                except sqlite3.DatabaseError as e:
+                    errors.append((line_no, str(e)))
+                else:
+                    inserted += 1
+        return inserted
+
+    @staticmethod
+    def _validate_animal(row):
+        """Проверка и приведение строки животного к параметрам INSERT"""
+        if not isinstance(row, dict):
+            row = dict(zip(ANIMAL_FIELDS + ('registration_date',), row))
+
+        name = str(row.get('name') or '').strip()
+        species = str(row.get('species') or '').strip()
+        if not name:
+            raise ValueError("не указано имя животного")
+        if not species:
+            raise ValueError("не указан вид животного")
+
+        age = row.get('age')
+        if age in (None, ''):
+            age = None
+        else:
+            age = int(age)
+            if age < 0:
+                raise ValueError(f"некорректный возраст: {age}")
+
+        registration_date = row.get('registration_date') or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        phone = row.get('phone')
+        return (name, species, row.get('breed'), age, row.get('owner_name'), normalize_phone(phone) or phone,
+                registration_date)
+
+    @staticmethod
+    def _validate_visit(row):
+        """Проверка и приведение строки визита к параметрам INSERT"""
+        if not isinstance(row, dict):
+            row = dict(zip(VISIT_FIELDS + ('visit_date',), row))
+
+        animal_id = row.get('animal_id')
+        if animal_id in (None, ''):
+            raise ValueError("не указан ID животного")
+        animal_id = int(animal_id)
+
+        cost = row.get('cost')
+        cost = float(cost) if cost not in (None, '') else 0.0
+        if cost < 0:
+            raise ValueError(f"отрицательная стоимость: {cost}")
+
+        visit_date = row.get('visit_date')
+        visit_date = parse_datetime(visit_date) if visit_date else datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        return (animal_id, visit_date, row.get('diagnosis'), row.get('treatment'), cost)
+
+    def _visit_validator(self):
+        """Проверка строк визита вместе с существованием животного
+
+        Внешние ключи не включены, поэтому без проверки визит несуществующего
+        животного попал бы в статистику и поиск. Найденные ID запоминаются на
+        время импорта.
+        """
+        known = set()
+        cursor = self.db.cursor()
+
+        def validate(row):
+            params = self._validate_visit(row)
+            animal_id = params[0]
+            if animal_id not in known:
+                cursor.execute('SELECT 1 FROM animals WHERE id = ?', (animal_id,))
+                if cursor.fetchone() is None:
+                    raise ValueError(f"животное с ID {animal_id} не найдено")
+                known.add(animal_id)
+            return params
+        return validate
+
+    def iter_animals(self, batch_size=500):
+        """Потоковый обход всех животных без загрузки таблицы в память"""
+        cursor = self.db.cursor()
+        try:
+            cursor.execute('''
+                SELECT id, name, species, breed, age, owner_name, phone, registration_date
+                FROM animals ORDER BY id
+            ''')
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield Animal(*row)
+        finally:
+            cursor.close()
+
+    def animals_page(self, after_id=0, limit=PAGE_SIZE):
+        """Страница животных с ID больше after_id (постраничный вывод по ключу)"""
+        cursor = self.db.cursor()
+        cursor.execute('''
+            SELECT id, name, species, breed, age, owner_name, phone, registration_date
+            FROM animals WHERE id > ? ORDER BY id LIMIT ?
+        ''', (after_id, limit))
+        return [Animal(*row) for row in cursor.fetchall()]
+
+    def get_animal(self, animal_id):
+        """Животное по ID или None"""
+        cursor = self.db.cursor()
+        cursor.execute('''
+            SELECT id, name, species, breed, age, owner_name, phone, registration_date
+            FROM animals WHERE id = ?
+        ''', (animal_id,))
+        row = cursor.fetchone()
+        return Animal(*row) if row else None
+
+    def animal_visits(self, animal_id, full_history=False):
+        """История визитов животного, новые первыми
+
+        full_history=True добавляет визиты, перенесенные в архив.
+        """
+        cursor = self.db.cursor()
+        cursor.execute('''
+            SELECT id, animal_id, visit_date, diagnosis, treatment, cost
+            FROM visits
+            WHERE animal_id = ?
+            ORDER BY visit_date DESC
+        ''', (animal_id,))
+        visits = [Visit(*row) for row in cursor.fetchall()]
+        if not full_history:
+            return visits
+        archived = [Visit(*row) for row in self.archive.animal_visits(animal_id)]
+        return merge_history(visits, archived, key=lambda visit: visit.visit_date or '')
+
+    def search_visits(self, query, limit=20):
+        """Полнотекстовый поиск визитов по диагнозу и лечению, релевантные первыми"""
+        return [Visit(*row[:-1]) for row in search_visit_rows(self.db.cursor(), query, limit)]
+
+    # --- Статистика ---
+
+    def statistics(self):
+        """Статистика клиники (из сводных таблиц)"""
+        return read_statistics(self.db.cursor())
+
+    def income_by_day(self, start=None, end=None):
+        """Визиты и доход по дням: [(день, визиты, доход)], границы включительно"""
+        cursor = self.db.cursor()
+        cursor.execute('''
+            SELECT day, visits, income FROM stats_daily
+            WHERE day >= COALESCE(?, '') AND day <= COALESCE(?, '9999-12-31')
+            ORDER BY day
+        ''', (start, end))
+        return cursor.fetchall()
+
+    def income_by_month(self, start=None, end=None):
+        """Визиты и доход по месяцам (YYYY-MM): [(месяц, визиты, доход)]"""
+        return income_by_month(self.db.cursor(), start, end)
+
+    def rebuild_statistics(self):
+        """Полный пересчет сводной статистики"""
+        with self.db.transaction(immediate=True) as cursor:
+            rebuild_statistics(cursor)
+
+    def verify_statistics(self):
+        """Сверка сводной статистики с данными; пустой список - расхождений нет"""
+        cursor = self.db.cursor()
+        try:
+            return verify_statistics(cursor)
+        finally:
+            cursor.close()
+
+    # --- Клиенты и питомцы портала ---
+
+    def find_client(self, phone, name):
+        """Клиент по телефону и имени или None
+
+        Телефон сравнивается в формате E.164 ('8 916 123-45-67' и
+        '+79161234567' - один номер), имя - без учета регистра и «ё».
+        """
+        cursor = self.db.cursor()
+        cursor.execute('SELECT id, phone, name, email FROM clients WHERE phone = ? AND name = ?', (phone, name))
+        row = cursor.fetchone()
+        if row:
+            return Client(*row)
+        for owner in self.owners.by_phone_exact(phone):
+            if owner.client_id is not None and name_key(owner.name) == name_key(name):
+                return self.get_client(owner.client_id)
+        return None
+
+    def get_client(self, client_id):
+        """Клиент по ID или None"""
+        cursor = self.db.cursor()
+        cursor.execute('SELECT id, phone, name, email FROM clients WHERE id = ?', (client_id,))
+        row = cursor.fetchone()
+        return Client(*row) if row else None
+
+    def register_client(self, phone, name, email):
+        """Регистрация клиента (IntegrityError, если телефон занят)
+
+        Телефон сохраняется в формате E.164; занятым считается и тот же
+        номер, записанный у другого клиента иначе.
+        """
+        phone = normalize_phone(phone) or phone
+        if any(owner.client_id is not None for owner in self.owners.by_phone_exact(phone)):
+            raise sqlite3.IntegrityError(f"Клиент с телефоном {phone} уже зарегистрирован")
+        with self.db.transaction() as cursor:
+            cursor.execute(
+                'INSERT INTO clients (phone, name, email, registration_date) VALUES (?, ?, ?, ?)',
+                (phone, name, email, datetime.now().strftime("%Y-%m-%d"))
+            )
+            return Client(cursor.lastrowid, phone, name, email)
+
+    def find_owners(self, query, limit=20):
+        """Владельцы по части номера, последним цифрам ('*4567') или имени с опечатками"""
+        return self.owners.find(query, limit)
+
+    def owner_animals(self, owner):
+        """Карточки животных владельца: [(id, кличка, вид, порода)]"""
+        return self.owners.animals(owner)
+
+    def client_pets(self, client_id):
+        """Питомцы клиента"""
+        return self.cache.get('pets', client_id, lambda: self._load_pets(client_id))
+
+    def _load_pets(self, client_id):
+        cursor = self.db.cursor()
+        cursor.execute('''
+            SELECT id, client_id, name, species, breed, age, weight, special_notes, animal_id
+            FROM client_animals WHERE client_id = ? ORDER BY id
+        ''', (client_id,))
+        return [Pet(*row) for row in cursor.fetchall()]
+
+    def search_pet_ids(self, client_id, query):
+        """ID питомцев клиента, найденных по кличке и особенностям, по релевантности
+
+        None - запрос пуст и фильтровать не нужно.
+        """
+        match = build_match_query(query)
+        if match is None:
+            return None
+
+        cursor = self.db.cursor()
+        cursor.execute(
+            '''SELECT f.rowid FROM client_animals_fts f
+            JOIN client_animals a ON a.id = f.rowid
+            WHERE client_animals_fts MATCH ? AND a.client_id = ?
+            ORDER BY f.rank''',
+            (match, client_id)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def add_pet(self, client, name, species, breed, age, weight, notes):
+        """Питомец клиента вместе с карточкой животного в клинике"""
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                INSERT INTO animals (name, species, breed, age, owner_name, phone, registration_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (name, species, breed, age, client.name, client.phone,
+                  datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            animal_id = cursor.lastrowid
+            cursor.execute(
+                '''INSERT INTO client_animals
+                (client_id, name, species, breed, age, weight, special_notes, animal_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                (client.id, name, species, breed, age, weight, notes, animal_id)
+            )
+            pet = Pet(cursor.lastrowid, client.id, name, species, breed, age, weight, notes, animal_id)
+        self.cache.invalidate(client.id, 'pets')
+        return pet
+
+    def remove_pet(self, pet_id):
+        """Удаление питомца из портала
+
+        Записи на прием остаются без ссылки на него, карточка и визиты в
+        клинике сохраняются. Возвращает False, если такого питомца нет.
+        """
+        with self.db.transaction() as cursor:
+            cursor.execute('SELECT client_id FROM client_animals WHERE id = ?', (pet_id,))
+            row = cursor.fetchone()
+            cursor.execute('UPDATE appointments SET animal_id = NULL WHERE animal_id = ?', (pet_id,))
+            cursor.execute('DELETE FROM client_animals WHERE id = ?', (pet_id,))
+        if row:
+            self.cache.invalidate(row[0], 'pets', 'appointments', 'visits')
+        return row is not None
+
+    def client_visits(self, client_id, full_history=False):
+        """Визиты всех питомцев клиента одним запросом, новые первыми"""
+        visits = self.cache.get('visits', client_id, lambda: self._load_visits(client_id))
+        if not full_history:
+            return visits
+        archived = [Visit(*row) for row in self.archive.client_visits(client_id)]
+        return merge_history(visits, archived, key=lambda visit: visit.visit_date or '')
+
+    def _load_visits(self, client_id):
+        cursor = self.db.cursor()
+        cursor.execute('''
+            SELECT v.id, v.animal_id, v.visit_date, v.diagnosis, v.treatment, v.cost, p.name
+            FROM client_animals p
+            JOIN visits v ON v.animal_id = p.animal_id
+            WHERE p.client_id = ?
+            ORDER BY v.visit_date DESC
+        ''', (client_id,))
+        return [Visit(*row) for row in cursor.fetchall()]
+
+    # --- Записи на прием ---
+
+    def free_slots(self, service, date, count=10):
+        """Ближайшие свободные окна для услуги начиная с даты: [Slot]"""
+        return self.scheduler.free_slots(service, date, count=count)
+
+    def book_appointment(self, client_id, pet, service, date, time, notes, status):
+        """Запись на прием к свободному врачу (SlotUnavailable, если время занято)"""
+        appointment_id, doctor = self.scheduler.book(client_id, pet.id, service,
+                                                     date, time, notes, status)
+        self.cache.invalidate(client_id, 'appointments')
+        return Appointment(appointment_id, client_id, pet.name, service, date, time,
+                           status, doctor, notes)
+
+    def client_appointments(self, client_id, full_history=False):
+        """Записи клиента, новые первыми"""
+        appointments = self.cache.get('appointments', client_id,
+                                      lambda: self._load_appointments(client_id))
+        if not full_history:
+            return appointments
+        archived = [Appointment(*row) for row in self.archive.client_appointments(client_id)]
+        return merge_history(appointments, archived, key=lambda appointment: appointment.date or '')
+
+    def _load_appointments(self, client_id):
+        cursor = self.db.cursor()
+        cursor.execute(
+            '''SELECT ap.id, ap.client_id, COALESCE(a.name, '—'), s.name,
+                      ap.appointment_date, ap.appointment_time, st.name, d.name, ap.notes
+            FROM appointments ap
+            LEFT JOIN client_animals a ON a.id = ap.animal_id
+            LEFT JOIN services s ON s.id = ap.service_id
+            LEFT JOIN appointment_statuses st ON st.id = ap.status_id
+            LEFT JOIN doctors d ON d.id = ap.doctor_id
+            WHERE ap.client_id = ?
+            ORDER BY ap.appointment_date DESC''',
+            (client_id,)
+        )
+        return [Appointment(*row) for row in cursor.fetchall()]
+
+    def remove_appointment(self, appointment_id):
+        """Удаление записи на прием; False, если такой записи нет"""
+        with self.db.transaction() as cursor:
+            cursor.execute('SELECT client_id, appointment_date FROM appointments WHERE id = ?',
+                           (appointment_id,))
+            row = cursor.fetchone()
+            cursor.execute('DELETE FROM appointments WHERE id = ?', (appointment_id,))
+        if row:
+            self.cache.invalidate(row[0], 'appointments')
+            self.scheduler.invalidate(row[1])
+        return row is not None
+
+    # --- Отчеты ---
+
+    def agenda(self, date, doctor=None):
+        """Расписание на день: [AgendaItem]"""
+        return daily_agenda(self.db, date, doctor)
+
+    def revenue(self, start, end):
+        """(визитов, выручка) за период [start, end)"""
+        return period_revenue(self.db, start, end)
+
+    def doctor_load(self, start, end):
+        """[(врач, записей, занято минут)] за период [start, end)"""
+        return doctor_load(self.db, start, end)
+
+    # --- Обслуживание ---
+
+    def add_demo_data(self):
+        """Добавление демо-данных портала (повторный запуск ничего не дублирует)"""
+        with self.db.transaction() as cursor:
+            _add_demo_data(cursor)
+        self.cache.clear()
+
+    def deduplicate(self):
+        """Разовое удаление полностью совпадающих дублей питомцев и записей"""
+        removed = deduplicate_database(self.db)
+        self.cache.clear()
+        return removed
+
+    def import_portal_database(self, path):
+        """Перенос клиентов, питомцев и записей из отдельной базы портала"""
+        moved = import_portal_database(self.db, path)
+        self.cache.clear()
+        self.scheduler.invalidate()
+        return moved
+
+    def archive_history(self, horizon_days=ARCHIVE_HORIZON_DAYS):
+        """Перенос визитов и записей старше горизонта в архивы по годам"""
+        moved = self.archive.move(horizon_date(horizon_days))
+        self.cache.clear()
+        self.scheduler.invalidate()
+        return moved
+
+    # --- Метрики ---
+
+    def metrics(self, limit=None):
+        """Снимок метрик: запросы по формам, кэш портала и очередь записи (если создана)"""
+        return {
+            'queries': self.db.stats.snapshot(limit),
+            'cache': {'hits': self.cache.hits, 'misses': self.cache.misses},
+            'writes': self._writes.stats() if self._writes is not None else None,
+        }
+
+    def export_metrics(self, path=None):
+        """Запись снимка метрик в JSON (по умолчанию <база>_metrics.json); возвращает путь"""
+        path = path or os.path.splitext(self.db.db_name)[0] + '_metrics.json'
+        return export_metrics(self.metrics(), path)
+
+    def export_analytics(self, path=None, chunk_size=None):
+        """Колоночная выгрузка полной истории для отчетов analytics.py; манифест выгрузки"""
+        from analytics import ANALYTICS_CHUNK, analytics_path, export_columns
+        return export_columns(self.db, self.archive, path or analytics_path(self.db.db_name),
+                              chunk_size or ANALYTICS_CHUNK)
+
+    # --- Резервные копии ---
+
+    def backup(self, directory=None, keep=None):
+        """Снимок базы на ходу (backup.py), старые снимки сверх keep удаляются; путь снимка"""
+        from backup import BACKUP_KEEP, backup_path, create_snapshot, prune
+        directory = directory or backup_path(self.db.db_name)
+        path = create_snapshot(self.db.db_name, directory)
+        prune(directory, BACKUP_KEEP if keep is None else keep)
+        return path
+
+    def restore_backup(self, snapshot, directory=None):
+        """Восстановление базы из снимка; текущее состояние перед этим тоже сохраняется снимком"""
+        from backup import backup_path, create_snapshot, restore_snapshot, verify_snapshot
+        problems = verify_snapshot(snapshot)
+        if problems:
+            raise ValueError(problems[0])
+        create_snapshot(self.db.db_name, directory or backup_path(self.db.db_name))
+        head = self.changes.head()
+        restore_snapshot(snapshot, self.db.connection())
+        # Снимок мог быть снят до последних миграций
+        run_migrations(self.db, MIGRATIONS)
+        self.changes.reset(head)
+        self.cache.clear()
+        self.scheduler.invalidate()
+
+    def close(self):
+        """Закрытие соединений с базой данных"""
+        if self._writes is not None:
+            self._writes.close()
+        self.db.close()
+
+
+def _add_demo_data(cursor):
+    # Демо-клиенты
+    demo_clients = [
+        ('79161234567', 'Иван Петров', 'ivan@mail.ru'),
+        ('79037654321', 'Мария Сидорова', 'maria@mail.ru'),
+    ]
+
+    for phone, name, email in demo_clients:
+        try:
+            cursor.execute(
+                'INSERT INTO clients (phone, name, email, registration_date) VALUES (?, ?, ?, ?)',
+                (phone, name, email, datetime.now().strftime("%Y-%m-%d"))
+            )
+        except sqlite3.IntegrityError:
+            pass
+
+    # Демо-животные
+    demo_animals = [
+        ('79161234567', 'Барсик', 'Кот', 'Сиамский', 3, 4.5, 'Аллергия на курицу'),
+        ('79161234567', 'Рекс', 'Собака', 'Овчарка', 5, 30.0, 'Любит играть с мячом'),
+        ('79037654321', 'Кеша', 'Попугай', 'Ара', 2, 1.2, 'Разговаривает'),
+    ]
+
+    for phone, name, species, breed, age, weight, notes in demo_animals:
+        cursor.execute(
+            '''INSERT INTO client_animals
+            (client_id, name, species, breed, age, weight, special_notes)
+            SELECT c.id, ?, ?, ?, ?, ?, ? FROM clients c
+            WHERE c.phone = ? AND NOT EXISTS (
+                SELECT 1 FROM client_animals WHERE client_id = c.id AND name = ?
+            )''',
+            (name, species, breed, age, weight, notes, phone, name)
+        )
+    link_pets(cursor)
+
+    # Демо-записи
+    demo_appointments = [
+        ('79161234567', 'Барсик', 'Вакцинация', '2024-12-15', '10:00', 'Подтвержден', 'Др. Смирнова', 'Ежегодная вакцинация'),
+        ('79037654321', 'Кеша', 'Осмотр', '2024-12-16', '14:30', 'Подтвержден', 'Др. Иванов', 'Плановый осмотр'),
+    ]
+
+    for phone, animal, service, date, time, status, doctor, notes in demo_appointments:
+        service_id = lookup_id(cursor, 'services', service)
+        status_id = lookup_id(cursor, 'appointment_statuses', status)
+        doctor_id = lookup_id(cursor, 'doctors', doctor)
+        cursor.execute(
+            '''INSERT INTO appointments
+            (client_id, animal_id, service_id, appointment_date, appointment_time, status_id, doctor_id, notes)
+            SELECT c.id, a.id, ?, ?, ?, ?, ?, ?
+            FROM clients c JOIN client_animals a ON a.client_id = c.id AND a.name = ?
+            WHERE c.phone = ? AND NOT EXISTS (
+                SELECT 1 FROM appointments
+                WHERE animal_id = a.id AND appointment_date = ? AND appointment_time = ?
+            )''',
+            (service_id, date, time, status_id, doctor_id, notes, animal, phone, date, time)
+        )
+    fill_appointment_minutes(cursor)
+
+
+def deduplicate_database(db):
+    """Разовое удаление полностью совпадающих дублей питомцев и записей
+
+    Нужно для баз, в которые старые версии портала добавляли демо-данные
+    при каждом запуске. Остается строка с наименьшим id.
+    """
+    with db.transaction(immediate=True) as cursor:
+        # Записи удаляемых дублей переводятся на оставшегося питомца
+        cursor.execute('''
+            UPDATE appointments SET animal_id = (
+                SELECT MIN(d.id) FROM client_animals a JOIN client_animals d
+                ON d.client_id = a.client_id AND d.name IS a.name AND d.species IS a.species
+                AND d.breed IS a.breed AND d.age IS a.age AND d.weight IS a.weight
+                AND d.special_notes IS a.special_notes
+                WHERE a.id = appointments.animal_id
+            )
+            WHERE animal_id IS NOT NULL
+        ''')
+        cursor.execute('''
+            DELETE FROM client_animals WHERE id NOT IN (
+                SELECT MIN(id) FROM client_animals
+                GROUP BY client_id, name, species, breed, age, weight, special_notes
+            )
+        ''')
+        animals_removed = cursor.rowcount
+
+        cursor.execute('''
+            DELETE FROM appointments WHERE id NOT IN (
+                SELECT MIN(id) FROM appointments
+                GROUP BY client_id, animal_id, service_id, appointment_date,
+                         appointment_time, status_id, doctor_id, notes
+            )
+        ''')
+        appointments_removed = cursor.rowcount
+
+    return {'animals': animals_removed, 'appointments': appointments_removed}
+
+
+# Клиент общей базы с номером клиента старой базы lc (в любой записи номера)
+LEGACY_CLIENT = f"(SELECT MIN(o.client_id) FROM owners o WHERE o.phone = {e164_sql('lc.phone')})"
+
+
+def import_portal_database(db, path):
+    """Перенос данных из отдельной базы портала (vet_clinic_client.db) в общую
+
+    Старая база сначала приводится к последней схеме портала, других
+    изменений в ней импорт не делает. Клиенты
+    сопоставляются по телефону в формате E.164 (тот же номер, записанный
+    иначе, - тот же клиент), справочники - по названию; ID питомцев и
+    записей сдвигаются за пределы уже занятых. Питомцы получают карточки
+    животных клиники. Возвращает число перенесенных клиентов, питомцев и
+    записей, а также записей, пропущенных из-за неразборчивой даты.
+    """
+    legacy = get_manager(path)
+    try:
+        run_migrations(legacy, PORTAL_MIGRATIONS)
+    finally:
+        legacy.close()
+
+    db.execute('ATTACH DATABASE ? AS legacy', (path,))
+    try:
+        with db.transaction(immediate=True) as cursor:
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO clients (phone, name, email, registration_date)
+                SELECT {e164_sql('lc.phone')}, lc.name, lc.email, lc.registration_date
+                FROM legacy.clients lc
+                WHERE {LEGACY_CLIENT} IS NULL
+            ''')
+            clients = cursor.rowcount
+            for table in ('services', 'appointment_statuses', 'doctors'):
+                cursor.execute(f'INSERT OR IGNORE INTO {table} (name) SELECT name FROM legacy.{table}')
+
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM client_animals')
+            pet_offset = cursor.fetchone()[0]
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM appointments')
+            appointment_offset = cursor.fetchone()[0]
+
+            cursor.execute(f'''
+                INSERT INTO client_animals
+                    (id, client_id, name, species, breed, age, weight, special_notes)
+                SELECT p.id + ?, c.id, p.name, p.species, p.breed, p.age, p.weight, p.special_notes
+                FROM legacy.client_animals p
+                JOIN legacy.clients lc ON lc.id = p.client_id
+                JOIN clients c ON c.id = {LEGACY_CLIENT}
+            ''', (pet_offset,))
+            pets = cursor.rowcount
+
+            # Вручную набранные даты и время приводятся к канону во временной
+            # таблице (старая база не меняется), неразборчивые не переносятся
+            fixed, skipped = canonical_appointment_dates(cursor, 'legacy')
+            cursor.execute('''
+                CREATE TEMP TABLE legacy_dates
+                (id INTEGER PRIMARY KEY, appointment_date TEXT, appointment_time TEXT)
+            ''')
+            cursor.executemany('INSERT INTO temp.legacy_dates (appointment_date, appointment_time, id) '
+                               'VALUES (?, ?, ?)', fixed)
+            # Интервал исправленной записи пересчитывается по новому времени
+            cursor.execute(f'''
+                INSERT INTO appointments
+                    (id, client_id, animal_id, service_id, status_id, doctor_id,
+                     appointment_date, appointment_time, start_minute, end_minute, notes)
+                SELECT ap.id + ?, c.id, ap.animal_id + ?, s.id, st.id, d.id,
+                       COALESCE(fx.appointment_date, ap.appointment_date),
+                       COALESCE(fx.appointment_time, ap.appointment_time),
+                       CASE WHEN fx.id IS NULL THEN ap.start_minute END,
+                       CASE WHEN fx.id IS NULL THEN ap.end_minute END,
+                       ap.notes
+                FROM legacy.appointments ap
+                LEFT JOIN temp.legacy_dates fx ON fx.id = ap.id
+                JOIN legacy.clients lc ON lc.id = ap.client_id
+                JOIN clients c ON c.id = {LEGACY_CLIENT}
+                LEFT JOIN legacy.services ls ON ls.id = ap.service_id
+                LEFT JOIN services s ON s.name = ls.name
+                LEFT JOIN legacy.appointment_statuses lst ON lst.id = ap.status_id
+                LEFT JOIN appointment_statuses st ON st.name = lst.name
+                LEFT JOIN legacy.doctors ld ON ld.id = ap.doctor_id
+                LEFT JOIN doctors d ON d.name = ld.name
+                WHERE fx.id IS NOT NULL OR ({APPOINTMENT_VALID})
+            ''', (appointment_offset, pet_offset))
+            appointments = cursor.rowcount
+            cursor.execute('DROP TABLE temp.legacy_dates')
+
+            link_pets(cursor)
+            fill_appointment_minutes(cursor)
+    finally:
+        db.execute('DETACH DATABASE legacy')
+
+    return {'clients': clients, 'pets': pets, 'appointments': appointments, 'skipped': skipped}
@@ -0,0 +1,338 @@
+# scheduling.py
+"""Расписание врачей и поиск свободного времени для записи на прием
+
+Часы работы врачей хранятся в doctor_hours, длительность услуги - в
+services.duration, а у записи есть интервал start_minute..end_minute
+(минуты от начала дня). Занятые интервалы держатся в памяти по дням и
+врачам (отсортированные списки + bisect), поэтому поиск ближайших
+свободных окон не ходит в базу. Сама запись проверяет пересечение еще раз
+внутри BEGIN IMMEDIATE: два клиента не могут занять одно время, даже если
+их окна были построены по устаревшему индексу.
+"""
+import threading
+import weakref
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from portal_schema import DOCTOR_UNASSIGNED, lookup_id
+
+# Шаг сетки времени записи, минут
+SLOT_STEP = 30
+# Длительность услуги, если она не указана в справочнике
+DEFAULT_DURATION = 30
+# Насколько дней вперед ищутся свободные окна
+SEARCH_DAYS = 60
+
+STATUS_CANCELLED = 'Отменен'
+
+SERVICE_DURATIONS = {
+    "Осмотр": 30,
+    "Вакцинация": 30,
+    "Стерилизация": 120,
+    "Чистка зубов": 60,
+    "Стрижка": 60,
+    "Экстренный прием": 30,
+}
+
+# Часы работы по умолчанию: (день недели 0-6, начало, конец) в минутах
+DEFAULT_HOURS = (
+    [(weekday, 9 * 60, 13 * 60) for weekday in range(5)]
+    + [(weekday, 14 * 60, 18 * 60) for weekday in range(5)]
+    + [(5, 10 * 60, 14 * 60)]
+)
+
+
+class SlotUnavailable(Exception):
+    """Выбранное время занято или вне часов работы"""
+
+
+@dataclass(frozen=True, slots=True)
+class Slot:
+    """Свободное окно: дата YYYY-MM-DD, время HH:MM и врач"""
+    date: str
+    time: str
+    doctor: str
+
+
+def parse_time(value):
+    """'HH:MM' -> минуты от начала дня"""
+    parsed = datetime.strptime(value.strip(), "%H:%M")
+    return parsed.hour * 60 + parsed.minute
+
+
+def format_time(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def fill_appointment_minutes(cursor):
+    """Интервал start_minute..end_minute для записей, где он еще не заполнен"""
+    cursor.execute(f'''
+        UPDATE appointments SET
+            start_minute = CAST(substr(appointment_time, 1, 2) AS INTEGER) * 60
+                         + CAST(substr(appointment_time, 4, 2) AS INTEGER),
+            end_minute = CAST(substr(appointment_time, 1, 2) AS INTEGER) * 60
+                       + CAST(substr(appointment_time, 4, 2) AS INTEGER)
+                       + COALESCE((SELECT duration FROM services WHERE id = appointments.service_id),
+                                  {DEFAULT_DURATION})
+        WHERE start_minute IS NULL AND appointment_time GLOB '[0-2][0-9]:[0-5][0-9]*'
+    ''')
+
+
+def _seed_schedule(cursor):
+    for name, duration in SERVICE_DURATIONS.items():
+        service_id = lookup_id(cursor, 'services', name)
+        cursor.execute('UPDATE services SET duration = ? WHERE id = ?', (duration, service_id))
+    lookup_id(cursor, 'appointment_statuses', STATUS_CANCELLED)
+    cursor.execute('SELECT id FROM doctors WHERE name != ?', (DOCTOR_UNASSIGNED,))
+    doctor_ids = [row[0] for row in cursor.fetchall()]
+    cursor.executemany(
+        'INSERT OR IGNORE INTO doctor_hours (doctor_id, weekday, start_minute, end_minute) VALUES (?, ?, ?, ?)',
+        [(doctor_id, weekday, start, end) for doctor_id in doctor_ids for weekday, start, end in DEFAULT_HOURS]
+    )
+
+
+SCHEDULE_SCHEMA = [
+    f'ALTER TABLE services ADD COLUMN duration INTEGER NOT NULL DEFAULT {DEFAULT_DURATION}',
+    'ALTER TABLE appointments ADD COLUMN start_minute INTEGER',
+    'ALTER TABLE appointments ADD COLUMN end_minute INTEGER',
+    '''
+    CREATE TABLE IF NOT EXISTS doctor_hours (
+        doctor_id INTEGER NOT NULL REFERENCES doctors (id) ON DELETE CASCADE,
+        weekday INTEGER NOT NULL,
+        start_minute INTEGER NOT NULL,
+        end_minute INTEGER NOT NULL,
+        PRIMARY KEY (doctor_id, weekday, start_minute)
+    ) WITHOUT ROWID
+    ''',
+    _seed_schedule,
+    fill_appointment_minutes,
+    # Занятость по дням для индекса и проверки пересечений
+    '''
+    CREATE INDEX IF NOT EXISTS idx_appointments_day
+    ON appointments (appointment_date, doctor_id, start_minute, end_minute, status_id)
+    ''',
+]
+
+
+class _Intervals:
+    """Непересекающиеся занятые интервалы одного врача за один день"""
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def add(self, start, end):
+        # Пересекающиеся интервалы (старые данные) сливаются в один
+        i = bisect_left(self.ends, start)
+        while i < len(self.starts) and self.starts[i] <= end:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[i])
+            del self.starts[i]
+            del self.ends[i]
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+
+    def is_free(self, start, end):
+        i = bisect_left(self.starts, end)
+        return i == 0 or self.ends[i - 1] <= start
+
+
+class Scheduler:
+    """Поиск свободных окон и запись без двойного бронирования"""
+
+    def __init__(self, db, step=SLOT_STEP):
+        self.db = db
+        self.step = step
+        # RLock: при записи вне транзакции индекс обновляется сразу после
+        # commit, пока book() еще держит блокировку
+        self._lock = threading.RLock()
+        self._durations = None
+        self._hours = None
+        self._doctors = None
+        self._cancelled_id = None
+        self._days = {}
+        # У каждого соединения свой счетчик data_version
+        self._data_versions = weakref.WeakKeyDictionary()
+
+    # --- Индекс ---
+
+    def invalidate(self, date=None):
+        """Сброс закэшированной занятости (всей или за один день)"""
+        with self._lock:
+            if date is None:
+                self._days.clear()
+                self._durations = None
+            else:
+                self._days.pop(date, None)
+
+    def _check_version(self):
+        # data_version меняется, когда в базу пишет другое соединение;
+        # значения разных соединений между собой не сравнимы
+        conn = self.db.connection()
+        version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if version != self._data_versions.get(conn):
+            self._days.clear()
+            self._durations = None
+            self._data_versions[conn] = version
+
+    def _remember(self, date, doctor_id, start, end):
+        """Зафиксированная запись - в индекс, если день уже загружен"""
+        with self._lock:
+            booked = self._days.get(date)
+            if booked is not None:
+                booked.setdefault(doctor_id, _Intervals()).add(start, end)
+
+    def _load_reference(self):
+        cursor = self.db.cursor()
+        cursor.execute('SELECT name, duration FROM services')
+        self._durations = dict(cursor.fetchall())
+        cursor.execute('SELECT id, name FROM doctors WHERE name != ?', (DOCTOR_UNASSIGNED,))
+        self._doctors = dict(cursor.fetchall())
+        cursor.execute('SELECT doctor_id, weekday, start_minute, end_minute FROM doctor_hours '
+                       'ORDER BY weekday, start_minute')
+        self._hours = {}
+        for doctor_id, weekday, start, end in cursor.fetchall():
+            if doctor_id in self._doctors:
+                self._hours.setdefault(weekday, []).append((doctor_id, start, end))
+        cursor.execute('SELECT id FROM appointment_statuses WHERE name = ?', (STATUS_CANCELLED,))
+        row = cursor.fetchone()
+        self._cancelled_id = row[0] if row else 0
+
+    def _load_days(self, first, last):
+        """Занятость за даты first..last (строки YYYY-MM-DD) одним запросом"""
+        cursor = self.db.cursor()
+        cursor.execute(
+            '''SELECT appointment_date, doctor_id, start_minute, end_minute FROM appointments
+            WHERE appointment_date BETWEEN ? AND ? AND doctor_id IS NOT NULL
+              AND start_minute IS NOT NULL AND status_id IS NOT ?''',
+            (first, last, self._cancelled_id)
+        )
+        day = datetime.strptime(first, "%Y-%m-%d")
+        while True:
+            date = day.strftime("%Y-%m-%d")
+            if date > last:
+                break
+            self._days[date] = {}
+            day += timedelta(days=1)
+        for date, doctor_id, start, end in cursor:
+            if date in self._days:
+                self._days[date].setdefault(doctor_id, _Intervals()).add(start, end)
+
+    def _prepare(self):
+        self._check_version()
+        if self._durations is None:
+            self._load_reference()
+
+    # --- Поиск ---
+
+    def _free_doctor(self, date, weekday, start, end):
+        booked = self._days[date]
+        for doctor_id, hour_start, hour_end in self._hours.get(weekday, ()):
+            if hour_start <= start and end <= hour_end:
+                intervals = booked.get(doctor_id)
+                if intervals is None or intervals.is_free(start, end):
+                    return doctor_id
+        return None
+
+    def free_slots(self, service, start_date=None, count=10, days=SEARCH_DAYS, now=None):
+        """Ближайшие count свободных окон для услуги: [Slot]
+
+        Поиск начинается с start_date (по умолчанию - сегодня) и не уходит
+        дальше days дней; прошедшее время сегодняшнего дня пропускается.
+        """
+        now = now or datetime.now()
+        first = datetime.strptime(start_date, "%Y-%m-%d") if start_date else now
+        first = first.replace(hour=0, minute=0, second=0, microsecond=0)
+        last = first + timedelta(days=days - 1)
+        today = now.strftime("%Y-%m-%d")
+        now_minute = now.hour * 60 + now.minute
+
+        slots = []
+        with self._lock:
+            self._prepare()
+            duration = self._durations.get(service, DEFAULT_DURATION)
+            day = first
+            while day <= last and len(slots) < count:
+                date = day.strftime("%Y-%m-%d")
+                if date not in self._days:
+                    self._load_days(date, last.strftime("%Y-%m-%d"))
+                weekday = day.weekday()
+                starts = sorted({
+                    minute
+                    for _, hour_start, hour_end in self._hours.get(weekday, ())
+                    for minute in range(hour_start, hour_end - duration + 1, self.step)
+                })
+                for minute in starts:
+                    if date < today or (date == today and minute <= now_minute):
+                        continue
+                    doctor_id = self._free_doctor(date, weekday, minute, minute + duration)
+                    if doctor_id is not None:
+                        slots.append(Slot(date, format_time(minute), self._doctors[doctor_id]))
+                        if len(slots) == count:
+                            break
+                day += timedelta(days=1)
+        return slots
+
+    # --- Запись ---
+
+    def book(self, client_id, animal_id, service, date, time, notes, status, now=None):
+        """Атомарная запись на прием к свободному врачу
+
+        Возвращает (id записи, имя врача). Если время занято, уже прошло или
+        не попадает в часы работы ни одного врача, вызывается SlotUnavailable.
+        """
+        try:
+            day = datetime.strptime(date, "%Y-%m-%d")
+            start = parse_time(time)
+        except ValueError:
+            raise SlotUnavailable(f"Некорректные дата или время: {date} {time}") from None
+        # В базе дата хранится только в каноническом виде (см. dates.py)
+        date = day.strftime("%Y-%m-%d")
+        if day + timedelta(minutes=start) <= (now or datetime.now()):
+            raise SlotUnavailable(f"Время {date} {format_time(start)} уже прошло")
+
+        with self._lock, self.db.transaction(immediate=True) as cursor:
+            self._prepare()
+            if date not in self._days:
+                self._load_days(date, date)
+            duration = self._durations.get(service, DEFAULT_DURATION)
+            end = start + duration
+            weekday = day.weekday()
+
+            # Проверка по базе: индекс мог устареть, если писало другое соединение
+            candidates = [doctor_id for doctor_id, hour_start, hour_end in self._hours.get(weekday, ())
+                          if hour_start <= start and end <= hour_end]
+            if not candidates:
+                raise SlotUnavailable(f"Время {date} {time} вне часов работы клиники")
+            doctor_id = None
+            for candidate in candidates:
+                cursor.execute(
+                    '''SELECT 1 FROM appointments
+                    WHERE appointment_date = ? AND doctor_id = ?
+                      AND start_minute < ? AND end_minute > ? AND status_id IS NOT ?
+                    LIMIT 1''',
+                    (date, candidate, end, start, self._cancelled_id)
+                )
+                if cursor.fetchone() is None:
+                    doctor_id = candidate
+                    break
+            if doctor_id is None:
+                self._days.pop(date, None)
+                raise SlotUnavailable(f"Время {date} {time} занято")
+
+            cursor.execute(
+                '''INSERT INTO appointments
+                (client_id, animal_id, service_id, appointment_date, appointment_time,
+                 start_minute, end_minute, status_id, doctor_id, notes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                (client_id, animal_id, lookup_id(cursor, 'services', service), date, format_time(start),
+                 start, end, lookup_id(cursor, 'appointment_statuses', status), doctor_id, notes)
+            )
+            appointment_id = cursor.lastrowid
+            # Своя запись не меняет data_version этого соединения, поэтому
+            # индекс дополняется вручную - но только после commit: внутри
+            # пакета очереди записи точка сохранения еще может откатиться
+            self.db.on_commit(lambda: self._remember(date, doctor_id, start, end))
+
+        return appointment_id, self._doctors[doctor_id]
@@ -0,0 +1,114 @@
+# search.py
+"""Полнотекстовый поиск на SQLite FTS5
+
+Индексы хранятся как external content таблицы FTS5 поверх исходных таблиц
+и синхронизируются триггерами. Токенизатор unicode61 приводит кириллицу к
+нижнему регистру и с remove_diacritics 2 не различает «е» и «ё»; префиксные
+индексы ускоряют запросы по началу слова («аллер» находит «аллергия»).
+"""
+import re
+
+TOKENIZE = "unicode61 remove_diacritics 2"
+
+# Диагнозы и лечение визитов (vet_clinic.db)
+VISITS_FTS_SCHEMA = [
+    f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS visits_fts USING fts5(
+        diagnosis, treatment,
+        content='visits', content_rowid='id',
+        tokenize="{TOKENIZE}", prefix='2 3'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_visits_fts_insert AFTER INSERT ON visits
+    BEGIN
+        INSERT INTO visits_fts (rowid, diagnosis, treatment)
+            VALUES (NEW.id, NEW.diagnosis, NEW.treatment);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_visits_fts_delete AFTER DELETE ON visits
+    BEGIN
+        INSERT INTO visits_fts (visits_fts, rowid, diagnosis, treatment)
+            VALUES ('delete', OLD.id, OLD.diagnosis, OLD.treatment);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_visits_fts_update AFTER UPDATE OF diagnosis, treatment ON visits
+    BEGIN
+        INSERT INTO visits_fts (visits_fts, rowid, diagnosis, treatment)
+            VALUES ('delete', OLD.id, OLD.diagnosis, OLD.treatment);
+        INSERT INTO visits_fts (rowid, diagnosis, treatment)
+            VALUES (NEW.id, NEW.diagnosis, NEW.treatment);
+    END
+    ''',
+    "INSERT INTO visits_fts (visits_fts) VALUES ('rebuild')",
+]
+
+# Клички и особенности питомцев портала (vet_clinic_client.db)
+PETS_FTS_SCHEMA = [
+    f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS client_animals_fts USING fts5(
+        name, special_notes,
+        content='client_animals', content_rowid='id',
+        tokenize="{TOKENIZE}", prefix='2 3'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_client_animals_fts_insert AFTER INSERT ON client_animals
+    BEGIN
+        INSERT INTO client_animals_fts (rowid, name, special_notes)
+            VALUES (NEW.id, NEW.name, NEW.special_notes);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_client_animals_fts_delete AFTER DELETE ON client_animals
+    BEGIN
+        INSERT INTO client_animals_fts (client_animals_fts, rowid, name, special_notes)
+            VALUES ('delete', OLD.id, OLD.name, OLD.special_notes);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_client_animals_fts_update AFTER UPDATE OF name, special_notes ON client_animals
+    BEGIN
+        INSERT INTO client_animals_fts (client_animals_fts, rowid, name, special_notes)
+            VALUES ('delete', OLD.id, OLD.name, OLD.special_notes);
+        INSERT INTO client_animals_fts (rowid, name, special_notes)
+            VALUES (NEW.id, NEW.name, NEW.special_notes);
+    END
+    ''',
+    "INSERT INTO client_animals_fts (client_animals_fts) VALUES ('rebuild')",
+]
+
+
+def build_match_query(text):
+    """Преобразование пользовательского ввода в безопасный запрос MATCH
+
+    Каждое слово ищется по префиксу, все слова должны присутствовать.
+    Спецсимволы синтаксиса FTS5 отбрасываются. Для пустого ввода - None.
+    """
+    words = re.findall(r'\w+', text or '')
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_visit_rows(cursor, query, limit):
+    """Визиты по диагнозу и лечению, релевантные первыми
+
+    Строки - поля Visit (с кличкой животного) и ранг bm25 последним: чем
+    меньше, тем релевантнее. Для пустого запроса - пустой список.
+    """
+    match = build_match_query(query)
+    if match is None:
+        return []
+    cursor.execute('''
+        SELECT v.id, v.animal_id, v.visit_date, v.diagnosis, v.treatment, v.cost, a.name, f.rank
+        FROM visits_fts f
+        JOIN visits v ON v.id = f.rowid
+        LEFT JOIN animals a ON a.id = v.animal_id
+        WHERE visits_fts MATCH ?
+        ORDER BY f.rank
+        LIMIT ?
+    ''', (match, limit))
+    return cursor.fetchall()
@@ -0,0 +1,226 @@
+# synthetic_data.py
+"""Генератор синтетических данных клиники для нагрузочных измерений
+
+Заполняет общую базу: животные и визиты клиники через пакетный импорт
+репозитория, клиенты портала, их питомцы (связанные с карточками животных)
+и записи на прием. Число визитов на животное распределено по Ципфу: у
+немногих животных длинная история, у большинства - несколько визитов.
+
+    python synthetic_data.py --visits 100000 --db bench.db
+"""
+import argparse
+import itertools
+import random
+import sys
+from datetime import datetime, timedelta
+
+FIRST_NAMES = ['Иван', 'Мария', 'Алексей', 'Ольга', 'Дмитрий', 'Елена', 'Сергей', 'Анна',
+               'Андрей', 'Наталья', 'Михаил', 'Татьяна', 'Николай', 'Юлия', 'Павел', 'Ирина']
+LAST_NAMES = ['Петров', 'Сидоров', 'Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев',
+              'Соколов', 'Михайлов', 'Новиков', 'Федоров', 'Морозов', 'Волков', 'Лебедев']
+PET_NAMES = ['Барсик', 'Рекс', 'Кеша', 'Мурка', 'Шарик', 'Бобик', 'Пушок', 'Снежок',
+             'Дружок', 'Рыжик', 'Тузик', 'Марсик', 'Лайка', 'Грей', 'Персик', 'Зефир']
+SPECIES = [
+    ('Кот', ['Сиамский', 'Британский', 'Мейн-кун', 'Беспородный'], 4.5),
+    ('Собака', ['Овчарка', 'Лабрадор', 'Такса', 'Беспородная'], 20.0),
+    ('Попугай', ['Ара', 'Волнистый', 'Корелла'], 0.5),
+    ('Хомяк', ['Сирийский', 'Джунгарский'], 0.1),
+    ('Кролик', ['Карликовый', 'Вислоухий'], 2.0),
+]
+DIAGNOSES = [
+    ('Здоров', 'Плановая вакцинация', 1500),
+    ('Аллергия на корм', 'Смена корма, антигистаминные', 900),
+    ('Отит', 'Капли в уши, повторный осмотр через неделю', 1200),
+    ('Гастрит', 'Диета, спазмолитики', 1800),
+    ('Травма лапы', 'Перевязка, обезболивающее', 2500),
+    ('Зубной камень', 'Чистка зубов под седацией', 4000),
+    ('Блохи', 'Обработка от паразитов', 700),
+    ('Дерматит', 'Мазь, витамины', 1100),
+]
+NOTES = ['Аллергия на курицу', 'Любит играть с мячом', 'Боится врачей', 'Разговаривает',
+         'Кусается при осмотре', 'Хронический отит', '']
+SERVICES = ["Осмотр", "Вакцинация", "Стерилизация", "Чистка зубов", "Стрижка", "Экстренный прием"]
+DOCTORS = ['Др. Смирнова', 'Др. Иванов', 'Др. Петрова', 'Не назначен']
+STATUSES = ['Подтвержден', 'Ожидание', 'Завершен']
+TIMES = ["09:00", "10:00", "11:00", "12:00", "14:00", "15:00", "16:00", "17:00"]
+
+# Параметр распределения Ципфа для числа визитов на животное
+ZIPF_EXPONENT = 1.1
+
+
+def random_phone(rng):
+    """Российский мобильный номер в формате 79XXXXXXXXX"""
+    return '79' + ''.join(rng.choice('0123456789') for _ in range(9))
+
+
+def random_person(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def zipf_sampler(rng, count, exponent=ZIPF_EXPONENT):
+    """Функция выбора номера 0..count-1 с вероятностью ~ 1/rank^exponent
+
+    Ранги случайно перемешаны, чтобы «популярные» животные не были
+    сосредоточены в начале таблицы.
+    """
+    weights = itertools.accumulate(1.0 / (rank ** exponent) for rank in range(1, count + 1))
+    cum_weights = list(weights)
+    order = list(range(count))
+    rng.shuffle(order)
+    population = range(count)
+
+    def sample(k):
+        return [order[i] for i in rng.choices(population, cum_weights=cum_weights, k=k)]
+
+    return sample
+
+
+class ClinicDataset:
+    """Параметры синтетического набора данных"""
+
+    def __init__(self, visits, animals=None, seed=42, years=5):
+        self.visits = visits
+        self.animals = animals or max(10, visits // 8)
+        self.clients = max(2, int(self.animals / 1.5))
+        self.appointments = max(10, visits // 4)
+        self.seed = seed
+        self.years = years
+        self.start = datetime(2020, 1, 1)
+
+    def _random_date(self, rng):
+        return self.start + timedelta(seconds=rng.randrange(self.years * 365 * 86400))
+
+    def generate_clients(self, rng):
+        """Клиенты: (phone, name, email, registration_date)"""
+        phones = set()
+        while len(phones) < self.clients:
+            phones.add(random_phone(rng))
+        for i, phone in enumerate(sorted(phones)):
+            yield (phone, random_person(rng), f"client{i}@mail.ru",
+                   self._random_date(rng).strftime("%Y-%m-%d"))
+
+    def generate_animals(self, rng, clients):
+        """Животные в формате пакетного импорта; владелец - один из клиентов"""
+        for _ in range(self.animals):
+            species, breeds, base_weight = rng.choice(SPECIES)
+            phone, owner_name = rng.choice(clients)[:2]
+            yield {
+                'name': rng.choice(PET_NAMES),
+                'species': species,
+                'breed': rng.choice(breeds),
+                'age': rng.randint(0, 15),
+                'owner_name': owner_name,
+                'phone': phone,
+                'registration_date': self._random_date(rng).strftime("%Y-%m-%d %H:%M:%S"),
+                'weight': round(base_weight * rng.uniform(0.5, 1.5), 1),
+                'notes': rng.choice(NOTES),
+            }
+
+    def generate_visits(self, rng, batch=10000):
+        """Визиты с распределением по Ципфу между животными"""
+        sample = zipf_sampler(rng, self.animals)
+        remaining = self.visits
+        while remaining > 0:
+            k = min(batch, remaining)
+            for animal_index in sample(k):
+                diagnosis, treatment, cost = rng.choice(DIAGNOSES)
+                yield {
+                    'animal_id': animal_index + 1,
+                    'visit_date': self._random_date(rng).strftime("%Y-%m-%d %H:%M:%S"),
+                    'diagnosis': diagnosis,
+                    'treatment': treatment,
+                    'cost': round(cost * rng.uniform(0.8, 1.3), 2),
+                }
+            remaining -= k
+
+    def generate_appointments(self, rng, pets):
+        """Записи на прием для питомцев портала: pets - [(id питомца, id клиента)]"""
+        for _ in range(self.appointments):
+            animal_id, client_id = rng.choice(pets)
+            yield (client_id, animal_id, rng.choice(SERVICES),
+                   self._random_date(rng).strftime("%Y-%m-%d"), rng.choice(TIMES),
+                   rng.choice(STATUSES), rng.choice(DOCTORS), '')
+
+
+def populate(dataset, db_name, batch_size=10000):
+    """Заполнение общей базы синтетическими данными"""
+    from repository import open_repository
+    from portal_schema import lookup_id
+    from scheduling import fill_appointment_minutes
+
+    rng = random.Random(dataset.seed)
+
+    clients = list(dataset.generate_clients(rng))
+    animals = list(dataset.generate_animals(rng, clients))
+
+    # Карточки животных и визиты клиники
+    repo = open_repository(db_name)
+    repo.add_animals_bulk(animals, batch_size=batch_size)
+    repo.add_visits_bulk(dataset.generate_visits(rng), batch_size=batch_size)
+
+    # Клиенты портала и их питомцы, связанные с карточками
+    db = repo.db
+    with db.transaction() as cursor:
+        cursor.executemany(
+            'INSERT INTO clients (phone, name, email, registration_date) VALUES (?, ?, ?, ?)',
+            clients
+        )
+        cursor.execute('SELECT id, phone FROM clients')
+        client_ids = {phone: client_id for client_id, phone in cursor.fetchall()}
+        cursor.execute('SELECT id FROM animals ORDER BY id')
+        animal_ids = [row[0] for row in cursor.fetchall()]
+        cursor.executemany(
+            '''INSERT INTO client_animals
+            (client_id, name, species, breed, age, weight, special_notes, animal_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+            ((client_ids[a['phone']], a['name'], a['species'], a['breed'], a['age'], a['weight'],
+              a['notes'], animal_id)
+             for a, animal_id in zip(animals, animal_ids))
+        )
+        cursor.execute('SELECT id, client_id FROM client_animals')
+        pets = cursor.fetchall()
+
+    lookups = {}
+    appointments = dataset.generate_appointments(rng, pets)
+    while True:
+        chunk = list(itertools.islice(appointments, batch_size))
+        if not chunk:
+            break
+        with db.transaction() as cursor:
+            def resolve(table, name):
+                if (table, name) not in lookups:
+                    lookups[table, name] = lookup_id(cursor, table, name)
+                return lookups[table, name]
+
+            cursor.executemany(
+                '''INSERT INTO appointments
+                (client_id, animal_id, service_id, appointment_date, appointment_time, status_id, doctor_id, notes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                [(client_id, animal_id, resolve('services', service), date, time,
+                  resolve('appointment_statuses', status), resolve('doctors', doctor), notes)
+                 for client_id, animal_id, service, date, time, status, doctor, notes in chunk]
+            )
+    with db.transaction() as cursor:
+        fill_appointment_minutes(cursor)
+
+    logins = [(client_ids[phone], phone, name) for phone, name, _, _ in clients]
+    return {'clients': logins, 'animals': len(animals)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Генерация синтетических данных клиники")
+    parser.add_argument('--visits', type=int, default=10000, help="Число визитов (10 тыс. - 10 млн)")
+    parser.add_argument('--animals', type=int, help="Число животных (по умолчанию visits / 8)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', default='bench_vet_clinic.db')
+    args = parser.parse_args(argv)
+
+    dataset = ClinicDataset(args.visits, animals=args.animals, seed=args.seed)
+    populate(dataset, args.db)
+    print(f"Создано: клиентов {dataset.clients}, животных {dataset.animals}, "
+          f"визитов {dataset.visits}, записей {dataset.appointments}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+# tests/test_api_server.py
+import asyncio
+
+import pytest
+
+from api_server import ClinicApi, HttpError, handle_connection
+from repository import open_repository
+
+
+class FakeWriter:
+    def __init__(self):
+        self.data = bytearray()
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class BrokenStreamApi:
+    """Список, выдача которого обрывается ошибкой после первой порции"""
+
+    def __init__(self):
+        self.requests = 0
+
+    async def dispatch(self, method, path, query, body):
+        self.requests += 1
+
+        async def chunks():
+            yield [{'id': 1}]
+            raise ValueError("ошибка чтения порции")
+        return 200, chunks()
+
+
+def test_stream_error_closes_connection():
+    api = BrokenStreamApi()
+    writer = FakeWriter()
+
+    async def run():
+        reader = asyncio.StreamReader()
+        # Два запроса в одном keep-alive соединении
+        reader.feed_data(b'GET /animals/all HTTP/1.1\r\n\r\n' * 2)
+        reader.feed_eof()
+        await handle_connection(api, reader, writer)
+
+    asyncio.run(run())
+
+    assert writer.closed
+    assert api.requests == 1
+    assert writer.data.startswith(b'HTTP/1.1 200 OK')
+    assert b'[{"id": 1}' in writer.data
+    # Без завершающего chunk клиент видит неполный ответ
+    assert not writer.data.endswith(b'0\r\n\r\n')
+
+
+@pytest.fixture
+def api(tmp_path):
+    repo = open_repository(str(tmp_path / 'clinic.db'))
+    api = ClinicApi(repo, read_workers=1)
+    yield api
+    api.close()
+    repo.close()
+
+
+@pytest.mark.parametrize('body', [
+    {'name': 'Рекс', 'species': 'Собака', 'age': 'три'},
+    {'name': 'Рекс', 'species': 'Собака', 'age': -1},
+    {'name': 'Рекс', 'species': 'Собака', 'age': 2.5},
+    {'name': 'Рекс', 'species': ['Собака']},
+    {'name': 'Рекс', 'species': '   '},
+])
+def test_add_animal_rejects_invalid_fields(api, body):
+    with pytest.raises(HttpError) as error:
+        asyncio.run(api.dispatch('POST', '/animals', {}, body))
+    assert error.value.status == 400
+
+
+def test_add_animal(api):
+    status, payload = asyncio.run(api.dispatch('POST', '/animals', {},
+                                               {'name': 'Рекс', 'species': 'Собака', 'age': '3'}))
+    assert status == 201
+    animal = api.repo.animals_page(0, 1)[0]
+    assert (animal.id, animal.species, animal.age) == (payload['id'], 'Собака', 3)
+
+
+def test_add_visit_for_missing_animal(api):
+    with pytest.raises(HttpError) as error:
+        asyncio.run(api.dispatch('POST', '/visits', {}, {'animal_id': 999, 'diagnosis': 'Осмотр'}))
+    assert error.value.status == 404
+    assert api.repo.db.execute('SELECT COUNT(*) FROM visits').fetchone()[0] == 0
+
+
+def test_add_visit(api):
+    animal_id = api.repo.add_animal('Рекс', 'Собака', None, 3, None, None)
+    status, payload = asyncio.run(api.dispatch('POST', '/visits', {},
+                                               {'animal_id': animal_id, 'cost': 500}))
+    assert status == 201
+    assert [visit.id for visit in api.repo.animal_visits(animal_id)] == [payload['id']]
+
+
+@pytest.mark.parametrize('path', ['/pets/999', '/appointments/999'])
+def test_delete_missing_resource(api, path):
+    with pytest.raises(HttpError) as error:
+        asyncio.run(api.dispatch('DELETE', path, {}, None))
+    assert error.value.status == 404
+
+
+def test_delete_pet(api):
+    client = api.repo.register_client('+79161234567', 'Иван Петров', None)
+    pet = api.repo.add_pet(client, 'Барсик', 'Кот', None, 3, None, None)
+    assert asyncio.run(api.dispatch('DELETE', f'/pets/{pet.id}', {}, None)) == (200, {'deleted': pet.id})
+    assert api.repo.client_pets(client.id) == []
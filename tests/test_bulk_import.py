@@ -0,0 +1,43 @@
+# tests/test_bulk_import.py
+import pytest
+
+from repository import open_repository
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = open_repository(str(tmp_path / 'clinic.db'))
+    yield repo
+    repo.close()
+
+
+def visit(animal_id, diagnosis):
+    return {'animal_id': animal_id, 'diagnosis': diagnosis, 'cost': 100,
+            'visit_date': '2024-03-01 10:00:00'}
+
+
+def test_rejected_rows_do_not_abort_batch(repo):
+    animal_id = repo.add_animal('Рекс', 'Собака', None, 3, None, None)
+    with repo.db.transaction() as cursor:
+        cursor.execute('''
+            CREATE TRIGGER trg_test_reject BEFORE INSERT ON visits WHEN NEW.diagnosis = 'сбой'
+            BEGIN SELECT RAISE(ABORT, 'визит отклонен'); END
+        ''')
+    rows = [visit(animal_id, 'Осмотр'), visit(animal_id, 'сбой'), None,
+            visit(animal_id, 'Вакцинация'), visit(animal_id, 'сбой')]
+
+    result = repo.add_visits_bulk(rows, batch_size=10)
+
+    assert result['inserted'] == 2
+    assert result['errors'] == [(2, 'визит отклонен'), (3, 'некорректная строка'), (5, 'визит отклонен')]
+    assert sorted(v.diagnosis for v in repo.animal_visits(animal_id)) == ['Вакцинация', 'Осмотр']
+
+
+def test_visit_of_missing_animal_is_reported(repo):
+    animal_id = repo.add_animal('Рекс', 'Собака', None, 3, None, None)
+
+    result = repo.add_visits_bulk([visit(animal_id, 'Осмотр'), visit(999, 'Осмотр')])
+
+    assert result['inserted'] == 1
+    assert result['errors'] == [(2, 'животное с ID 999 не найдено')]
+    assert repo.db.execute('SELECT COUNT(*) FROM visits').fetchone()[0] == 1
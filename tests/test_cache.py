@@ -0,0 +1,65 @@
+# tests/test_cache.py
+import pytest
+
+from cache import ReadThroughCache
+
+
+class FakeDB:
+    """Только PRAGMA data_version, которую проверяет кэш"""
+
+    def __init__(self):
+        self.version = 1
+
+    def execute(self, sql, params=()):
+        return self
+
+    def fetchone(self):
+        return (self.version,)
+
+
+def loader(rows, during=None):
+    """Функция загрузки, считающая вызовы; during() - то, что случилось во время загрузки"""
+    calls = []
+
+    def load():
+        calls.append(1)
+        if during is not None and len(calls) == 1:
+            during()
+        return rows
+    return load, calls
+
+
+@pytest.mark.parametrize('reset', [
+    lambda cache: cache.clear(),
+    lambda cache: cache.invalidate(7, 'pets'),
+    lambda cache: cache.invalidate_kind('pets'),
+])
+def test_value_loaded_before_reset_is_not_cached(reset):
+    cache = ReadThroughCache(FakeDB())
+    load, calls = loader(['старое'], during=lambda: reset(cache))
+
+    assert cache.get('pets', 7, load) == ['старое']
+    assert cache.get('pets', 7, load) == ['старое']
+    assert len(calls) == 2
+    assert cache.hits == 0
+
+
+def test_loaded_value_is_cached():
+    cache = ReadThroughCache(FakeDB())
+    load, calls = loader(['Барсик'])
+
+    cache.get('pets', 7, load)
+    assert cache.get('pets', 7, load) == ['Барсик']
+    assert len(calls) == 1
+
+
+def test_invalidation_state_is_bounded():
+    cache = ReadThroughCache(FakeDB(), max_rows=10)
+    for client_id in range(1000):
+        cache.get('pets', client_id, lambda: ['Барсик'])
+        cache.invalidate(client_id, 'pets', 'visits', 'appointments')
+    with pytest.raises(ValueError):
+        cache.get('pets', 0, lambda: int('не число'))
+
+    assert cache._loads == {}
+    assert cache.rows == 0
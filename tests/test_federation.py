@@ -0,0 +1,38 @@
+# tests/test_federation.py
+from federation import ClinicFederation
+from repository import open_repository
+
+
+def make_branch(path, diagnoses):
+    repo = open_repository(str(path))
+    animal_id = repo.add_animal('Рекс', 'Собака', None, 3, None, None)
+    for diagnosis in diagnoses:
+        repo.add_visit(animal_id, diagnosis, 'Капли', 500)
+    repo.close()
+    return str(path)
+
+
+def test_broken_branch_does_not_abort_statistics(tmp_path):
+    north = make_branch(tmp_path / 'north.db', ['Отит'])
+    south = make_branch(tmp_path / 'south.db', ['Отит'])
+    repo = open_repository(south)
+    with repo.db.transaction() as cursor:
+        cursor.execute('DELETE FROM stats_totals')
+    repo.close()
+
+    with ClinicFederation([north, south], processes=1) as federation:
+        stats = federation.statistics()
+        errors = federation.errors
+
+    assert list(errors) == ['south']
+    assert (stats['total_animals'], stats['total_visits']) == (1, 1)
+
+
+def test_search_interleaves_branches(tmp_path):
+    north = make_branch(tmp_path / 'north.db', ['Отит', 'Отит', 'Отит'])
+    south = make_branch(tmp_path / 'south.db', ['Отит'] + ['Гастрит'] * 50)
+
+    with ClinicFederation([north, south], processes=2) as federation:
+        found = federation.search('отит', limit=3)
+
+    assert [item.branch for item in found] == ['north', 'south', 'north']
@@ -0,0 +1,110 @@
+# tests/test_portal_import.py
+import sqlite3
+
+import pytest
+
+from repository import PORTAL_MIGRATIONS, open_repository
+
+
+def make_legacy_portal(path, phone, date='2024-02-01', time='10:00'):
+    """Старая база портала (первая версия схемы) с клиентом, питомцем и записью"""
+    conn = sqlite3.connect(path)
+    for sql in PORTAL_MIGRATIONS[0][1]:
+        conn.execute(sql)
+    conn.execute("INSERT INTO clients (phone, name, email, registration_date) "
+                 "VALUES (?, 'Иван Петров', 'ivan@mail.ru', '2024-01-15')", (phone,))
+    conn.execute("INSERT INTO client_animals (client_phone, name, species, breed, age, weight) "
+                 "VALUES (?, 'Барсик', 'Кот', 'Сиамский', 3, 4.5)", (phone,))
+    conn.execute("INSERT INTO appointments (client_phone, animal_name, service_type, appointment_date, "
+                 "appointment_time, status, doctor) "
+                 "VALUES (?, 'Барсик', 'Осмотр', ?, ?, 'Запланирован', 'Др. Иванов')",
+                 (phone, date, time))
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = open_repository(str(tmp_path / 'clinic.db'))
+    yield repo
+    repo.close()
+
+
+@pytest.mark.parametrize('legacy_phone', ['79161234567', '8 (916) 123-45-67', '+7 916 123 45 67'])
+def test_import_matches_client_by_normalized_phone(repo, tmp_path, legacy_phone):
+    client = repo.register_client('+79161234567', 'Иван Петров', 'ivan@mail.ru')
+    legacy = make_legacy_portal(tmp_path / 'portal.db', legacy_phone)
+
+    moved = repo.import_portal_database(legacy)
+
+    assert moved['clients'] == 0
+    assert repo.db.execute('SELECT COUNT(*) FROM clients').fetchone()[0] == 1
+    assert [pet.name for pet in repo.client_pets(client.id)] == ['Барсик']
+    assert len(repo.client_appointments(client.id)) == 1
+
+
+def test_import_matches_client_stored_before_normalization(repo, tmp_path):
+    # Клиент, зарегистрированный до перехода на E.164, хранит номер как ввели
+    with repo.db.transaction() as cursor:
+        cursor.execute("INSERT INTO clients (phone, name, email) VALUES ('8-916-123-45-67', 'Иван Петров', NULL)")
+        client_id = cursor.lastrowid
+    legacy = make_legacy_portal(tmp_path / 'portal.db', '79161234567')
+
+    moved = repo.import_portal_database(legacy)
+
+    assert moved['clients'] == 0
+    assert [pet.name for pet in repo.client_pets(client_id)] == ['Барсик']
+
+
+def test_import_adds_new_client_with_e164_phone(repo, tmp_path):
+    legacy = make_legacy_portal(tmp_path / 'portal.db', '8 (903) 765-43-21')
+
+    moved = repo.import_portal_database(legacy)
+
+    assert moved == {'clients': 1, 'pets': 1, 'appointments': 1, 'skipped': 0}
+    phone, = repo.db.execute('SELECT phone FROM clients').fetchone()
+    assert phone == '+79037654321'
+    # Карточка клиники питомца - с тем же номером
+    assert repo.db.execute('SELECT phone FROM animals').fetchall() == [('+79037654321',)]
+
+
+def test_import_normalizes_dates_without_touching_source(repo, tmp_path):
+    legacy = make_legacy_portal(tmp_path / 'portal.db', '79161234567', date='01.02.2024', time='9:30')
+
+    moved = repo.import_portal_database(legacy)
+
+    assert moved['appointments'] == 1
+    assert repo.db.execute('SELECT appointment_date, appointment_time, start_minute FROM appointments'
+                           ).fetchall() == [('2024-02-01', '09:30', 570)]
+    conn = sqlite3.connect(legacy)
+    assert conn.execute('SELECT appointment_date, appointment_time FROM appointments').fetchall() == [
+        ('01.02.2024', '9:30')]
+    conn.close()
+
+
+def test_import_skips_unreadable_dates(repo, tmp_path):
+    legacy = make_legacy_portal(tmp_path / 'portal.db', '79161234567', date='когда-нибудь')
+
+    moved = repo.import_portal_database(legacy)
+
+    assert (moved['appointments'], moved['skipped']) == (0, 1)
+
+
+def test_rows_without_client_survive_migration(repo, tmp_path):
+    legacy = make_legacy_portal(tmp_path / 'portal.db', '79161234567')
+    conn = sqlite3.connect(legacy)
+    conn.execute("INSERT INTO client_animals (client_phone, name, species) VALUES ('79035550000', 'Шарик', 'Собака')")
+    conn.execute("INSERT INTO appointments (client_phone, animal_name, service_type, appointment_date, "
+                 "appointment_time) VALUES ('79035550000', 'Шарик', 'Осмотр', '2024-03-01', '11:00')")
+    conn.execute("INSERT INTO appointments (client_phone, service_type, appointment_date, appointment_time) "
+                 "VALUES (NULL, 'Осмотр', '2024-03-02', '12:00')")
+    conn.commit()
+    conn.close()
+
+    moved = repo.import_portal_database(legacy)
+
+    assert (moved['pets'], moved['appointments']) == (2, 3)
+    orphan = repo.db.execute("SELECT id, name FROM clients WHERE phone = '+79035550000'").fetchone()
+    assert orphan[1] == 'Не зарегистрирован'
+    assert [pet.name for pet in repo.client_pets(orphan[0])] == ['Шарик']
@@ -0,0 +1,80 @@
+# tests/test_scheduling.py
+import threading
+from datetime import datetime
+
+import pytest
+
+from repository import open_repository
+from scheduling import Slot, SlotUnavailable
+
+# Понедельник: у всех врачей прием с 09:00
+DAY = '2030-01-07'
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = open_repository(str(tmp_path / 'clinic.db'))
+    yield repo
+    repo.close()
+
+
+def book(repo, time, now=None):
+    return repo.scheduler.book(1, 1, 'Осмотр', DAY, time, '', 'Запланирован', now=now)
+
+
+def first_slot(repo):
+    return repo.free_slots('Осмотр', DAY, count=1)[0]
+
+
+def test_book_rejects_passed_time_today(repo):
+    now = datetime(2030, 1, 7, 12, 0)
+    for time in ('09:00', '12:00'):
+        with pytest.raises(SlotUnavailable, match='уже прошло'):
+            book(repo, time, now=now)
+    assert book(repo, '14:00', now=now)[1] == 'Др. Смирнова'
+
+
+def test_rolled_back_booking_leaves_index_unchanged(repo):
+    assert first_slot(repo) == Slot(DAY, '09:00', 'Др. Смирнова')
+    # Как в пакете очереди записи: запись откатывается своей точкой сохранения
+    with repo.db.transaction():
+        with pytest.raises(ValueError):
+            with repo.db.transaction():
+                book(repo, '09:00')
+                raise ValueError("операция не удалась")
+        assert first_slot(repo) == Slot(DAY, '09:00', 'Др. Смирнова')
+
+    assert first_slot(repo) == Slot(DAY, '09:00', 'Др. Смирнова')
+    assert repo.db.execute('SELECT COUNT(*) FROM appointments').fetchone()[0] == 0
+
+
+def test_committed_booking_updates_index(repo):
+    first_slot(repo)
+    with repo.db.transaction():
+        book(repo, '09:00')
+        # До commit запись в индекс не попадает
+        assert first_slot(repo) == Slot(DAY, '09:00', 'Др. Смирнова')
+    assert first_slot(repo) == Slot(DAY, '09:00', 'Др. Иванов')
+
+
+def test_write_from_other_thread_invalidates_index(repo):
+    first_slot(repo)
+    slots = []
+
+    def write_and_search():
+        # Запись в обход планировщика на соединении этого потока
+        with repo.db.transaction() as cursor:
+            cursor.execute(
+                '''INSERT INTO appointments (client_id, animal_id, appointment_date, appointment_time,
+                                             start_minute, end_minute, doctor_id)
+                SELECT 1, 1, ?, '09:00', 540, 570, id FROM doctors WHERE name = 'Др. Смирнова' ''',
+                (DAY,)
+            )
+        slots.append(first_slot(repo))
+
+    worker = threading.Thread(target=write_and_search)
+    worker.start()
+    worker.join()
+
+    assert slots == [Slot(DAY, '09:00', 'Др. Иванов')]
+    assert first_slot(repo) == Slot(DAY, '09:00', 'Др. Иванов')
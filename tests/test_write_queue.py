@@ -0,0 +1,58 @@
+# tests/test_write_queue.py
+import sqlite3
+from contextlib import contextmanager
+
+import pytest
+
+from write_queue import WriteQueue
+
+
+class FlakyDB:
+    """Транзакция пакета падает с заданными ошибками, затем проходит"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.transactions = 0
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        self.transactions += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        yield None
+
+
+def run(db, retries=3):
+    """Одна операция через очередь; (Future, очередь, откаты пакета)"""
+    rollbacks = []
+    writes = WriteQueue(db, retries=retries, backoff=0.001, on_rollback=lambda: rollbacks.append(1))
+    future = writes.submit(lambda: 'ok')
+    writes.close()
+    return future, writes, rollbacks
+
+
+def test_busy_batch_is_retried():
+    db = FlakyDB([sqlite3.OperationalError('database is locked')] * 2)
+    future, writes, rollbacks = run(db)
+    assert future.result() == 'ok'
+    assert db.transactions == 3
+    assert writes.stats()['retries'] == 2
+    assert len(rollbacks) == 2
+
+
+def test_busy_batch_gives_up_after_retries():
+    db = FlakyDB([sqlite3.OperationalError('database is locked')] * 5)
+    future, writes, _ = run(db, retries=2)
+    with pytest.raises(sqlite3.OperationalError):
+        future.result()
+    assert db.transactions == 3
+    assert writes.stats()['errors'] == 1
+
+
+def test_other_errors_are_not_retried():
+    db = FlakyDB([sqlite3.OperationalError('disk I/O error')])
+    future, _, rollbacks = run(db)
+    with pytest.raises(sqlite3.OperationalError, match='disk I/O'):
+        future.result()
+    assert db.transactions == 1
+    assert len(rollbacks) == 1
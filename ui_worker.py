@@ -0,0 +1,102 @@
+# ui_worker.py
+import queue
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+
+# Период опроса очереди результатов из цикла Tk, мс
+POLL_INTERVAL = 25
+
+
+class BackgroundWorker:
+    """Выполнение обращений к базе данных вне потока Tk
+
+    Задачи выполняются в фоновом потоке, а их результаты возвращаются в
+    главный цикл через root.after: колбэки on_done/on_error всегда
+    вызываются в потоке Tk, поэтому в них можно работать с виджетами.
+
+    Задачи объединяются в группы. cancel(group) отменяет еще не начатые
+    задачи группы и отбрасывает результаты уже выполняющихся, так что
+    после смены вкладки или выхода из системы устаревшие колбэки не
+    срабатывают. Задачи с cancellable=False (записи в базу) не снимаются
+    с очереди, но их колбэки после отмены группы тоже отбрасываются.
+    """
+
+    def __init__(self, root, max_workers=1, on_busy=None, on_error=None):
+        self.root = root
+        self.on_busy = on_busy
+        self.on_error = on_error
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db-worker')
+        self._results = queue.Queue()
+        self._generations = {}
+        self._pending = {}
+        self._active = 0
+        self._poll_id = self.root.after(POLL_INTERVAL, self._poll)
+
+    def submit(self, func, *args, on_done=None, on_error=None, group='default', cancellable=True):
+        """Постановка задачи в фоновый поток"""
+        generation = self._generations.get(group, 0)
+        future = self._executor.submit(func, *args)
+
+        if cancellable:
+            self._pending.setdefault(group, set()).add(future)
+
+        self._set_active(self._active + 1)
+        future.add_done_callback(
+            lambda f: self._results.put((group, generation, f, on_done, on_error))
+        )
+        return future
+
+    def cancel(self, *groups):
+        """Отмена задач указанных групп (без аргументов - всех)"""
+        for group in groups or list(set(self._generations) | set(self._pending)):
+            self._generations[group] = self._generations.get(group, 0) + 1
+            for future in self._pending.pop(group, ()):
+                future.cancel()
+
+    @property
+    def busy(self):
+        return self._active > 0
+
+    def _set_active(self, active):
+        was_busy = self.busy
+        self._active = active
+        if self.on_busy and was_busy != self.busy:
+            self.on_busy(self.busy)
+
+    def _poll(self):
+        """Разбор готовых результатов в потоке Tk"""
+        try:
+            while True:
+                try:
+                    group, generation, future, on_done, on_error = self._results.get_nowait()
+                except queue.Empty:
+                    break
+
+                self._set_active(self._active - 1)
+                self._pending.get(group, set()).discard(future)
+
+                if future.cancelled() or generation != self._generations.get(group, 0):
+                    continue
+
+                error = future.exception()
+                if error is None:
+                    if on_done:
+                        on_done(future.result())
+                elif on_error:
+                    on_error(error)
+                elif self.on_error:
+                    self.on_error(error)
+        finally:
+            # Ошибка в колбэке не должна останавливать опрос
+            self._poll_id = self.root.after(POLL_INTERVAL, self._poll)
+
+    def shutdown(self):
+        """Остановка: отмена ожидающих чтений и завершение начатых записей"""
+        self.cancel()
+        if self._poll_id is not None:
+            try:
+                self.root.after_cancel(self._poll_id)
+            except tk.TclError:
+                pass
+            self._poll_id = None
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,152 @@
+# virtual_list.py
+import math
+from tkinter import ttk
+
+
+class VirtualList(ttk.Frame):
+    """Виртуализированный список/сетка карточек одинаковой высоты
+
+    Виджеты создаются только для видимых строк и переиспользуются при
+    прокрутке: меняются лишь привязанные к ним данные.
+    set_items() сравнивает новые записи с уже показанными по ключу и
+    значению и перерисовывает только изменившиеся карточки.
+
+    create_item(parent) возвращает новый виджет карточки,
+    update_item(widget, item) заполняет его данными записи.
+    """
+
+    def __init__(self, parent, create_item, update_item, item_height,
+                 columns=1, key=None, empty_text="", padding=5, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.create_item = create_item
+        self.update_item = update_item
+        self.item_height = item_height
+        self.columns = columns
+        self.key = key or (lambda item: id(item))
+        self.padding = padding
+
+        self.items = []
+        self.first_row = 0
+        self._slots = []
+        self._bound = []
+
+        self.body = ttk.Frame(self)
+        self.body.pack(side='left', fill='both', expand=True)
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self._on_scrollbar)
+        self.scrollbar.pack(side='right', fill='y')
+
+        self.empty_label = ttk.Label(self.body, text=empty_text, font=('Arial', 12))
+
+        self.body.bind('<Configure>', lambda e: self._render())
+        self.body.bind('<Enter>', self._bind_wheel)
+        self.body.bind('<Leave>', self._unbind_wheel)
+
+    # --- Данные ---
+
+    def set_items(self, items, empty_text=None):
+        """Замена набора записей с перерисовкой только изменившихся карточек"""
+        self.items = list(items)
+        if empty_text is not None:
+            self.empty_label.configure(text=empty_text)
+        self.first_row = min(self.first_row, max(0, self._total_rows() - self._visible_rows()))
+        self._render()
+
+    def scroll_to(self, index):
+        """Прокрутка к записи с указанным номером"""
+        self.first_row = max(0, min(index // self.columns, self._total_rows() - self._visible_rows()))
+        self._render()
+
+    # --- Геометрия ---
+
+    def _total_rows(self):
+        return math.ceil(len(self.items) / self.columns)
+
+    def _visible_rows(self):
+        height = self.body.winfo_height()
+        return max(1, math.ceil(height / self.item_height))
+
+    def _ensure_slots(self, count):
+        """Создание недостающих карточек; лишние не удаляются, а скрываются"""
+        while len(self._slots) < count:
+            self._slots.append(self.create_item(self.body))
+            self._bound.append(None)
+
+    # --- Отрисовка ---
+
+    def _render(self):
+        if not self.items:
+            for slot in self._slots:
+                slot.place_forget()
+            self.empty_label.place(relx=0.5, y=50, anchor='n')
+            self.scrollbar.set(0, 1)
+            return
+        self.empty_label.place_forget()
+
+        width = max(1, self.body.winfo_width())
+        column_width = width / self.columns
+        visible = self._visible_rows()
+        slot_count = visible * self.columns
+        self._ensure_slots(slot_count)
+
+        start = self.first_row * self.columns
+        for i, slot in enumerate(self._slots):
+            index = start + i
+            if i >= slot_count or index >= len(self.items):
+                slot.place_forget()
+                self._bound[i] = None
+                continue
+
+            item = self.items[index]
+            bound = (self.key(item), item)
+            if self._bound[i] != bound:
+                self.update_item(slot, item)
+                self._bound[i] = bound
+
+            row, column = divmod(i, self.columns)
+            slot.place(
+                x=column * column_width + self.padding,
+                y=row * self.item_height + self.padding,
+                width=column_width - 2 * self.padding,
+                height=self.item_height - 2 * self.padding
+            )
+
+        total = self._total_rows()
+        self.scrollbar.set(self.first_row / total, min(1.0, (self.first_row + visible) / total))
+
+    # --- Прокрутка ---
+
+    def _scroll_rows(self, rows):
+        max_first = max(0, self._total_rows() - self._visible_rows())
+        first_row = max(0, min(self.first_row + rows, max_first))
+        if first_row != self.first_row:
+            self.first_row = first_row
+            self._render()
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == 'moveto':
+            self._scroll_rows(int(float(value) * self._total_rows()) - self.first_row)
+        elif action == 'scroll':
+            step = self._visible_rows() if unit == 'pages' else 1
+            self._scroll_rows(int(value) * step)
+
+    def _on_wheel(self, event):
+        if getattr(event, 'num', None) == 4:
+            self._scroll_rows(-1)
+        elif getattr(event, 'num', None) == 5:
+            self._scroll_rows(1)
+        elif event.delta:
+            self._scroll_rows(-1 if event.delta > 0 else 1)
+
+    def _bind_wheel(self, event):
+        self.bind_all('<MouseWheel>', self._on_wheel)
+        self.bind_all('<Button-4>', self._on_wheel)
+        self.bind_all('<Button-5>', self._on_wheel)
+
+    def _unbind_wheel(self, event):
+        # Переход курсора на карточку внутри списка тоже приходит как <Leave>
+        widget = self.winfo_containing(event.x_root, event.y_root)
+        if widget is not None and str(widget).startswith(str(self.body)):
+            return
+        self.unbind_all('<MouseWheel>')
+        self.unbind_all('<Button-4>')
+        self.unbind_all('<Button-5>')
@@ -0,0 +1,187 @@
+# write_queue.py
+"""Групповая фиксация записей (group commit)
+
+Вызывающие потоки ставят операции записи в очередь и сразу получают
+Future. Один поток-писатель забирает накопившиеся операции - пока не
+наберется max_batch штук или не пройдет max_delay с первой из них - и
+выполняет их одной транзакцией BEGIN IMMEDIATE: один commit и один fsync
+на пакет вместо одного на запись. Каждая операция выполняется в своей
+точке сохранения, поэтому ошибка одной не откатывает соседние, а ее
+Future получает исключение.
+
+Если база занята другим процессом (database is locked) при открытии или
+фиксации транзакции, пакет целиком откатывается и повторяется с
+нарастающей паузой.
+"""
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+# Наибольшее число операций в одной транзакции
+MAX_BATCH = 256
+# Сколько ждать следующих операций после первой, секунд
+MAX_DELAY = 0.005
+# Повторы пакета при занятой базе и пауза перед первым повтором, секунд
+BUSY_RETRIES = 5
+BUSY_BACKOFF = 0.05
+# Сколько последних задержек хранить для перцентилей
+LATENCY_WINDOW = 1000
+
+_STOP = object()
+
+
+def is_busy_error(error):
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+class WriteQueue:
+    def __init__(self, db, max_batch=MAX_BATCH, max_delay=MAX_DELAY,
+                 retries=BUSY_RETRIES, backoff=BUSY_BACKOFF, on_rollback=None):
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.retries = retries
+        self.backoff = backoff
+        # Вызывается после отката пакета целиком: сброс состояния в памяти,
+        # которое операции успели изменить
+        self.on_rollback = on_rollback
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.batches = 0
+        self.writes = 0
+        self.errors = 0
+        self.retried = 0
+        self.largest_batch = 0
+        self.commit_time = 0.0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def submit(self, func, *args):
+        """Постановка операции в очередь; Future получит ее результат"""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Очередь записи закрыта")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='write-queue', daemon=True)
+                self._thread.start()
+            self._queue.put((func, args, future, time.perf_counter()))
+        return future
+
+    def call(self, func, *args):
+        """Синхронная запись через очередь"""
+        return self.submit(func, *args).result()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.perf_counter() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.perf_counter()
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch = [item for item in self._collect(first)
+                     if item[2].set_running_or_notify_cancel()]
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch):
+        delay = self.backoff
+        attempt = 0
+        while True:
+            try:
+                results = self._execute(batch)
+                break
+            except Exception as e:
+                # Ошибки операций остаются в их точках сохранения: сюда доходят
+                # только ошибки открытия и фиксации транзакции пакета
+                error = e
+            if self.on_rollback is not None:
+                self.on_rollback()
+            retryable = is_busy_error(error)
+            if not retryable or attempt >= self.retries:
+                results = [(False, error)] * len(batch)
+                break
+            attempt += 1
+            self.retried += 1
+            time.sleep(delay)
+            delay *= 2
+
+        now = time.perf_counter()
+        with self._lock:
+            self.batches += 1
+            self.writes += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            for (_, _, _, queued), (ok, _) in zip(batch, results):
+                self._latencies.append(now - queued)
+                if not ok:
+                    self.errors += 1
+        for (_, _, future, _), (ok, value) in zip(batch, results):
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def _execute(self, batch):
+        started = time.perf_counter()
+        results = []
+        with self.db.transaction(immediate=True):
+            for func, args, _, _ in batch:
+                # Методы репозитория внутри открытой транзакции работают в точке сохранения
+                try:
+                    results.append((True, func(*args)))
+                except Exception as e:
+                    results.append((False, e))
+        self.commit_time += time.perf_counter() - started
+        return results
+
+    def stats(self):
+        """Метрики: пакеты, записи, размер пакета и задержка от постановки до фиксации"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            batches = self.batches
+            return {
+                'batches': batches,
+                'writes': self.writes,
+                'errors': self.errors,
+                'retries': self.retried,
+                'pending': self._queue.qsize(),
+                'avg_batch': self.writes / batches if batches else 0.0,
+                'max_batch': self.largest_batch,
+                'avg_commit_ms': self.commit_time * 1000 / batches if batches else 0.0,
+                'latency_p50_ms': _percentile(latencies, 0.5) * 1000,
+                'latency_p95_ms': _percentile(latencies, 0.95) * 1000,
+            }
+
+    def close(self):
+        """Запись оставшихся операций и остановка писателя"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]